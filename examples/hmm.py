@@ -49,7 +49,9 @@ logging.basicConfig(format='%(relativeCreated) 9d %(message)s', level=logging.IN
 # Importantly, the dependency structure of the enumerated variables has
 # narrow treewidth, therefore admitting efficient inference by message passing.
 # Pyro's TraceEnum_ELBO will find an efficient message passing scheme if one
-# exists.
+# exists. We iterate over time steps with pyro.markov, which declares that each
+# step only depends on the previous step; this lets enumeration recycle tensor
+# dims, so that the number of dims does not grow with the length of the chain.
 def model_1(sequences, lengths, args, batch_size=None, include_prior=True):
     num_sequences, max_length, data_dim = sequences.shape
     assert lengths.shape == (num_sequences,)
@@ -72,7 +74,7 @@ def model_1(sequences, lengths, args, batch_size=None, include_prior=True):
     with pyro.iarange("sequences", len(sequences), batch_size, dim=-2) as batch:
         lengths = lengths[batch]
         x = 0
-        for t in range(lengths.max()):
+        for t in pyro.markov(range(lengths.max())):
             with poutine.mask(mask=(t < lengths).unsqueeze(-1)):
                 # On the next line, we'll overwrite the value of x with an updated
                 # value. If we wanted to record all x values, we could instead
@@ -107,7 +109,7 @@ def model_2(sequences, lengths, args, batch_size=None, include_prior=True):
     with pyro.iarange("sequences", len(sequences), batch_size, dim=-2) as batch:
         lengths = lengths[batch]
         x, y = 0, 0
-        for t in range(lengths.max()):
+        for t in pyro.markov(range(lengths.max())):
             with poutine.mask(mask=(t < lengths).unsqueeze(-1)):
                 x = pyro.sample("x_{}".format(t), dist.Categorical(probs_x[x]),
                                 infer={"enumerate": "parallel"})
@@ -152,7 +154,7 @@ def model_3(sequences, lengths, args, batch_size=None, include_prior=True):
     with pyro.iarange("sequences", len(sequences), batch_size, dim=-2) as batch:
         lengths = lengths[batch]
         w, x = 0, 0
-        for t in range(lengths.max()):
+        for t in pyro.markov(range(lengths.max())):
             with poutine.mask(mask=(t < lengths).unsqueeze(-1)):
                 w = pyro.sample("w_{}".format(t), dist.Categorical(probs_w[w]),
                                 infer={"enumerate": "parallel"})
@@ -200,7 +202,7 @@ def model_4(sequences, lengths, args, batch_size=None, include_prior=True):
         # ensure that w and x are always tensors so we can unsqueeze them below,
         # thus ensuring that the x sample sites have correct distribution shape.
         w = x = torch.tensor(0, dtype=torch.long)
-        for t in range(lengths.max()):
+        for t in pyro.markov(range(lengths.max())):
             with poutine.mask(mask=(t < lengths).unsqueeze(-1)):
                 w = pyro.sample("w_{}".format(t), dist.Categorical(probs_w[w]),
                                 infer={"enumerate": "parallel"})
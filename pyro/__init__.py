@@ -2,9 +2,9 @@ from __future__ import absolute_import, division, print_function
 
 from pyro.logger import log
 import pyro.poutine as poutine
-from pyro.poutine import condition, do
-from pyro.primitives import (clear_param_store, enable_validation, get_param_store, iarange, irange, module, param,
-                             random_module, sample, validation_enabled)
+from pyro.poutine import condition, do, markov
+from pyro.primitives import (EpochSubsample, clear_param_store, enable_validation, get_param_store, iarange, irange,
+                             module, param, random_module, sample, validation_enabled)
 from pyro.util import set_rng_seed
 
 version_prefix = '0.2.1'
@@ -17,6 +17,7 @@ except ImportError:
 
 __all__ = [
     "__version__",
+    "EpochSubsample",
     "clear_param_store",
     "condition",
     "do",
@@ -25,6 +26,7 @@ __all__ = [
     "iarange",
     "irange",
     "log",
+    "markov",
     "module",
     "param",
     "poutine",
@@ -5,7 +5,8 @@ from pyro.infer.elbo import ELBO
 from pyro.infer.enum import config_enumerate
 from pyro.infer.importance import Importance
 from pyro.infer.renyi_elbo import RenyiELBO
-from pyro.infer.svi import SVI
+from pyro.infer.smcfilter import SMCFilter
+from pyro.infer.svi import DistributedSVI, SVI
 from pyro.infer.trace_elbo import JitTrace_ELBO, Trace_ELBO
 from pyro.infer.traceenum_elbo import JitTraceEnum_ELBO, TraceEnum_ELBO
 from pyro.infer.tracegraph_elbo import JitTraceGraph_ELBO, TraceGraph_ELBO
@@ -15,6 +16,7 @@ __all__ = [
     "config_enumerate",
     "enable_validation",
     "is_validation_enabled",
+    "DistributedSVI",
     "ELBO",
     "EmpiricalMarginal",
     "Importance",
@@ -22,6 +24,7 @@ __all__ = [
     "JitTraceGraph_ELBO",
     "JitTrace_ELBO",
     "RenyiELBO",
+    "SMCFilter",
     "SVI",
     "TraceEnum_ELBO",
     "TraceGraph_ELBO",
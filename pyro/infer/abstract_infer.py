@@ -1,12 +1,15 @@
 from __future__ import absolute_import, division, print_function
 
+import os
 from abc import ABCMeta, abstractmethod
 
+import numpy as np
 import torch
 from six import add_metaclass
 
 import pyro.poutine as poutine
 from pyro.distributions import Categorical, Empirical
+from pyro.poutine.trace_struct import Trace
 
 
 class EmpiricalMarginal(Empirical):
@@ -33,11 +36,147 @@ class EmpiricalMarginal(Empirical):
 
     def _populate_traces(self, trace_posterior, sites):
         assert isinstance(sites, (list, str))
+        if trace_posterior.sample_store is not None:
+            self._populate_from_store(trace_posterior, sites)
+            return
         for tr, log_weight in zip(trace_posterior.exec_traces, trace_posterior.log_weights):
             value = tr.nodes[sites]["value"] if isinstance(sites, str) else \
                 torch.stack([tr.nodes[site]["value"] for site in sites], 0)
             self.add(value, log_weight=log_weight)
 
+    def _populate_from_store(self, trace_posterior, sites):
+        store = trace_posterior.sample_store
+        missing = [site for site in ([sites] if isinstance(sites, str) else sites) if site not in store.sites]
+        if missing:
+            raise ValueError("Sites {} were not recorded by the sample store, which holds sites {}. "
+                             "Pass `sites` explicitly, or record them with `store_sites`."
+                             .format(missing, sorted(store.sites)))
+        samples = store[sites] if isinstance(sites, str) else \
+            torch.stack([store[site] for site in sites], 1)
+        weight_type = samples.new_empty(1).float().type() if samples.dtype in (torch.int32, torch.int64) \
+            else samples.type()
+        self._samples = samples
+        log_weights = trace_posterior.log_weights
+        if not torch.is_tensor(log_weights):
+            log_weights = torch.tensor([float(w) for w in log_weights])
+        self._log_weights = log_weights.detach().type(weight_type)
+        self._categorical = Categorical(logits=self._log_weights)
+
+
+class SampleStore(object):
+    """
+    Compact storage for the values of a fixed set of sites, used by
+    :class:`TracePosterior` in place of full execution traces. The values of
+    each site are written into a preallocated tensor with a leading sample
+    dimension, whose capacity is doubled whenever it fills up.
+
+    :param list sites: names of the sites to record.
+    :param str directory: optional directory in which the values are stored
+        in memory-mapped files, so that they need not fit into memory. Files
+        from a previous run in the same directory are overwritten.
+    :param int initial_capacity: number of samples allocated up front.
+    """
+    def __init__(self, sites, directory=None, initial_capacity=1024):
+        self.sites = list(sites)
+        self.directory = directory
+        self._initial_capacity = initial_capacity
+        self._capacity = 0
+        self._size = 0
+        self._buffers = {}
+        self._site_types = {}
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, site):
+        """
+        :param str site: name of a recorded site.
+        :return: values of ``site`` for all samples, stacked along the leftmost dimension.
+        :rtype: torch.Tensor
+        """
+        if site not in self._buffers:
+            raise KeyError("Site {} is not recorded in the sample store, which holds sites {}."
+                           .format(site, sorted(self.sites)))
+        return self._buffers[site][:self._size]
+
+    def add(self, trace):
+        """
+        Records the values of the stored sites in ``trace``.
+
+        :param trace: execution trace containing all the stored sites.
+        """
+        values = {}
+        for site in self.sites:
+            if site not in trace.nodes:
+                raise KeyError("Site {} is not present in the trace.".format(site))
+            value = trace.nodes[site]["value"]
+            if not torch.is_tensor(value):
+                raise ValueError("Site {} must have a tensor value to be stored, but got {}."
+                                 .format(site, type(value)))
+            values[site] = value.detach().unsqueeze(0)
+            self._site_types[site] = trace.nodes[site]["type"]
+        self._write(values, 1)
+
+    def add_batch(self, values, site_types=None):
+        """
+        Records a batch of samples at once.
+
+        :param dict values: a dict mapping each stored site to a tensor of its
+            values, batched along the leftmost dimension.
+        :param dict site_types: optional dict mapping sites to their site
+            types, used by :meth:`get_trace`. Defaults to ``"sample"``.
+        """
+        values = {site: values[site].detach() for site in self.sites}
+        batch_sizes = set(value.size(0) for value in values.values())
+        if len(batch_sizes) != 1:
+            raise ValueError("Expected values of all sites to have the same batch size, but got {}."
+                             .format(sorted(batch_sizes)))
+        for site in self.sites:
+            self._site_types[site] = "sample" if site_types is None else site_types.get(site, "sample")
+        self._write(values, batch_sizes.pop())
+
+    def _write(self, values, batch_size):
+        if self._size + batch_size > self._capacity:
+            self._grow(values, self._size + batch_size)
+        for site, value in values.items():
+            self._buffers[site][self._size:self._size + batch_size].copy_(value)
+        self._size += batch_size
+
+    def get_trace(self, idx):
+        """
+        Builds a trace holding the stored values of sample ``idx``, which can
+        be used to replay a model.
+
+        :param int idx: index of the sample.
+        :rtype: ~pyro.poutine.trace_struct.Trace
+        """
+        trace = Trace()
+        for site in self.sites:
+            trace.add_node(site, name=site, type=self._site_types[site],
+                           value=self._buffers[site][idx], is_observed=False, infer={})
+        return trace
+
+    def _grow(self, values, min_capacity):
+        capacity = max(self._initial_capacity, 2 * self._capacity, min_capacity)
+        for site, value in values.items():
+            self._buffers[site] = self._allocate(site, capacity, value[0])
+        self._capacity = capacity
+
+    def _allocate(self, site, capacity, prototype):
+        shape = (capacity,) + prototype.shape
+        if self.directory is None:
+            buffer = prototype.new_empty(shape)
+            if self._size:
+                buffer[:self._size] = self._buffers[site][:self._size]
+            return buffer
+        # Extending the backing file keeps the values already written, so a
+        # grown buffer only needs to be remapped.
+        dtype = prototype.new_empty(0).cpu().numpy().dtype
+        path = os.path.join(self.directory, "site_{}.bin".format(self.sites.index(site)))
+        with open(path, "ab" if self._size else "wb") as f:
+            f.truncate(int(np.prod(shape)) * dtype.itemsize)
+        return torch.from_numpy(np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+
 
 @add_metaclass(ABCMeta)
 class TracePosterior(object):
@@ -46,13 +185,33 @@ class TracePosterior(object):
     When run, collects a bag of execution traces from the approximate posterior.
     This is designed to be used by other utility classes like `EmpiricalMarginal`,
     that need access to the collected execution traces.
+
+    Keeping every execution trace can be expensive for long runs. If
+    ``store_sites`` is specified, only the values of these sites are kept, in
+    a compact :class:`SampleStore` (available as ``sample_store``), and
+    ``exec_traces`` stays empty.
+
+    :param list store_sites: optional list of sites whose values are recorded
+        instead of full execution traces.
+    :param int thin: keep only every ``thin``-th sample (of each chain).
+    :param str store_dir: optional directory in which the values of
+        ``store_sites`` are memory-mapped.
     """
-    def __init__(self):
+    def __init__(self, store_sites=None, thin=1, store_dir=None):
+        if store_sites is None and store_dir is not None:
+            raise ValueError("`store_dir` requires `store_sites` to be specified.")
+        self.store_sites = store_sites
+        self.thin = thin
+        self.store_dir = store_dir
         self._init()
 
     def _init(self):
         self.log_weights = []
         self.exec_traces = []
+        self.chain_ids = []
+        self.sample_store = None
+        if self.store_sites is not None:
+            self.sample_store = SampleStore(self.store_sites, self.store_dir)
         self._categorical = None
 
     @abstractmethod
@@ -60,12 +219,16 @@ class TracePosterior(object):
         """
         Abstract method implemented by classes that inherit from `TracePosterior`.
 
-        :return: Generator over ``(exec_trace, weight)``.
+        :return: Generator over ``(exec_trace, weight)``, or over
+            ``(exec_trace, weight, chain_id)`` for algorithms that merge
+            samples from multiple independent chains.
         """
         raise NotImplementedError("inference algorithm must implement _traces")
 
     def __call__(self, *args, **kwargs):
         random_idx = self._categorical.sample()
+        if self.sample_store is not None:
+            return self.sample_store.get_trace(random_idx)
         trace = self.exec_traces[random_idx].copy()
         for name in trace.observation_nodes:
             trace.remove_node(name)
@@ -80,10 +243,20 @@ class TracePosterior(object):
         :param kwargs: optional keywords args taken by `self._traces`.
         """
         self._init()
+        num_seen = {}
         with poutine.block():
-            for tr, logit in self._traces(*args, **kwargs):
-                self.exec_traces.append(tr)
+            for sample in self._traces(*args, **kwargs):
+                tr, logit = sample[:2]
+                chain_id = sample[2] if len(sample) > 2 else 0
+                num_seen[chain_id] = num_seen.get(chain_id, 0) + 1
+                if (num_seen[chain_id] - 1) % self.thin:
+                    continue
+                if self.sample_store is not None:
+                    self.sample_store.add(tr)
+                else:
+                    self.exec_traces.append(tr)
                 self.log_weights.append(logit)
+                self.chain_ids.append(chain_id)
         self._categorical = Categorical(logits=torch.tensor(self.log_weights))
         return self
 
@@ -108,7 +281,7 @@ class TracePredictive(TracePosterior):
         super(TracePredictive, self).__init__()
 
     def _traces(self, *args, **kwargs):
-        if not self.posterior.exec_traces:
+        if not len(self.posterior.log_weights):
             self.posterior.run(*args, **kwargs)
         for _ in range(self.num_samples):
             model_trace = self.posterior()
@@ -6,6 +6,8 @@ from six import add_metaclass
 
 import pyro
 import pyro.poutine as poutine
+from pyro.infer.enum import get_importance_trace, process_importance_trace, run_importance_trace
+from pyro.infer.util import get_site_signature, is_validation_enabled
 
 
 @add_metaclass(ABCMeta)
@@ -36,6 +38,15 @@ class ELBO(object):
         misuse of enumeration, i.e. that
         :class:`pyro.infer.traceenum_elbo.TraceEnum_ELBO` is used iff there
         are enumerated sample sites.
+    :param bool static_structure: Whether the model and guide have static
+        structure, i.e. the same sample sites with the same shapes and
+        independence contexts on every step. If True, the first step records
+        the site signature of the model and guide traces together with
+        everything derived from their structure alone (validation results,
+        iarange stacks, enumeration ordinals and, for
+        :class:`~pyro.infer.tracegraph_elbo.TraceGraph_ELBO`, the dependency
+        graph and downstream cost plan), and later steps reuse it until the
+        signature changes. Defaults to False.
 
     References
 
@@ -50,7 +61,8 @@ class ELBO(object):
                  num_particles=1,
                  max_iarange_nesting=float('inf'),
                  vectorize_particles=False,
-                 strict_enumeration_warning=True):
+                 strict_enumeration_warning=True,
+                 static_structure=False):
         self.num_particles = num_particles
         self.max_iarange_nesting = max_iarange_nesting
         self.vectorize_particles = vectorize_particles
@@ -61,6 +73,9 @@ class ELBO(object):
                                      "a finite value for `max_iarange_nesting` arg.")
                 self.max_iarange_nesting += 1
         self.strict_enumeration_warning = strict_enumeration_warning
+        self.static_structure = static_structure
+        self._structure_signature = None
+        self._structure_plan = {}
 
     def _vectorized_num_particles(self, fn):
         """
@@ -91,6 +106,56 @@ class ELBO(object):
                                self._vectorized_num_particles(guide),
                                *args, **kwargs)
 
+    def _get_importance_trace(self, graph_type, model, guide, *args, **kwargs):
+        """
+        Returns a single trace from the guide, and the model that is run
+        against it, as :func:`~pyro.infer.enum.get_importance_trace` does,
+        validating them with :meth:`_validate_traces` if validation is
+        enabled.
+
+        With ``static_structure=True`` the traces are always flat, and they are
+        only validated when their site signature differs from that of the
+        previous step, in which case the structure plan is also reset.
+        """
+        if not self.static_structure:
+            model_trace, guide_trace = get_importance_trace(
+                graph_type, self.max_iarange_nesting, model, guide, *args, **kwargs)
+            if is_validation_enabled():
+                self._validate_traces(model_trace, guide_trace)
+            return model_trace, guide_trace
+
+        model_trace, guide_trace = run_importance_trace("flat", model, guide, *args, **kwargs)
+        signature = (get_site_signature(model_trace), get_site_signature(guide_trace))
+        is_new_structure = signature != self._structure_signature
+        validate = is_new_structure and is_validation_enabled()
+        model_trace, guide_trace = process_importance_trace(
+            model_trace, guide_trace, self.max_iarange_nesting, validate=validate)
+        if validate:
+            self._validate_traces(model_trace, guide_trace)
+        if is_new_structure:
+            self._structure_signature = signature
+            self._structure_plan = {}
+        return model_trace, guide_trace
+
+    def _validate_traces(self, model_trace, guide_trace):
+        """
+        Performs ELBO specific validation of a model and guide trace pair.
+        """
+        pass
+
+    def _get_plan(self, key, fn, *args):
+        """
+        Returns ``fn(*args)``, a computation that depends only on the structure
+        of the current traces. When ``static_structure=True`` the result is
+        memoized under ``key`` until the site signature changes.
+        """
+        if not self.static_structure:
+            return fn(*args)
+        plan = self._structure_plan
+        if key not in plan:
+            plan[key] = fn(*args)
+        return plan[key]
+
     @abstractmethod
     def _get_trace(self, model, guide, *args, **kwargs):
         """
@@ -35,12 +35,32 @@ def get_importance_trace(graph_type, max_iarange_nesting, model, guide, *args, *
     Returns a single trace from the guide, and the model that is run
     against it.
     """
+    model_trace, guide_trace = run_importance_trace(graph_type, model, guide, *args, **kwargs)
+    return process_importance_trace(model_trace, guide_trace, max_iarange_nesting,
+                                    validate=is_validation_enabled())
+
+
+def run_importance_trace(graph_type, model, guide, *args, **kwargs):
+    """
+    Runs the guide and the model against it, returning the raw
+    ``(model_trace, guide_trace)`` pair without validating them or computing
+    log probabilities.
+    """
     guide = poutine.broadcast(guide)
     model = poutine.broadcast(model)
     guide_trace = poutine.trace(guide, graph_type=graph_type).get_trace(*args, **kwargs)
     model_trace = poutine.trace(poutine.replay(model, trace=guide_trace),
                                 graph_type=graph_type).get_trace(*args, **kwargs)
-    if is_validation_enabled():
+    return model_trace, guide_trace
+
+
+def process_importance_trace(model_trace, guide_trace, max_iarange_nesting, validate=True):
+    """
+    Prunes subsample sites from a pair of traces returned by
+    :func:`run_importance_trace` and computes their log probabilities and
+    score parts, optionally validating the traces on the way.
+    """
+    if validate:
         check_model_guide_match(model_trace, guide_trace, max_iarange_nesting)
 
     guide_trace = prune_subsample_sites(guide_trace)
@@ -48,7 +68,7 @@ def get_importance_trace(graph_type, max_iarange_nesting, model, guide, *args, *
 
     model_trace.compute_log_prob()
     guide_trace.compute_score_parts()
-    if is_validation_enabled():
+    if validate:
         for site in model_trace.nodes.values():
             if site["type"] == "sample":
                 check_site_shape(site, max_iarange_nesting)
@@ -2,28 +2,56 @@ from __future__ import absolute_import, division, print_function
 
 import logging
 
+import torch
+
+import pyro
 import pyro.poutine as poutine
+from pyro.distributions import Categorical
+from pyro.poutine.util import site_is_subsample
 
-from .abstract_infer import TracePosterior
+from .abstract_infer import SampleStore, TracePosterior
 
 logger = logging.getLogger(__name__)
 
+_SAMPLES_IARANGE = "num_samples_vectorized"
+
 
 class Importance(TracePosterior):
     """
     :param model: probabilistic model defined as a function
     :param guide: guide used for sampling defined as a function
     :param num_samples: number of samples to draw from the guide (default 10)
+    :param bool vectorize_samples: whether to draw all samples in a single
+        batched execution of the guide and model. This wraps them in an
+        outermost :class:`~pyro.iarange` over samples and a
+        :class:`~pyro.poutine.broadcast` poutine, and requires static
+        structure and a finite ``max_iarange_nesting``. The samples are kept
+        in a :class:`~pyro.infer.abstract_infer.SampleStore` rather than as
+        execution traces, and ``log_weights`` is a single tensor.
+    :param int max_iarange_nesting: bound on max number of nested
+        :func:`pyro.iarange` contexts in the model and guide, only needed if
+        ``vectorize_samples=True``.
+    :param list store_sites: optional list of sites whose values are recorded
+        in a :class:`~pyro.infer.abstract_infer.SampleStore` instead of
+        keeping full execution traces. If ``vectorize_samples=True`` this
+        defaults to all latent sample sites of the model, and to
+        ``"_RETURN"`` if the model returns a tensor. Each stored value has the
+        shape the site has without vectorization. A returned tensor batched
+        along its leftmost dimension is unbatched like a site without event
+        dims, and any other returned tensor is repeated for each sample.
+    :param str store_dir: optional directory in which the values of the
+        stored sites are memory-mapped.
 
     This method performs posterior inference by importance sampling
     using the guide as the proposal distribution.
     If no guide is provided, it defaults to proposing from the model's prior.
     """
-    def __init__(self, model, guide=None, num_samples=None):
+    def __init__(self, model, guide=None, num_samples=None, vectorize_samples=False,
+                 max_iarange_nesting=float('inf'), store_sites=None, store_dir=None):
         """
         Constructor. default to num_samples = 10, guide = model
         """
-        super(Importance, self).__init__()
+        super(Importance, self).__init__(store_sites=store_sites, store_dir=store_dir)
         if num_samples is None:
             num_samples = 10
             logger.warn("num_samples not provided, defaulting to {}".format(num_samples))
@@ -33,6 +61,13 @@ class Importance(TracePosterior):
         self.num_samples = num_samples
         self.model = model
         self.guide = guide
+        self.vectorize_samples = vectorize_samples
+        self.max_iarange_nesting = max_iarange_nesting
+        if vectorize_samples:
+            if max_iarange_nesting == float('inf'):
+                raise ValueError("Automatic vectorization over num_samples requires " +
+                                 "a finite value for `max_iarange_nesting` arg.")
+            self.max_iarange_nesting += 1
 
     def _traces(self, *args, **kwargs):
         """
@@ -44,3 +79,94 @@ class Importance(TracePosterior):
                 poutine.replay(self.model, trace=guide_trace)).get_trace(*args, **kwargs)
             log_weight = model_trace.log_prob_sum() - guide_trace.log_prob_sum()
             yield (model_trace, log_weight)
+
+    def _vectorized_num_samples(self, fn):
+        """
+        Wraps a callable inside an outermost :class:`~pyro.iarange` over
+        ``num_samples`` and a :class:`~pyro.poutine.broadcast` poutine.
+        """
+        def wrapped_fn(*args, **kwargs):
+            with pyro.iarange(_SAMPLES_IARANGE, self.num_samples, dim=-self.max_iarange_nesting):
+                return fn(*args, **kwargs)
+
+        return poutine.broadcast(wrapped_fn)
+
+    def _sum_to_samples(self, log_prob):
+        # All dims left of the sample dim have size 1 under broadcasting.
+        if log_prob.dim() < self.max_iarange_nesting:
+            return log_prob.sum()
+        batch_dims = log_prob.dim() - self.max_iarange_nesting + 1
+        return log_prob.reshape(log_prob.shape[:batch_dims] + (-1,)).sum(-1).reshape(-1)
+
+    def _unbatch(self, value, event_dim, cond_indep_stack=()):
+        # Moves the sample dim to the left of the value and drops the singleton
+        # dims added by broadcasting, i.e. those left of the sample dim and those
+        # between it and the site's own batch dims, so that each sample has the
+        # shape the site has without vectorization.
+        sample_dim = value.dim() - event_dim - self.max_iarange_nesting
+        shape = value.shape[sample_dim + 1:]
+        iarange_dims = max([-f.dim for f in cond_indep_stack
+                            if f.vectorized and f.name != _SAMPLES_IARANGE] + [0])
+        while len(shape) - event_dim > iarange_dims and shape[0] == 1:
+            shape = shape[1:]
+        return value.reshape((self.num_samples,) + shape)
+
+    def _unbatch_return(self, value):
+        # The return value has no known event dims, so it is only unbatched if
+        # batched along its leftmost dim, and otherwise repeated for each sample.
+        if value.dim() and value.size(0) == self.num_samples:
+            shape = value.shape[1:]
+            for _ in range(self.max_iarange_nesting - 1):
+                if not shape or shape[0] != 1:
+                    break
+                shape = shape[1:]
+            return value.reshape((self.num_samples,) + shape)
+        return value.expand((self.num_samples,) + value.shape)
+
+    def run(self, *args, **kwargs):
+        """
+        Draws ``num_samples`` weighted samples from the proposal distribution.
+        With ``vectorize_samples=True``, all samples are drawn in one batched
+        execution of the guide and the model.
+
+        :param args: optional args taken by the model and guide.
+        :param kwargs: optional keywords args taken by the model and guide.
+        """
+        if not self.vectorize_samples:
+            return super(Importance, self).run(*args, **kwargs)
+
+        self._init()
+        with poutine.block():
+            guide_trace = poutine.trace(self._vectorized_num_samples(self.guide)).get_trace(*args, **kwargs)
+            model_trace = poutine.trace(poutine.replay(self._vectorized_num_samples(self.model),
+                                                       trace=guide_trace)).get_trace(*args, **kwargs)
+        model_trace.compute_log_prob()
+        guide_trace.compute_log_prob()
+
+        log_weights = 0.
+        for trace, sign in ((model_trace, 1.), (guide_trace, -1.)):
+            for site in trace.nodes.values():
+                if site["type"] == "sample" and not site_is_subsample(site):
+                    log_weights = log_weights + sign * self._sum_to_samples(site["log_prob"].detach())
+        if not torch.is_tensor(log_weights):
+            log_weights = torch.tensor(log_weights)
+        log_weights = log_weights.expand(self.num_samples)
+
+        values = {}
+        site_types = {}
+        for name, site in model_trace.nodes.items():
+            if site["type"] == "sample" and not site["is_observed"] and not site_is_subsample(site):
+                values[name] = self._unbatch(site["value"], site["fn"].event_dim, site["cond_indep_stack"])
+                site_types[name] = site["type"]
+        return_value = model_trace.nodes["_RETURN"]["value"]
+        if torch.is_tensor(return_value):
+            values["_RETURN"] = self._unbatch_return(return_value)
+            site_types["_RETURN"] = "return"
+
+        if self.sample_store is None:
+            self.sample_store = SampleStore(list(values), self.store_dir)
+        self.sample_store.add_batch(values, site_types)
+        self.log_weights = log_weights
+        self.chain_ids = [0] * self.num_samples
+        self._categorical = Categorical(logits=log_weights)
+        return self
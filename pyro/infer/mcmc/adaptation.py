@@ -0,0 +1,239 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+from collections import namedtuple
+
+import torch
+
+import pyro.distributions as dist
+from pyro.ops.dual_averaging import DualAveraging
+from pyro.ops.welford import WelfordCovariance
+
+adapt_window = namedtuple("adapt_window", ["start", "end"])
+
+
+class WarmupAdapter(object):
+    r"""
+    Adapts tunable parameters, namely step size and mass matrix, during the
+    warmup phase. This class provides lookup properties to read the latest
+    values of ``step_size`` and ``inverse_mass_matrix``. These values are
+    periodically updated when adaptation is engaged.
+
+    Following Stan [1], the warmup phase is split into windows::
+
+        start_buffer | window 1 | window 2 | ... | window n | end_buffer
+
+    Step size is adapted throughout using Dual Averaging. The mass matrix is
+    only adapted in the (slow) middle windows, whose lengths double from one
+    window to the next: post-transform samples are accumulated with
+    :class:`~pyro.ops.welford.WelfordCovariance` and the inverse mass matrix is
+    updated at the end of each window, after which step size adaptation is
+    restarted. The (fast) start and end buffers only adapt step size.
+
+    **References**
+
+    [1] `Stan Reference Manual, version 2.18`, Section 34.2,
+    Stan Development Team
+
+    :param float step_size: Initial step size.
+    :param bool adapt_step_size: A flag to decide if we want to adapt step_size
+        during warm-up phase using Dual Averaging scheme.
+    :param float target_accept_prob: Target acceptance probability for step
+        size adaptation.
+    :param bool adapt_mass_matrix: A flag to decide if we want to adapt the
+        mass matrix during warm-up phase using Welford scheme.
+    :param bool is_diag_mass: A flag to decide if the adapted mass matrix is
+        diagonal or dense.
+    """
+    def __init__(self,
+                 step_size=1,
+                 adapt_step_size=False,
+                 target_accept_prob=0.8,
+                 adapt_mass_matrix=False,
+                 is_diag_mass=True):
+        self.adapt_step_size = adapt_step_size
+        self.adapt_mass_matrix = adapt_mass_matrix
+        self.target_accept_prob = target_accept_prob
+        self.is_diag_mass = is_diag_mass
+        self.step_size = 1 if step_size is None else step_size
+        self._adaptation_disabled = not (adapt_step_size or adapt_mass_matrix)
+        if adapt_step_size:
+            self._step_size_adapt_scheme = DualAveraging()
+        if adapt_mass_matrix:
+            self._mass_matrix_adapt_scheme = WelfordCovariance(diagonal=is_diag_mass)
+
+        # We separate warmup_steps into windows:
+        #   start_buffer + window 1 + window 2 + window 3 + ... + end_buffer
+        # where the length of each window will be doubled for the next window.
+        # We won't adapt mass matrix during start and end buffers; and mass
+        # matrix will be updated at the end of each window.
+        self._adapt_start_buffer = 75  # from Stan
+        self._adapt_end_buffer = 50  # from Stan
+        self._adapt_initial_window = 25  # from Stan
+        self._warmup_steps = None
+        self._inverse_mass_matrix = None
+        self._r_dist = None
+        self._mass_matrix_size = None
+        self._prototype = None
+        self._find_reasonable_step_size = None
+        self._adaptation_schedule = []
+        self._current_window = 0
+
+    def _build_adaptation_schedule(self):
+        adaptation_schedule = []
+        # from Stan, for small warmup_steps < 20
+        if self._warmup_steps < 20:
+            adaptation_schedule.append(adapt_window(0, self._warmup_steps - 1))
+            return adaptation_schedule
+
+        start_buffer_size = self._adapt_start_buffer
+        end_buffer_size = self._adapt_end_buffer
+        init_window_size = self._adapt_initial_window
+        if (self._adapt_start_buffer + self._adapt_end_buffer
+                + self._adapt_initial_window > self._warmup_steps):
+            start_buffer_size = int(0.15 * self._warmup_steps)
+            end_buffer_size = int(0.1 * self._warmup_steps)
+            init_window_size = self._warmup_steps - start_buffer_size - end_buffer_size
+        adaptation_schedule.append(adapt_window(start=0, end=start_buffer_size - 1))
+        end_window_start = self._warmup_steps - end_buffer_size
+
+        next_window_size = init_window_size
+        next_window_start = start_buffer_size
+        while next_window_start < end_window_start:
+            cur_window_start, cur_window_size = next_window_start, next_window_size
+            # Ensure that slow adaptation windows are monotonically increasing
+            if 3 * cur_window_size <= end_window_start - cur_window_start:
+                next_window_size = 2 * cur_window_size
+            else:
+                cur_window_size = end_window_start - cur_window_start
+            next_window_start = cur_window_start + cur_window_size
+            adaptation_schedule.append(adapt_window(cur_window_start, next_window_start - 1))
+        adaptation_schedule.append(adapt_window(end_window_start, self._warmup_steps - 1))
+        return adaptation_schedule
+
+    def reset_step_size_adaptation(self, z):
+        r"""
+        Finds a reasonable step size and resets step size adaptation scheme.
+        """
+        if self._find_reasonable_step_size is not None:
+            self.step_size = self._find_reasonable_step_size(z)
+        self._step_size_adapt_scheme.prox_center = math.log(10 * self.step_size)
+        self._step_size_adapt_scheme.reset()
+
+    def _update_step_size(self, accept_prob):
+        # calculate a statistic for Dual Averaging scheme
+        H = self.target_accept_prob - accept_prob
+        self._step_size_adapt_scheme.step(H)
+        log_step_size, _ = self._step_size_adapt_scheme.get_state()
+        self.step_size = math.exp(log_step_size)
+
+    def _end_adaptation(self):
+        if self.adapt_step_size:
+            _, log_step_size_avg = self._step_size_adapt_scheme.get_state()
+            self.step_size = math.exp(log_step_size_avg)
+
+    def configure(self, warmup_steps, mass_matrix_size, prototype=None, find_reasonable_step_size_fn=None):
+        r"""
+        Model specific properties that are specified when the HMC kernel is setup.
+
+        :param int warmup_steps: Number of warmup steps that the sampler is
+            initialized with.
+        :param int mass_matrix_size: Total number of (unconstrained) latent
+            dimensions, i.e. the size of the mass matrix.
+        :param torch.Tensor prototype: Tensor whose dtype and device the mass
+            matrix should follow.
+        :param find_reasonable_step_size_fn: A callable that when supplied with
+            the current state ``z`` returns a reasonable step size.
+        """
+        self._warmup_steps = warmup_steps
+        self._mass_matrix_size = mass_matrix_size
+        self._prototype = torch.tensor(0.) if prototype is None else prototype
+        self._find_reasonable_step_size = find_reasonable_step_size_fn
+        if self.adapt_mass_matrix:
+            self._mass_matrix_adapt_scheme.reset()
+            inverse_mass_matrix = self._prototype.new_ones(mass_matrix_size)
+            if not self.is_diag_mass:
+                inverse_mass_matrix = torch.diag(inverse_mass_matrix)
+            self.inverse_mass_matrix = inverse_mass_matrix
+        else:
+            self.inverse_mass_matrix = None
+        self._adaptation_schedule = self._build_adaptation_schedule()
+        self._current_window = 0
+
+    def step(self, t, z, accept_prob):
+        r"""
+        Called at each step during the warmup phase to learn tunable
+        parameters.
+
+        :param int t: time step, beginning at 0.
+        :param z: latent variables, in unconstrained space, either as a
+            dictionary keyed by site name or packed into a 1-D tensor.
+        :param float accept_prob: acceptance probability of the proposal.
+        """
+        if t >= self._warmup_steps or self._adaptation_disabled:
+            return
+        window = self._adaptation_schedule[self._current_window]
+        num_windows = len(self._adaptation_schedule)
+        mass_matrix_adaptation_phase = self.adapt_mass_matrix and \
+            (0 < self._current_window < num_windows - 1)
+        if self.adapt_step_size:
+            self._update_step_size(float(accept_prob))
+        if mass_matrix_adaptation_phase:
+            z_flat = z.detach() if torch.is_tensor(z) else \
+                torch.cat([z[name].detach().reshape(-1) for name in sorted(z)])
+            self._mass_matrix_adapt_scheme.update(z_flat)
+        if t == window.end:
+            if self._current_window == num_windows - 1:
+                self._current_window += 1
+                self._end_adaptation()
+                return
+
+            if self._current_window == 0:
+                self._current_window += 1
+                return
+
+            if mass_matrix_adaptation_phase:
+                self.inverse_mass_matrix = self._mass_matrix_adapt_scheme.get_covariance()
+                self._mass_matrix_adapt_scheme.reset()
+                if self.adapt_step_size:
+                    self.reset_step_size_adaptation(z)
+
+            self._current_window += 1
+
+    @property
+    def adaptation_schedule(self):
+        return self._adaptation_schedule
+
+    @property
+    def inverse_mass_matrix(self):
+        """
+        The adapted inverse mass matrix, as a vector (diagonal mass) or a
+        square matrix (dense mass); ``None`` stands for the identity.
+        """
+        return self._inverse_mass_matrix
+
+    @inverse_mass_matrix.setter
+    def inverse_mass_matrix(self, value):
+        self._inverse_mass_matrix = value
+        self._update_r_dist()
+
+    @property
+    def r_dist(self):
+        """
+        Distribution of the flattened momentum, i.e. :math:`N(0, M)` where
+        :math:`M` is the mass matrix.
+        """
+        return self._r_dist
+
+    def _update_r_dist(self):
+        if self._mass_matrix_size is None:
+            self._r_dist = None
+            return
+        loc = self._prototype.new_zeros(self._mass_matrix_size)
+        if self._inverse_mass_matrix is None:
+            self._r_dist = dist.Normal(loc, torch.ones_like(loc))
+        elif self._inverse_mass_matrix.dim() == 1:
+            self._r_dist = dist.Normal(loc, self._inverse_mass_matrix.rsqrt())
+        else:
+            mass_matrix = torch.inverse(self._inverse_mass_matrix)
+            self._r_dist = dist.MultivariateNormal(loc, scale_tril=torch.potrf(mass_matrix, upper=False))
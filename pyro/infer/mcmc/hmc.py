@@ -1,6 +1,8 @@
 from __future__ import absolute_import, division, print_function
 
 import math
+import warnings
+import weakref
 from collections import OrderedDict
 
 import torch
@@ -8,12 +10,14 @@ from torch.distributions import biject_to, constraints
 
 import pyro
 import pyro.distributions as dist
+import pyro.ops.jit
 import pyro.poutine as poutine
 from pyro.infer import config_enumerate
+from pyro.infer.mcmc.adaptation import WarmupAdapter
 from pyro.infer.mcmc.trace_kernel import TraceKernel
-from pyro.infer.mcmc.util import TraceEinsumEvaluator, TraceTreeEvaluator
-from pyro.ops.dual_averaging import DualAveraging
-from pyro.ops.integrator import single_step_velocity_verlet, velocity_verlet
+from pyro.infer.mcmc.util import TraceEinsumEvaluator, TraceTreeEvaluator, _SiteLogProbCache
+from pyro.ops.integrator import _grad, single_step_velocity_verlet, velocity_verlet
+from pyro.distributions.util import logsumexp
 from pyro.primitives import _Subsample
 from pyro.util import torch_isinf, torch_isnan, optional
 
@@ -41,6 +45,11 @@ class HMC(TraceKernel):
         ``int(trajectory_length / step_size)``.
     :param bool adapt_step_size: A flag to decide if we want to adapt step_size
         during warm-up phase using Dual Averaging scheme.
+    :param bool adapt_mass_matrix: A flag to decide if we want to adapt the mass
+        matrix during warm-up phase. Adaptation follows Stan's windowed scheme,
+        see :class:`~pyro.infer.mcmc.adaptation.WarmupAdapter`.
+    :param bool full_mass: A flag to decide if the adapted mass matrix is dense
+        (``True``) or diagonal (``False``).
     :param dict transforms: Optional dictionary that specifies a transform
         for a sample site with constrained support to unconstrained space. The
         transform should be invertible, and implement `log_abs_det_jacobian`.
@@ -54,6 +63,31 @@ class HMC(TraceKernel):
         to evaluate log pdf for the model trace. No-op unless the trace has
         discrete sample sites. This flag is experimental and will most likely
         be removed in a future release.
+    :param bool packed_latents: Whether the integrator works on a packed
+        representation of the latents, i.e. a single 1-D tensor holding all
+        the unconstrained latent sites concatenated in sorted site order. This
+        replaces per-site dictionary updates in each leapfrog step by a single
+        fused vector update and a single gradient computation, which reduces
+        overhead for models with many sample sites.
+    :param bool jit_compile: Whether to compile the potential energy function
+        (including the Jacobian terms of the transforms) with
+        :func:`pyro.ops.jit.compile`. The potential energy is traced once after
+        :meth:`setup` and the compiled graph is reused for all leapfrog steps,
+        which removes the Python overhead of re-running the model. This
+        requires a model with static structure; if the compiled graph fails to
+        reproduce the Python potential energy, a warning is issued and the
+        kernel falls back to the uncompiled potential energy.
+    :param int num_vectorized_chains: Number of chains to run in a single
+        process by vectorizing over them. The model is wrapped in an outer
+        :class:`~pyro.iarange` of this size (analogous to
+        ``vectorize_particles`` in :class:`~pyro.infer.elbo.ELBO`), so that
+        every latent site gets a leading chain dimension, and the Metropolis
+        correction accepts or rejects each chain independently. The chains
+        share a step size, which is adapted using their mean acceptance
+        probability. This requires a finite ``max_iarange_nesting`` and is not
+        supported for models with discrete latent sites, nor together with
+        ``adapt_mass_matrix``, ``packed_latents`` or ``jit_compile``. Values
+        in the returned traces carry the leading chain dimension.
 
     Example:
 
@@ -81,26 +115,54 @@ class HMC(TraceKernel):
                  trajectory_length=None,
                  num_steps=None,
                  adapt_step_size=False,
+                 adapt_mass_matrix=False,
+                 full_mass=False,
                  transforms=None,
                  max_iarange_nesting=float("inf"),
-                 experimental_use_einsum=False):
+                 experimental_use_einsum=False,
+                 packed_latents=False,
+                 jit_compile=False,
+                 num_vectorized_chains=1):
+        if num_vectorized_chains > 1:
+            if max_iarange_nesting == float("inf"):
+                raise ValueError("`max_iarange_nesting` must be specified to vectorize "
+                                 "over multiple chains.")
+            if adapt_mass_matrix or packed_latents or jit_compile:
+                raise ValueError("`num_vectorized_chains > 1` does not support `adapt_mass_matrix`, "
+                                 "`packed_latents` or `jit_compile`.")
+            # Reserve the leftmost batch dim for the chains.
+            max_iarange_nesting += 1
         # Wrap model in `poutine.enum` to enumerate over discrete latent sites.
         # No-op if model does not have any discrete latents.
         self.model = poutine.enum(config_enumerate(model, default="parallel"),
                                   first_available_dim=max_iarange_nesting)
+        if num_vectorized_chains > 1:
+            self.model = self._vectorized_num_chains(self.model, num_vectorized_chains,
+                                                     max_iarange_nesting)
         # broadcast sample sites inside iarange.
         self.model = poutine.broadcast(self.model)
-        self.step_size = step_size if step_size is not None else 1  # from Stan
+        step_size = step_size if step_size is not None else 1  # from Stan
         if trajectory_length is not None:
             self.trajectory_length = trajectory_length
         elif num_steps is not None:
-            self.trajectory_length = self.step_size * num_steps
+            self.trajectory_length = step_size * num_steps
         else:
             self.trajectory_length = 2 * math.pi  # from Stan
-        self.num_steps = max(1, int(self.trajectory_length / self.step_size))
+        self.num_steps = max(1, int(self.trajectory_length / step_size))
         self.adapt_step_size = adapt_step_size
+        self.adapt_mass_matrix = adapt_mass_matrix
         self.use_einsum = experimental_use_einsum
+        self.packed_latents = packed_latents
+        self.jit_compile = jit_compile
+        self.num_vectorized_chains = num_vectorized_chains
         self._target_accept_prob = 0.8  # from Stan
+        # A transition is counted as divergent if its energy error exceeds this bound.
+        self._max_delta_energy = 1000
+        self._adapter = WarmupAdapter(step_size,
+                                      adapt_step_size=adapt_step_size,
+                                      target_accept_prob=self._target_accept_prob,
+                                      adapt_mass_matrix=adapt_mass_matrix,
+                                      is_diag_mass=not full_mass)
 
         self.transforms = {} if transforms is None else transforms
         self.max_iarange_nesting = max_iarange_nesting
@@ -108,6 +170,31 @@ class HMC(TraceKernel):
         self._reset()
         super(HMC, self).__init__()
 
+    @property
+    def step_size(self):
+        return self._adapter.step_size
+
+    @property
+    def inverse_mass_matrix(self):
+        return self._adapter.inverse_mass_matrix
+
+    @staticmethod
+    def _vectorized_num_chains(model, num_chains, max_iarange_nesting):
+        def wrapped_fn(*args, **kwargs):
+            with pyro.iarange("num_chains_vectorized", num_chains, dim=-max_iarange_nesting):
+                return model(*args, **kwargs)
+
+        return wrapped_fn
+
+    def _chain_sum(self, x):
+        """
+        Sums ``x`` over all dims but the leading chain dim, or over all dims
+        if chains are not vectorized.
+        """
+        if self.num_vectorized_chains == 1:
+            return x.sum()
+        return x.reshape(self.num_vectorized_chains, -1).sum(-1)
+
     def _get_trace(self, z):
         z_trace = self._prototype_trace
         for name, value in z.items():
@@ -123,40 +210,199 @@ class HMC(TraceKernel):
                 yield (name, node)
 
     def _compute_trace_log_prob(self, model_trace):
-        return self._trace_prob_evaluator.log_prob(model_trace)
+        # Reuse the log prob terms of sites whose inputs did not change.
+        if self._log_prob_cache is not None:
+            self._log_prob_cache.fill(model_trace, self._args, self._kwargs)
+        if self.num_vectorized_chains == 1:
+            log_prob = self._trace_prob_evaluator.log_prob(model_trace)
+        else:
+            # Vectorized chains are independent, so their log densities are
+            # kept separate for the per chain Metropolis correction.
+            model_trace.compute_log_prob()
+            log_prob = 0.
+            for name, site in model_trace.nodes.items():
+                if site["type"] == "sample" and not isinstance(site["fn"], _Subsample):
+                    log_prob = log_prob + self._chain_sum(site["log_prob"])
+        if self._log_prob_cache is not None:
+            self._log_prob_cache.update(model_trace, self._args, self._kwargs)
+        return log_prob
 
     def _kinetic_energy(self, r):
-        return 0.5 * sum(x.pow(2).sum() for x in r.values())
+        inverse_mass_matrix = self.inverse_mass_matrix
+        if inverse_mass_matrix is None and not torch.is_tensor(r):
+            return 0.5 * sum(self._chain_sum(x.pow(2)) for x in r.values())
+        r_flat = r if torch.is_tensor(r) else self._pack(r)
+        if inverse_mass_matrix is None:
+            return 0.5 * r_flat.pow(2).sum()
+        if inverse_mass_matrix.dim() == 1:
+            return 0.5 * (inverse_mass_matrix * r_flat.pow(2)).sum()
+        return 0.5 * r_flat.dot(inverse_mass_matrix.matmul(r_flat))
+
+    def _pack(self, z):
+        """
+        Concatenates the per-site tensors of ``z`` into a single 1-D tensor,
+        following the site layout computed in :meth:`setup`.
+        """
+        return torch.cat([z[name].reshape(-1) for name in self._r_shapes])
+
+    def _unpack(self, z_flat):
+        """
+        Splits a packed 1-D tensor into per-site views, inverse of :meth:`_pack`.
+        """
+        z = {}
+        for name, (start, end) in self._r_slices.items():
+            z[name] = z_flat[start:end].reshape(self._r_shapes[name])
+        return z
+
+    def _sample_r(self, name):
+        r_flat = pyro.sample(name, self._adapter.r_dist)
+        return r_flat if self.packed_latents else self._unpack(r_flat)
+
+    def _get_latents(self, trace):
+        """
+        Returns the unconstrained latents of ``trace`` in the representation
+        used by the integrator.
+        """
+        z = {name: node["value"].detach() for name, node in self._iter_latent_nodes(trace)}
+        # automatically transform `z` to unconstrained space, if needed.
+        for name, transform in self.transforms.items():
+            z[name] = transform(z[name])
+        return self._pack(z) if self.packed_latents else z
+
+    def _get_constrained_trace(self, z):
+        """
+        Returns the model trace for the unconstrained latents ``z``.
+        """
+        z = self._unpack(z) if torch.is_tensor(z) else z.copy()
+        for name, transform in self.transforms.items():
+            z[name] = transform.inv(z[name])
+        return self._get_trace(z)
 
     def _potential_energy(self, z):
+        if self._compiled_potential_fn is not None:
+            return self._compiled_potential_fn(z)
+        return self._compute_potential_energy(z)
+
+    def _compute_potential_energy(self, z):
+        if torch.is_tensor(z):
+            z = self._unpack(z)
         # Since the model is specified in the constrained space, transform the
         # unconstrained R.V.s `z` to the constrained space.
         z_constrained = z.copy()
-        for name, transform in self.transforms.items():
-            z_constrained[name] = transform.inv(z_constrained[name])
+        for name in self.transforms:
+            z_constrained[name] = self._constrain(name, z[name])
         trace = self._get_trace(z_constrained)
         potential_energy = -self._compute_trace_log_prob(trace)
         # adjust by the jacobian for this transformation.
         for name, transform in self.transforms.items():
-            potential_energy += transform.log_abs_det_jacobian(z_constrained[name], z[name]).sum()
+            potential_energy += self._chain_sum(transform.log_abs_det_jacobian(z_constrained[name], z[name]))
         return potential_energy
 
+    def _constrain(self, name, value):
+        """
+        Transforms the unconstrained ``value`` of site ``name`` to the
+        constrained space, returning the same tensor as the previous call for
+        an unchanged ``value`` so that cached log prob terms can be reused.
+        """
+        memo = self._constrained_values.get(name)
+        if (memo is not None and memo[0] is value and memo[1] == value._version and
+                not (torch.is_grad_enabled() and memo[2].requires_grad)):
+            return memo[2]
+        constrained = self.transforms[name].inv(value)
+        self._constrained_values[name] = value, value._version, constrained
+        return constrained
+
+    def _total_potential_energy(self, z):
+        """
+        Potential energy used by the integrator. Vectorized chains are
+        independent, so the gradient of their summed potential energy with
+        respect to the latents of a chain is that chain's own gradient.
+        """
+        potential_energy = self._potential_energy(z)
+        if self.num_vectorized_chains == 1:
+            return potential_energy
+        return potential_energy.sum()
+
     def _energy(self, z, r):
-        return self._kinetic_energy(r) + self._potential_energy(z)
+        # No gradient is needed, so log prob terms computed by the last
+        # gradient evaluation at ``z`` can be reused.
+        with optional(torch.no_grad(), self._compiled_potential_fn is None):
+            return self._kinetic_energy(r) + self._potential_energy(z)
+
+    def _compile_potential_energy(self, z):
+        """
+        Traces the potential energy at ``z`` with :func:`pyro.ops.jit.compile`
+        and checks the compiled graph against the Python potential energy,
+        at ``z`` and at a randomly perturbed point. The compiled function is
+        only used if it reproduces both values and gradients.
+        """
+        names = list(self._r_shapes)
+        weakself = weakref.ref(self)
+
+        @pyro.ops.jit.compile(nderivs=1)
+        def compiled(*z_values):
+            self = weakself()
+            z = z_values[0] if self.packed_latents else dict(zip(names, z_values))
+            return self._compute_potential_energy(z)
+
+        def potential_fn(z):
+            z_values = (z,) if torch.is_tensor(z) else tuple(z[name] for name in names)
+            return compiled(*z_values)
+
+        if torch.is_tensor(z):
+            z = z.detach()
+            z_perturbed = z + 0.1 * torch.randn_like(z)
+        else:
+            z = {name: value.detach() for name, value in z.items()}
+            z_perturbed = {name: value + 0.1 * torch.randn_like(value) for name, value in z.items()}
+        try:
+            with pyro.validation_enabled(False):
+                for z_check in (z, z_perturbed):
+                    expected_grads, expected = _grad(self._compute_potential_energy, z_check)
+                    actual_grads, actual = _grad(potential_fn, z_check)
+                    if torch.is_tensor(z_check):
+                        expected_grads, actual_grads = [expected_grads], [actual_grads]
+                    else:
+                        expected_grads = [expected_grads[name] for name in names]
+                        actual_grads = [actual_grads[name] for name in names]
+                    for x, y in zip([expected] + expected_grads, [actual] + actual_grads):
+                        if not ((x - y).abs() <= 1e-4 * (1 + x.abs())).all():
+                            raise ValueError("compiled potential energy does not match the model")
+        except Exception as e:
+            warnings.warn("Failed to compile the potential energy, which may be due to dynamic "
+                          "control flow in the model. Falling back to the uncompiled potential "
+                          "energy.\n{}".format(e))
+            return
+        self._compiled_potential_fn = potential_fn
 
     def _reset(self):
         self._t = 0
         self._accept_cnt = 0
-        self._r_dist = OrderedDict()
+        # Counters of gradient evaluations and divergent transitions, which are
+        # used to compare the efficiency of samplers.
+        self._num_grad_evals = 0
+        self._num_divergences = 0
+        self._r_shapes = OrderedDict()
+        self._r_numels = OrderedDict()
+        self._r_slices = OrderedDict()
         self._args = None
         self._kwargs = None
         self._prototype_trace = None
         self._adapt_phase = False
-        self._adapted_scheme = None
+        self._warmup_steps = 0
         self._has_enumerable_sites = False
         self._trace_prob_evaluator = None
+        self._log_prob_cache = None
+        self._constrained_values = {}
+        self._compiled_potential_fn = None
 
     def _find_reasonable_step_size(self, z):
+        # Temporarily disable distributions args checking as
+        # NaNs are expected while searching for a step size.
+        with pyro.validation_enabled(False):
+            return self._search_step_size(z)
+
+    def _search_step_size(self, z):
         step_size = self.step_size
         # NOTE: This target_accept_prob is 0.5 in NUTS paper, is 0.8 in Stan,
         # and is different to the target_accept_prob for Dual Averaging scheme.
@@ -166,13 +412,9 @@ class HMC(TraceKernel):
         # We are going to find a step_size which make accept_prob (Metropolis correction)
         # near the target_accept_prob. If accept_prob:=exp(-delta_energy) is small,
         # then we have to decrease step_size; otherwise, increase step_size.
-        r = {name: pyro.sample("r_{}_presample".format(name), self._r_dist[name])
-             for name in self._r_dist}
+        r = self._sample_r(name="r_presample")
         energy_current = self._energy(z, r)
-        z_new, r_new, z_grads, potential_energy = single_step_velocity_verlet(
-            z, r, self._potential_energy, step_size)
-        energy_new = potential_energy + self._kinetic_energy(r_new)
-        delta_energy = energy_new - energy_current
+        delta_energy = self._step_delta_energy(z, r, energy_current, step_size)
         # direction=1 means keep increasing step_size, otherwise decreasing step_size.
         # Note that the direction is -1 if delta_energy is `NaN` which may be the
         # case for a diverging trajectory (e.g. in the case of evaluating log prob
@@ -187,26 +429,34 @@ class HMC(TraceKernel):
         # TODO: make thresholds for too small step_size or too large step_size
         while direction_new == direction:
             step_size = step_size_scale * step_size
-            z_new, r_new, z_grads, potential_energy = single_step_velocity_verlet(
-                z, r, self._potential_energy, step_size)
-            energy_new = potential_energy + self._kinetic_energy(r_new)
-            delta_energy = energy_new - energy_current
+            delta_energy = self._step_delta_energy(z, r, energy_current, step_size)
             direction_new = 1 if target_accept_logprob < -delta_energy else -1
         return step_size
 
-    def _adapt_step_size(self, accept_prob):
-        # calculate a statistic for Dual Averaging scheme
-        H = self._target_accept_prob - accept_prob
-        self._adapted_scheme.step(H)
-        log_step_size, _ = self._adapted_scheme.get_state()
-        self.step_size = math.exp(log_step_size)
-        self.num_steps = max(1, int(self.trajectory_length / self.step_size))
+    def _step_delta_energy(self, z, r, energy_current, step_size):
+        z_new, r_new, z_grads, potential_energy = single_step_velocity_verlet(
+            z, r, self._total_potential_energy, step_size, inverse_mass_matrix=self.inverse_mass_matrix)
+        if self.num_vectorized_chains == 1:
+            return potential_energy + self._kinetic_energy(r_new) - energy_current
+        # Use the energy difference matching the mean acceptance probability
+        # across chains; `NaN` for any chain propagates, as for a single chain.
+        delta_energy = self._energy(z_new, r_new) - energy_current
+        return math.log(self.num_vectorized_chains) - logsumexp(-delta_energy, 0)
+
+    def _adapt(self, z, accept_prob):
+        self._adapter.step(self._t, z, accept_prob)
+        if self.adapt_step_size:
+            self.num_steps = max(1, int(self.trajectory_length / self.step_size))
 
     def _validate_trace(self, trace):
         trace_eval = TraceEinsumEvaluator if self.use_einsum else TraceTreeEvaluator
         self._trace_prob_evaluator = trace_eval(trace,
                                                 self._has_enumerable_sites,
                                                 self.max_iarange_nesting)
+        self._log_prob_cache = _SiteLogProbCache(trace)
+        if self.num_vectorized_chains > 1 and self._has_enumerable_sites:
+            raise NotImplementedError("Vectorized chains are not supported for models "
+                                      "with discrete latent sites.")
         trace_log_prob_sum = self._compute_trace_log_prob(trace)
         if torch_isnan(trace_log_prob_sum) or torch_isinf(trace_log_prob_sum):
             raise ValueError("Model specification incorrect - trace log pdf is NaN or Inf.")
@@ -214,6 +464,9 @@ class HMC(TraceKernel):
     def initial_trace(self):
         return self._prototype_trace
 
+    def set_warmup_steps(self, warmup_steps):
+        self._warmup_steps = warmup_steps
+
     def setup(self, *args, **kwargs):
         self._args = args
         self._kwargs = kwargs
@@ -229,56 +482,63 @@ class HMC(TraceKernel):
             if node["fn"].has_enumerate_support:
                 self._has_enumerable_sites = True
                 continue
+        z = {}
+        for name, node in self._iter_latent_nodes(trace):
             site_value = node["value"]
             if node["fn"].support is not constraints.real and self._automatic_transform_enabled:
                 self.transforms[name] = biject_to(node["fn"].support).inv
-                site_value = self.transforms[name](node["value"])
-            r_loc = site_value.new_zeros(site_value.shape)
-            r_scale = site_value.new_ones(site_value.shape)
-            self._r_dist[name] = dist.Normal(loc=r_loc, scale=r_scale)
+            if name in self.transforms:
+                site_value = self.transforms[name](site_value)
+            z[name] = site_value
+            self._r_shapes[name] = site_value.shape
+            self._r_numels[name] = site_value.numel()
+        pos = 0
+        for name, numel in self._r_numels.items():
+            self._r_slices[name] = (pos, pos + numel)
+            pos += numel
         self._validate_trace(trace)
 
-        if self.adapt_step_size:
+        if self.jit_compile and z:
+            self._compile_potential_energy(self._pack(z) if self.packed_latents else z)
+
+        prototype = next(iter(z.values())) if z else None
+        self._adapter.configure(self._warmup_steps,
+                                sum(self._r_numels.values()),
+                                prototype=prototype,
+                                find_reasonable_step_size_fn=self._find_reasonable_step_size)
+        if self.adapt_step_size or self.adapt_mass_matrix:
             self._adapt_phase = True
-            z = {name: node["value"] for name, node in self._iter_latent_nodes(trace)}
-            for name, transform in self.transforms.items():
-                z[name] = transform(z[name])
-            with pyro.validation_enabled(False):
-                self.step_size = self._find_reasonable_step_size(z)
+        if self.adapt_step_size:
+            self._adapter.reset_step_size_adaptation(self._pack(z) if self.packed_latents else z)
             self.num_steps = max(1, int(self.trajectory_length / self.step_size))
-            # make prox-center for Dual Averaging scheme
-            loc = math.log(10 * self.step_size)
-            self._adapted_scheme = DualAveraging(prox_center=loc)
 
     def end_warmup(self):
-        if self.adapt_step_size:
-            self._adapt_phase = False
-            _, log_step_size_avg = self._adapted_scheme.get_state()
-            self.step_size = math.exp(log_step_size_avg)
-            self.num_steps = max(1, int(self.trajectory_length / self.step_size))
+        self._adapt_phase = False
 
     def cleanup(self):
         self._reset()
 
     def sample(self, trace):
-        z = {name: node["value"].detach() for name, node in self._iter_latent_nodes(trace)}
-        # automatically transform `z` to unconstrained space, if needed.
-        for name, transform in self.transforms.items():
-            z[name] = transform(z[name])
-        r = {name: pyro.sample("r_{}_t={}".format(name, self._t), self._r_dist[name])
-             for name in self._r_dist}
+        z = self._get_latents(trace)
+        r = self._sample_r(name="r_t={}".format(self._t))
 
         # Temporarily disable distributions args checking as
         # NaNs are expected during step size adaptation
         with optional(pyro.validation_enabled(False), self._adapt_phase):
             z_new, r_new = velocity_verlet(z, r,
-                                           self._potential_energy,
+                                           self._total_potential_energy,
                                            self.step_size,
-                                           self.num_steps)
+                                           self.num_steps,
+                                           inverse_mass_matrix=self.inverse_mass_matrix)
             # apply Metropolis correction.
             energy_proposal = self._energy(z_new, r_new)
             energy_current = self._energy(z, r)
         delta_energy = energy_proposal - energy_current
+        self._num_grad_evals += self.num_steps
+        if self.num_vectorized_chains > 1:
+            return self._sample_vectorized(z, z_new, delta_energy)
+        if torch_isnan(delta_energy) or delta_energy.item() >= self._max_delta_energy:
+            self._num_divergences += 1
         rand = pyro.sample("rand_t={}".format(self._t), dist.Uniform(torch.zeros(1), torch.ones(1)))
         if rand < (-delta_energy).exp():
             self._accept_cnt += 1
@@ -291,13 +551,37 @@ class HMC(TraceKernel):
                 accept_prob = delta_energy.new_tensor(0.0)
             else:
                 accept_prob = (-delta_energy).exp().clamp(max=1).item()
-            self._adapt_step_size(accept_prob)
+            self._adapt(z, accept_prob)
 
         self._t += 1
         # get trace with the constrained values for `z`.
-        for name, transform in self.transforms.items():
-            z[name] = transform.inv(z[name])
-        return self._get_trace(z)
+        return self._get_constrained_trace(z)
+
+    def _sample_vectorized(self, z, z_new, delta_energy):
+        num_chains = self.num_vectorized_chains
+        rand = pyro.sample("rand_t={}".format(self._t),
+                           dist.Uniform(torch.zeros(num_chains), torch.ones(num_chains)))
+        # `NaN` energies compare as False, i.e. diverging chains are rejected.
+        accept = rand < (-delta_energy).exp()
+        diverging = (delta_energy != delta_energy) | (delta_energy >= self._max_delta_energy)
+        self._num_divergences += diverging.sum().item() / num_chains
+        num_accepted = accept.sum().item()
+        self._accept_cnt += num_accepted / num_chains
+        if num_accepted:
+            z_accepted = {}
+            for name, value in z.items():
+                value = value.clone()
+                value[accept] = z_new[name][accept]
+                z_accepted[name] = value
+            z = z_accepted
+
+        if self._adapt_phase:
+            accept_prob = (-delta_energy).exp().clamp(max=1)
+            accept_prob[accept_prob != accept_prob] = 0.
+            self._adapt(z, accept_prob.mean().item())
+
+        self._t += 1
+        return self._get_constrained_trace(z)
 
     def diagnostics(self):
         return OrderedDict([
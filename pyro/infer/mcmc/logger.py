@@ -1,3 +1,5 @@
+from __future__ import absolute_import, division, print_function
+
 import json
 import logging
 import os
@@ -6,6 +8,33 @@ from collections import OrderedDict
 
 from tqdm.autonotebook import tqdm
 
+try:
+    from logging.handlers import QueueHandler
+except ImportError:  # Python 2
+    class QueueHandler(logging.Handler):
+        """
+        Minimal backport of :class:`logging.handlers.QueueHandler`, which
+        pushes log records onto a (multiprocessing) queue.
+        """
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def prepare(self, record):
+            self.format(record)
+            record.msg = record.getMessage()
+            record.args = None
+            record.exc_info = None
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except (KeyboardInterrupt, SystemExit) as e:
+                raise e
+            except Exception:
+                self.handleError(record)
+
 LOG_MSG = "LOG"
 TQDM_MSG = "TQDM"
 
@@ -98,7 +127,7 @@ def initialize_progbar(warmup_steps, num_samples, min_width=100, max_width=120,
     return progress_bar
 
 
-def initialize_logger(logger, chain_id, progress_bar=None):
+def initialize_logger(logger, chain_id, progress_bar=None, log_queue=None):
     """
     Initialize logger for the :class:`pyro.infer.mcmc` module.
 
@@ -106,12 +135,59 @@ def initialize_logger(logger, chain_id, progress_bar=None):
     :param int chain_id: `id` of the sampler, in case of
         multiple samplers.
     :param progress_bar: a :class:`tqdm.tqdm` instance.
+    :param log_queue: optional queue to which log records are
+        pushed instead of being handled locally. This is used by
+        worker processes when running multiple chains in parallel.
     """
     # Reset handler with new `progress_bar`.
     logger.handlers = []
     logger.propagate = False
-    handler = TqdmHandler()
-    logging_handler = MCMCLoggingHandler(handler, progress_bar)
+    if log_queue is not None:
+        logging_handler = QueueHandler(log_queue)
+    else:
+        handler = TqdmHandler()
+        logging_handler = MCMCLoggingHandler(handler, progress_bar)
     logging_handler.addFilter(MetadataFilter(chain_id))
     logger.addHandler(logging_handler)
     return logger
+
+
+def logger_thread(log_queue, warmup_steps, num_samples, num_chains):
+    """
+    Logging thread that asynchronously consumes logging events from `log_queue`,
+    and handles them appropriately. A separate progress bar is maintained for
+    each of the `num_chains` chains, keyed by the ``chain_id`` of the record.
+    The thread exits when it receives a ``None`` sentinel.
+
+    :param log_queue: queue of :class:`logging.LogRecord` instances.
+    :param int warmup_steps: Number of warmup steps per chain.
+    :param int num_samples: Number of MCMC samples per chain.
+    :param int num_chains: Number of chains run in parallel.
+    """
+    progress_bars = [initialize_progbar(warmup_steps, num_samples, pos=i)
+                     for i in range(num_chains)]
+    logger = logging.getLogger(__name__)
+    logger.propagate = False
+    logger.addHandler(TqdmHandler())
+    num_samples = [0] * num_chains
+    try:
+        while True:
+            record = log_queue.get()
+            if record is None:
+                break
+            chain_id = getattr(record, "chain_id", None)
+            msg_type = getattr(record, "msg_type", LOG_MSG)
+            if msg_type == TQDM_MSG and chain_id in range(num_chains):
+                pbar = progress_bars[chain_id]
+                diagnostics = json.loads(record.getMessage(),
+                                         object_pairs_hook=OrderedDict)
+                pbar.set_postfix(diagnostics)
+                num_samples[chain_id] += 1
+                if num_samples[chain_id] == warmup_steps + 1:
+                    pbar.set_description("Sample [{}]".format(chain_id))
+                pbar.update()
+            else:
+                logger.handle(record)
+    finally:
+        for pbar in progress_bars:
+            pbar.close()
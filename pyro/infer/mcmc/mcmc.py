@@ -1,33 +1,35 @@
 from __future__ import absolute_import, division, print_function
 
+import errno
 import json
 import logging
+import signal
+import socket
+import threading
+import warnings
 
+import six
+import torch
+import torch.multiprocessing as mp
+from six.moves import queue
+
+import pyro
 from pyro.infer import TracePosterior
-from pyro.infer.mcmc.logger import initialize_logger, initialize_progbar, TQDM_MSG
+from pyro.infer.mcmc.logger import initialize_logger, initialize_progbar, logger_thread, TQDM_MSG
+from pyro.util import optional
 
 
-class MCMC(TracePosterior):
+class _SingleSampler(TracePosterior):
     """
-    Wrapper class for Markov Chain Monte Carlo algorithms. Specific MCMC algorithms
-    are TraceKernel instances and need to be supplied as a ``kernel`` argument
-    to the constructor.
-
-    :param kernel: An instance of the ``TraceKernel`` class, which when
-        given an execution trace returns another sample trace from the target
-        (posterior) distribution.
-    :param int num_samples: The number of samples that need to be generated,
-        excluding the samples discarded during the warmup phase.
-    :param int warmup_steps: Number of warmup iterations. The samples generated
-        during the warmup phase are discarded.
+    Single process runner class optimized for the case `num_chains=1`.
     """
 
-    def __init__(self, kernel, num_samples, warmup_steps=0):
+    def __init__(self, kernel, num_samples, warmup_steps):
         self.kernel = kernel
         self.warmup_steps = warmup_steps
         self.num_samples = num_samples
-        self.logger = logging.getLogger("pyro.infer.mcmc")
-        super(MCMC, self).__init__()
+        self.logger = None
+        super(_SingleSampler, self).__init__()
 
     def _gen_samples(self, num_samples, init_trace):
         trace = init_trace
@@ -39,11 +41,16 @@ class MCMC(TracePosterior):
 
     def _traces(self, *args, **kwargs):
         chain_id = kwargs.pop("chain_id", 0)
-        progress_bar = initialize_progbar(self.warmup_steps, self.num_samples)
-        self.logger = initialize_logger(self.logger, chain_id, progress_bar)
+        log_queue = kwargs.pop("log_queue", None)
+        self.logger = logging.getLogger("pyro.infer.mcmc")
+        is_multiprocessing = log_queue is not None
+        progress_bar = initialize_progbar(self.warmup_steps, self.num_samples) \
+            if not is_multiprocessing else None
+        self.logger = initialize_logger(self.logger, chain_id, progress_bar, log_queue)
+        self.kernel.set_warmup_steps(self.warmup_steps)
         self.kernel.setup(*args, **kwargs)
         trace = self.kernel.initial_trace()
-        with progress_bar:
+        with optional(progress_bar, not is_multiprocessing):
             for trace in self._gen_samples(self.warmup_steps, trace):
                 continue
             self.kernel.end_warmup()
@@ -52,3 +59,178 @@ class MCMC(TracePosterior):
             for trace in self._gen_samples(self.num_samples, trace):
                 yield (trace, 1.0)
         self.kernel.cleanup()
+
+
+class _Worker(object):
+    """
+    Runs a single chain inside a worker process, pushing each
+    ``(trace, log_weight)`` sample onto ``result_queue``. A ``None``
+    sentinel is pushed once the chain completes, or the exception
+    instance if the chain fails.
+    """
+
+    def __init__(self, chain_id, result_queue, log_queue, kernel, num_samples, warmup_steps, rng_seed):
+        self.chain_id = chain_id
+        self.trace_gen = _SingleSampler(kernel, num_samples=num_samples, warmup_steps=warmup_steps)
+        self.rng_seed = rng_seed
+        self.log_queue = log_queue
+        self.result_queue = result_queue
+        self.default_tensor_type = torch.Tensor().type()
+
+    def run(self, *args, **kwargs):
+        # Each chain gets its own random stream.
+        pyro.set_rng_seed(self.rng_seed + self.chain_id)
+        torch.set_default_tensor_type(self.default_tensor_type)
+        kwargs["chain_id"] = self.chain_id
+        kwargs["log_queue"] = self.log_queue
+        try:
+            for sample in self.trace_gen._traces(*args, **kwargs):
+                self.result_queue.put_nowait((self.chain_id, sample))
+            self.result_queue.put_nowait((self.chain_id, None))
+        except Exception as e:
+            self.trace_gen.logger.exception(e)
+            self.result_queue.put_nowait((self.chain_id, e))
+
+
+class _ParallelSampler(TracePosterior):
+    """
+    Parallel runner class for running MCMC chains in parallel. This uses the
+    `torch.multiprocessing` module (itself a light wrapper over the python
+    `multiprocessing` module) to spin up parallel workers.
+    """
+
+    def __init__(self, kernel, num_samples, warmup_steps, num_chains, mp_context):
+        super(_ParallelSampler, self).__init__()
+        self.kernel = kernel
+        self.num_samples = num_samples
+        self.warmup_steps = warmup_steps
+        self.num_chains = num_chains
+        self.workers = []
+        self.ctx = mp
+        if mp_context:
+            if six.PY2:
+                raise ValueError("multiprocessing.get_context() is "
+                                 "not supported in Python 2.")
+            self.ctx = mp.get_context(mp_context)
+        self.result_queue = self.ctx.Manager().Queue()
+        self.log_queue = self.ctx.Manager().Queue()
+        self.log_thread = None
+
+    def init_workers(self, *args, **kwargs):
+        self.workers = []
+        # Draw the base seed in the parent so that runs are reproducible
+        # under `pyro.set_rng_seed`.
+        rng_seed = int(torch.randint(0, 2 ** 31 - 1, (1,)).item())
+        for i in range(self.num_chains):
+            worker = _Worker(i, self.result_queue, self.log_queue, self.kernel,
+                             self.num_samples, self.warmup_steps, rng_seed)
+            process = self.ctx.Process(name=str(i), target=worker.run, args=args, kwargs=kwargs)
+            process.daemon = True
+            self.workers.append(process)
+
+    def terminate(self):
+        if self.log_thread is not None and self.log_thread.is_alive():
+            self.log_queue.put_nowait(None)
+            self.log_thread.join(timeout=1)
+        for w in self.workers:
+            if w.is_alive():
+                w.terminate()
+
+    def _traces(self, *args, **kwargs):
+        self.log_thread = threading.Thread(target=logger_thread,
+                                           args=(self.log_queue, self.warmup_steps,
+                                                 self.num_samples, self.num_chains))
+        self.log_thread.daemon = True
+        self.log_thread.start()
+        # Ignore sigint in worker processes; they will be shut down
+        # when the main process terminates.
+        sigint_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.init_workers(*args, **kwargs)
+        # restore original handler
+        signal.signal(signal.SIGINT, sigint_handler)
+        active_workers = self.num_chains
+        try:
+            for w in self.workers:
+                w.start()
+            while active_workers:
+                try:
+                    chain_id, val = self.result_queue.get(timeout=5)
+                # This can happen when the worker process has terminated.
+                # See https://github.com/pytorch/pytorch/pull/5380 for motivation.
+                except socket.error as e:
+                    if getattr(e, "errno", None) == errno.ENOENT:
+                        continue
+                    raise e
+                except queue.Empty:
+                    continue
+                if isinstance(val, Exception):
+                    # Exception trace is already logged by worker.
+                    raise val
+                elif val is not None:
+                    trace, log_weight = val
+                    yield trace, log_weight, chain_id
+                else:
+                    active_workers -= 1
+        finally:
+            self.terminate()
+
+
+class MCMC(TracePosterior):
+    """
+    Wrapper class for Markov Chain Monte Carlo algorithms. Specific MCMC algorithms
+    are TraceKernel instances and need to be supplied as a ``kernel`` argument
+    to the constructor.
+
+    .. note:: The case of `num_chains > 1` uses python multiprocessing to
+        run parallel chains in multiple processes. This goes with the usual
+        caveats around multiprocessing in python, e.g. the model used to
+        initialize the ``kernel`` must be serializable via `pickle` when a
+        non-`fork` start method is used, and the performance / constraints
+        will be platform dependent (e.g. only the "spawn" context is
+        available in Windows).
+
+    :param kernel: An instance of the ``TraceKernel`` class, which when
+        given an execution trace returns another sample trace from the target
+        (posterior) distribution.
+    :param int num_samples: The number of samples that need to be generated,
+        excluding the samples discarded during the warmup phase.
+    :param int warmup_steps: Number of warmup iterations. The samples generated
+        during the warmup phase are discarded.
+    :param int num_chains: Number of MCMC chains to run in parallel. Each chain
+        runs in its own worker process, with its own random seed, and samples
+        from all chains are merged into this posterior. Depending on
+        hardware, this might be much faster than running the chains
+        sequentially.
+    :param str mp_context: Multiprocessing context to use when `num_chains > 1`.
+        Only applicable for Python 3.5 and above. Use `mp_context="spawn"` for
+        CUDA.
+    :param list store_sites: optional list of sites whose values are recorded
+        in a compact :class:`~pyro.infer.abstract_infer.SampleStore` instead of
+        keeping full execution traces, which bounds the memory used by long
+        runs.
+    :param int thin: keep only every ``thin``-th sample of each chain.
+    :param str store_dir: optional directory in which the values of
+        ``store_sites`` are memory-mapped.
+    """
+
+    def __init__(self, kernel, num_samples, warmup_steps=0, num_chains=1, mp_context=None,
+                 store_sites=None, thin=1, store_dir=None):
+        self.kernel = kernel
+        self.warmup_steps = warmup_steps
+        self.num_samples = num_samples
+        if num_chains > 1:
+            cpu_count = mp.cpu_count()
+            if num_chains > cpu_count:
+                warnings.warn("`num_chains` is more than CPU count - {}. "
+                              "Resetting num_chains to CPU count.".format(cpu_count))
+                num_chains = cpu_count
+        self.num_chains = num_chains
+        if num_chains > 1:
+            self.sampler = _ParallelSampler(kernel, num_samples, warmup_steps, num_chains, mp_context)
+        else:
+            self.sampler = _SingleSampler(kernel, num_samples, warmup_steps)
+        super(MCMC, self).__init__(store_sites=store_sites, thin=thin, store_dir=store_dir)
+
+    def _traces(self, *args, **kwargs):
+        for sample in self.sampler._traces(*args, **kwargs):
+            yield sample
@@ -1,24 +1,49 @@
 from __future__ import absolute_import, division, print_function
 
+import math
 from collections import namedtuple
 
 import torch
 
 import pyro
 import pyro.distributions as dist
-from pyro.ops.integrator import single_step_velocity_verlet
-from pyro.util import torch_isnan
+from pyro.ops.integrator import _kinetic_grad, single_step_velocity_verlet
 
 from pyro.infer.mcmc.hmc import HMC
 
-# sum_accept_probs and num_proposals are used to calculate
-# the statistic accept_prob for Dual Averaging scheme;
-# z_left_grads and z_right_grads are kept to avoid recalculating
-# grads at left and right leaves
-_TreeInfo = namedtuple("TreeInfo", ["z_left", "r_left", "z_left_grads",
-                                    "z_right", "r_right", "z_right_grads",
-                                    "z_proposal", "size", "turning", "diverging",
-                                    "sum_accept_probs", "num_proposals"])
+# Summary of a subtree built along one direction of the trajectory:
+# z_end, r_end and z_end_grads are the state at its outermost leaf (the grads
+# are kept to avoid recalculating them when extending the trajectory);
+# log_weight is the log of the sum of the (unnormalized) multinomial weights
+# exp(-energy) of its leaves, relative to the initial energy; sum_accept_probs
+# and num_proposals are used to calculate the statistic accept_prob for the
+# Dual Averaging scheme.
+_TreeInfo = namedtuple("TreeInfo", ["z_end", "r_end", "z_end_grads", "z_proposal", "log_weight",
+                                    "turning", "diverging", "sum_accept_probs", "num_proposals"])
+
+
+def _logaddexp(x, y):
+    if x == -float("inf"):
+        return y
+    m = max(x, y)
+    return m + math.log(math.exp(x - m) + math.exp(y - m))
+
+
+def _leaf_idx_to_ckpt_idxs(n):
+    """
+    Returns the (inclusive) range of checkpoint indices to check for a U-turn
+    when adding leaf ``n`` of a subtree. For an even ``n``, the upper index is
+    the slot in which the state at this leaf should be checkpointed.
+    """
+    # number of non-zero bits except the last bit, e.g. 6 -> 2, 7 -> 2, 13 -> 2
+    idx_max = bin(n >> 1).count("1")
+    # number of contiguous trailing non-zero bits, e.g. 6 -> 0, 7 -> 3, 13 -> 1
+    num_subtrees = 0
+    while n & 1:
+        n >>= 1
+        num_subtrees += 1
+    idx_min = idx_max - num_subtrees + 1
+    return idx_min, idx_max
 
 
 class NUTS(HMC):
@@ -39,7 +64,6 @@ class NUTS(HMC):
     [1] `The No-U-turn sampler: adaptively setting path lengths in Hamiltonian Monte Carlo`,
     Matthew D. Hoffman, and Andrew Gelman.
     [2] `A Conceptual Introduction to Hamiltonian Monte Carlo`, Michael Betancourt
-    [3] `Slice Sampling`, Radford M. Neal
 
     :param model: Python callable containing Pyro primitives.
     :param float step_size: Determines the size of a single step taken by the
@@ -47,6 +71,11 @@ class NUTS(HMC):
         dynamics. If not specified, it will be set to 1.
     :param bool adapt_step_size: A flag to decide if we want to adapt step_size
         during warm-up phase using Dual Averaging scheme.
+    :param bool adapt_mass_matrix: A flag to decide if we want to adapt the mass
+        matrix during warm-up phase. Adaptation follows Stan's windowed scheme,
+        see :class:`~pyro.infer.mcmc.adaptation.WarmupAdapter`.
+    :param bool full_mass: A flag to decide if the adapted mass matrix is dense
+        (``True``) or diagonal (``False``).
     :param dict transforms: Optional dictionary that specifies a transform
         for a sample site with constrained support to unconstrained space. The
         transform should be invertible, and implement `log_abs_det_jacobian`.
@@ -60,6 +89,12 @@ class NUTS(HMC):
         to evaluat log pdf for the model trace. No-op unless the trace has
         discrete sample sites. This flag is experimental and will most likely
         be removed in a future release.
+    :param bool packed_latents: Whether the integrator works on a packed 1-D
+        tensor of all the unconstrained latents rather than on a dictionary of
+        per-site tensors (see :class:`~pyro.infer.mcmc.HMC`).
+    :param bool jit_compile: Whether to compile the potential energy function
+        with :func:`pyro.ops.jit.compile`, falling back to the uncompiled
+        potential energy if compilation fails (see :class:`~pyro.infer.mcmc.HMC`).
 
     Example:
 
@@ -85,167 +120,137 @@ class NUTS(HMC):
                  model,
                  step_size=None,
                  adapt_step_size=False,
+                 adapt_mass_matrix=False,
+                 full_mass=False,
                  transforms=None,
                  max_iarange_nesting=float("inf"),
-                 experimental_use_einsum=False):
+                 experimental_use_einsum=False,
+                 packed_latents=False,
+                 jit_compile=False):
         super(NUTS, self).__init__(model,
                                    step_size,
                                    adapt_step_size=adapt_step_size,
+                                   adapt_mass_matrix=adapt_mass_matrix,
+                                   full_mass=full_mass,
                                    transforms=transforms,
                                    max_iarange_nesting=max_iarange_nesting,
-                                   experimental_use_einsum=experimental_use_einsum)
+                                   experimental_use_einsum=experimental_use_einsum,
+                                   packed_latents=packed_latents,
+                                   jit_compile=jit_compile)
 
         self._max_tree_depth = 10  # from Stan
         # There are three conditions to stop doubling process:
         #     + Tree is becoming too big.
         #     + The trajectory is making a U-turn.
-        #     + The probability of the states becoming negligible: p(z, r) << u,
-        # here u is the "slice" variable introduced at the `self.sample(...)` method.
-        # Denote E_p = -log p(z, r), E_u = -log u, the third condition is equivalent to
-        #     sliced_energy := E_p - E_u >= some constant =: max_sliced_energy.
+        #     + The probability of the states becoming negligible: p(z, r) << p(z_0, r_0).
+        # Denote E = -log p(z, r), the third condition is equivalent to
+        #     delta_energy := E - E_0 >= some constant =: max_delta_energy.
         # This also suggests the notion "diverging" in the implemenation:
-        #     when the energy E_p diverges from E_u too much, we stop doubling.
+        #     when the energy E diverges from E_0 too much, we stop doubling.
         # Here, as suggested in [1], we set dE_max = 1000.
-        self._max_sliced_energy = 1000
+        self._max_delta_energy = 1000
+
+    def _reset(self):
+        super(NUTS, self)._reset()
+        # Depth of the tree built by the last call to :meth:`sample`.
+        self._tree_depth = 0
 
     def _is_turning(self, z_left, r_left, z_right, r_right):
+        # The U-turn criterion is taken w.r.t. the velocities M^{-1} r,
+        # which coincide with the momenta for the identity mass matrix.
+        v_left = _kinetic_grad(self.inverse_mass_matrix, r_left)
+        v_right = _kinetic_grad(self.inverse_mass_matrix, r_right)
+        if torch.is_tensor(z_left):
+            dz = z_right - z_left
+            return dz.dot(v_left) < 0 or dz.dot(v_right) < 0
         diff_left = 0
         diff_right = 0
-        for name in self._r_dist:
+        for name in self._r_shapes:
             dz = z_right[name] - z_left[name]
-            diff_left += (dz * r_left[name]).sum()
-            diff_right += (dz * r_right[name]).sum()
+            diff_left += (dz * v_left[name]).sum()
+            diff_right += (dz * v_right[name]).sum()
         return diff_left < 0 or diff_right < 0
 
-    def _build_basetree(self, z, r, z_grads, log_slice, direction, energy_current):
+    def _build_subtree(self, z, r, z_grads, direction, tree_depth, energy_current):
+        """
+        Iteratively builds a subtree with ``2 ** tree_depth`` leaves, starting
+        from the leaf ``(z, r)`` and moving along ``direction``.
+
+        Rather than recursing, the leaves are generated one by one. The states
+        at the leftmost leaves of the sub-subtrees that are still open are
+        checkpointed, so only O(tree_depth) states are kept around to check
+        the U-turn condition of every sub-subtree once its last leaf is
+        reached. The proposal is drawn by progressive multinomial sampling
+        over the leaves [2].
+        """
         step_size = self.step_size if direction == 1 else -self.step_size
-        z_new, r_new, z_grads, potential_energy = single_step_velocity_verlet(
-            z, r, self._potential_energy, step_size, z_grads=z_grads)
-        energy_new = potential_energy + self._kinetic_energy(r_new)
-        sliced_energy = energy_new + log_slice
-
-        # As a part of the slice sampling process (see below), along the trajectory
-        #     we eliminate states which p(z, r) < u, or dE > 0.
-        # Due to this elimination (and stop doubling conditions),
-        #     the size of binary tree might not equal to 2^tree_depth.
-        tree_size = 1 if sliced_energy <= 0 else 0
-        # Special case: Set diverging to True and accept prob to 0 if the
-        # diverging trajectory returns `NaN` energy (e.g. in the case of
-        # evaluating log prob of a value simulated using a large step size
-        # for a constrained sample site).
-        if torch_isnan(energy_new):
-            diverging = True
-            accept_prob = energy_new.new_tensor(0.0)
-        else:
-            diverging = (sliced_energy >= self._max_sliced_energy)
-            delta_energy = energy_new - energy_current
-            accept_prob = (-delta_energy).exp().clamp(max=1)
-        return _TreeInfo(z_new, r_new, z_grads, z_new, r_new, z_grads,
-                         z_new, tree_size, False, diverging, accept_prob, 1)
-
-    def _build_tree(self, z, r, z_grads, log_slice, direction, tree_depth, energy_current):
-        if tree_depth == 0:
-            return self._build_basetree(z, r, z_grads, log_slice, direction, energy_current)
-
-        # build the first half of tree
-        half_tree = self._build_tree(z, r, z_grads, log_slice,
-                                     direction, tree_depth-1, energy_current)
-        z_proposal = half_tree.z_proposal
-
-        # Check conditions to stop doubling. If we meet that condition,
-        #     there is no need to build the other tree.
-        if half_tree.turning or half_tree.diverging:
-            return half_tree
-
-        # Else, build remaining half of tree.
-        # If we are going to the right, start from the right leaf of the first half.
-        if direction == 1:
-            z = half_tree.z_right
-            r = half_tree.r_right
-            z_grads = half_tree.z_right_grads
-        else:  # otherwise, start from the left leaf of the first half
-            z = half_tree.z_left
-            r = half_tree.r_left
-            z_grads = half_tree.z_left_grads
-        other_half_tree = self._build_tree(z, r, z_grads, log_slice,
-                                           direction, tree_depth-1, energy_current)
-
-        tree_size = half_tree.size + other_half_tree.size
-        sum_accept_probs = half_tree.sum_accept_probs + other_half_tree.sum_accept_probs
-        num_proposals = half_tree.num_proposals + other_half_tree.num_proposals
-
-        # Under the slice sampling process, a proposal for z is uniformly picked.
-        # The probability of that proposal belongs to which half of tree
-        #     is computed based on the sizes of each half.
-        # For the special case that the sizes of each half are both 0,
-        #     we choose the proposal from the first half
-        #     (any is fine, because the probability of picking it at the end is 0!).
-        if tree_size != 0:
-            other_half_tree_prob = other_half_tree.size / tree_size
-            is_other_half_tree = pyro.sample("is_other_halftree",
-                                             dist.Bernoulli(probs=torch.ones(1) * other_half_tree_prob))
-            if int(is_other_half_tree.item()) == 1:
-                z_proposal = other_half_tree.z_proposal
-
-        # leaves of the full tree are determined by the direction
-        if direction == 1:
-            z_left = half_tree.z_left
-            r_left = half_tree.r_left
-            z_left_grads = half_tree.z_left_grads
-            z_right = other_half_tree.z_right
-            r_right = other_half_tree.r_right
-            z_right_grads = other_half_tree.z_right_grads
-        else:
-            z_left = other_half_tree.z_left
-            r_left = other_half_tree.r_left
-            z_left_grads = other_half_tree.z_left_grads
-            z_right = half_tree.z_right
-            r_right = half_tree.r_right
-            z_right_grads = half_tree.z_right_grads
-
-        # We already check if first half tree is turning. Now, we check
-        #     if the other half tree or full tree are turning.
-        turning = other_half_tree.turning or self._is_turning(z_left, r_left, z_right, r_right)
-
-        # The divergence is checked by the second half tree (the first half is already checked).
-        diverging = other_half_tree.diverging
-
-        return _TreeInfo(z_left, r_left, z_left_grads, z_right, r_right, z_right_grads, z_proposal,
-                         tree_size, turning, diverging, sum_accept_probs, num_proposals)
+        z_ckpts = [None] * tree_depth
+        r_ckpts = [None] * tree_depth
+        z_proposal = None
+        log_weight = -float("inf")
+        sum_accept_probs = 0.
+        turning = diverging = False
+        num_proposals = 0
+        for leaf_idx in range(2 ** tree_depth):
+            z, r, z_grads, potential_energy = single_step_velocity_verlet(
+                z, r, self._potential_energy, step_size, z_grads=z_grads,
+                inverse_mass_matrix=self.inverse_mass_matrix)
+            energy_new = potential_energy + self._kinetic_energy(r)
+            delta_energy = (energy_new - energy_current).item()
+            num_proposals += 1
+            # Special case: Set diverging to True and accept prob to 0 if the
+            # diverging trajectory returns `NaN` energy (e.g. in the case of
+            # evaluating log prob of a value simulated using a large step size
+            # for a constrained sample site).
+            if math.isnan(delta_energy) or delta_energy >= self._max_delta_energy:
+                diverging = True
+                break
+            sum_accept_probs += math.exp(min(0., -delta_energy))
+
+            # Progressive multinomial sampling: the new leaf replaces the current
+            # proposal with probability proportional to its weight exp(-delta_energy).
+            log_weight = _logaddexp(log_weight, -delta_energy)
+            if torch.rand(1).item() < math.exp(-delta_energy - log_weight):
+                z_proposal = z
+
+            # Check the U-turn condition of each sub-subtree ending at this leaf.
+            idx_min, idx_max = _leaf_idx_to_ckpt_idxs(leaf_idx)
+            if leaf_idx % 2 == 0:
+                if idx_max < tree_depth:
+                    z_ckpts[idx_max], r_ckpts[idx_max] = z, r
+                continue
+            for i in range(idx_max, idx_min - 1, -1):
+                if direction == 1:
+                    turning = self._is_turning(z_ckpts[i], r_ckpts[i], z, r)
+                else:
+                    turning = self._is_turning(z, r, z_ckpts[i], r_ckpts[i])
+                if turning:
+                    break
+            if turning:
+                break
+
+        return _TreeInfo(z, r, z_grads, z_proposal, log_weight, turning, diverging,
+                         sum_accept_probs, num_proposals)
 
     def sample(self, trace):
-        z = {name: node["value"].detach() for name, node in self._iter_latent_nodes(trace)}
-        # automatically transform `z` to unconstrained space, if needed.
-        for name, transform in self.transforms.items():
-            z[name] = transform(z[name])
-        r = {name: pyro.sample("r_{}_t={}".format(name, self._t), self._r_dist[name])
-             for name in self._r_dist}
+        z = self._get_latents(trace)
+        r = self._sample_r(name="r_t={}".format(self._t))
         energy_current = self._energy(z, r)
 
-        # Ideally, following a symplectic integrator trajectory, the energy is constant.
-        # In that case, we can sample the proposal uniformly, and there is no need to use "slice".
-        # However, it is not the case for real situation: there are errors during the computation.
-        # To deal with that problem, as in [1], we introduce an auxiliary "slice" variable (denoted by u).
-        # The sampling process goes as follows:
-        #     first sampling u from initial state (z_0, r_0) according to u ~ Uniform(0, p(z_0, r_0)),
-        #     then sampling state (z, r) from the integrator trajectory according to
-        #         (z, r) ~ Uniform({(z', r') in trajectory | p(z', r') >= u}).
-        #
-        # For more information about slice sampling method, see [3].
-        # For another version of NUTS which uses multinomial sampling instead of slice sampling, see
-        # [2].
-
-        # Rather than sampling the slice variable from `Uniform(0, exp(-energy))`, we can
-        # sample log_slice directly using `energy`, so as to avoid potential underflow or
-        # overflow issues ([2]).
-        slice_exp_term = pyro.sample("slicevar_exp_t={}".format(self._t),
-                                     dist.Exponential(energy_current.new_tensor(1.)))
-        log_slice = -energy_current - slice_exp_term
-
+        # We use multinomial sampling (see [2]): a proposal is drawn from all the
+        # states of the trajectory with probability proportional to exp(-energy).
+        # Within a subtree, the proposal is sampled progressively leaf by leaf;
+        # when a new subtree is merged into the trajectory, its proposal is
+        # accepted with probability min(1, w_new / w_old) where w_new and w_old
+        # are the total weights of the new subtree and of the current trajectory
+        # ("biased progressive sampling", which favours moving further away).
+        # All internal randomness is drawn directly from the torch generator.
         z_left = z_right = z
         r_left = r_right = r
         z_left_grads = z_right_grads = None
-        tree_size = 1
+        tree_log_weight = 0.  # the initial state has weight exp(0)
+        sum_accept_probs = 0.
+        num_proposals = 0
         accepted = False
 
         # Temporarily disable distributions args checking as
@@ -254,45 +259,41 @@ class NUTS(HMC):
         with dist.validation_enabled(dist_arg_check):
             # doubling process, stop when turning or diverging
             for tree_depth in range(self._max_tree_depth + 1):
-                direction = pyro.sample("direction_t={}_treedepth={}".format(self._t, tree_depth),
-                                        dist.Bernoulli(probs=torch.ones(1) * 0.5))
-                direction = int(direction.item())
+                direction = 1 if torch.rand(1).item() < 0.5 else -1
                 if direction == 1:  # go to the right, start from the right leaf of current tree
-                    new_tree = self._build_tree(z_right, r_right, z_right_grads, log_slice,
-                                                direction, tree_depth, energy_current)
+                    new_tree = self._build_subtree(z_right, r_right, z_right_grads,
+                                                   direction, tree_depth, energy_current)
                     # update leaf for the next doubling process
-                    z_right = new_tree.z_right
-                    r_right = new_tree.r_right
-                    z_right_grads = new_tree.z_right_grads
+                    z_right, r_right, z_right_grads = new_tree.z_end, new_tree.r_end, new_tree.z_end_grads
                 else:  # go the the left, start from the left leaf of current tree
-                    new_tree = self._build_tree(z_left, r_left, z_left_grads, log_slice,
-                                                direction, tree_depth, energy_current)
-                    z_left = new_tree.z_left
-                    r_left = new_tree.r_left
-                    z_left_grads = new_tree.z_left_grads
+                    new_tree = self._build_subtree(z_left, r_left, z_left_grads,
+                                                   direction, tree_depth, energy_current)
+                    z_left, r_left, z_left_grads = new_tree.z_end, new_tree.r_end, new_tree.z_end_grads
+                sum_accept_probs += new_tree.sum_accept_probs
+                num_proposals += new_tree.num_proposals
 
                 if new_tree.turning or new_tree.diverging:  # stop doubling
                     break
 
-                rand = pyro.sample("rand_t={}_treedepth={}".format(self._t, tree_depth),
-                                   dist.Uniform(torch.zeros(1), torch.ones(1)))
-                if rand < new_tree.size / tree_size:
+                if torch.rand(1).item() < math.exp(min(0., new_tree.log_weight - tree_log_weight)):
                     accepted = True
                     z = new_tree.z_proposal
+                tree_log_weight = _logaddexp(tree_log_weight, new_tree.log_weight)
 
                 if self._is_turning(z_left, r_left, z_right, r_right):  # stop doubling
                     break
-                else:  # update tree_size
-                    tree_size += new_tree.size
+
+        self._num_grad_evals += num_proposals
+        if new_tree.diverging:
+            self._num_divergences += 1
+        self._tree_depth = tree_depth
 
         if self._adapt_phase:
-            accept_prob = new_tree.sum_accept_probs / new_tree.num_proposals
-            self._adapt_step_size(accept_prob)
+            accept_prob = sum_accept_probs / num_proposals
+            self._adapt(z, accept_prob)
 
         if accepted:
             self._accept_cnt += 1
         self._t += 1
         # get trace with the constrained values for `z`.
-        for name, transform in self.transforms.items():
-            z[name] = transform.inv(z[name])
-        return self._get_trace(z)
+        return self._get_constrained_trace(z)
@@ -8,6 +8,15 @@ from six import add_metaclass
 @add_metaclass(ABCMeta)
 class TraceKernel(object):
 
+    def set_warmup_steps(self, warmup_steps):
+        """
+        Optional method to tell kernel the number of warm-up iterations of the
+        simulation run. This is called before :meth:`setup`.
+
+        :param int warmup_steps: Number of warmup iterations.
+        """
+        pass
+
     def setup(self, *args, **kwargs):
         """
         Optional method to set up any state required at the start of the
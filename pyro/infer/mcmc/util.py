@@ -6,10 +6,84 @@ from opt_einsum import shared_intermediates
 from pyro.distributions.util import logsumexp, broadcast_shape
 from pyro.ops.contract import contract_to_tensor
 from pyro.infer.util import is_validation_enabled
+from pyro.poutine.trace_messenger import identify_dense_edges
+from pyro.poutine.trace_struct import FlatTrace
 from pyro.primitives import _Subsample
 from pyro.util import check_site_shape
 
 
+class _SiteLogProbCache(object):
+    """
+    Caches the log prob terms of each sample site of a static model between
+    evaluations of its log density. The terms of a site are keyed by the value
+    of the site, of the sample sites it may depend on (as given by
+    :func:`~pyro.poutine.trace_messenger.identify_dense_edges`), of all param
+    sites and of the model args, so that only sites downstream of changed
+    values are recomputed. Tensors are compared by their memory location,
+    shape, strides and in-place version, so that views of the same data
+    (e.g. ``data[i]``) match, and other values by identity. The cache holds
+    references to these values, so their memory cannot be reused meanwhile.
+
+    Terms are cached together with their autograd graph. With grad disabled,
+    cached terms are reused detached. With grad enabled, they are only reused
+    if neither they nor the current inputs require grad, since the graph of
+    a cached term may already have been freed by a backward pass.
+
+    :param model_trace: execution trace from a static model.
+    """
+    _log_prob_keys = ("unscaled_log_prob", "log_prob", "log_prob_sum")
+
+    def __init__(self, model_trace):
+        graph = model_trace.to_graph() if isinstance(model_trace, FlatTrace) else model_trace.copy()
+        identify_dense_edges(graph)
+        self._inputs = {name: [name] + list(graph.predecessors(name)) + graph.param_nodes
+                        for name, site in graph.nodes.items() if site["type"] == "sample"}
+        self._cache = {}
+
+    def _get_inputs(self, model_trace, name, args, kwargs):
+        values = tuple(model_trace.nodes[n]["value"] if n in model_trace else None
+                       for n in self._inputs[name])
+        values = values + tuple(args) + tuple(kwargs[key] for key in sorted(kwargs))
+        key = tuple((x.data_ptr(), x.size(), x.stride(), x._version) if torch.is_tensor(x) else id(x)
+                    for x in values)
+        return values, key
+
+    def fill(self, model_trace, args, kwargs):
+        """
+        Sets the cached log prob terms of the sites of ``model_trace`` whose
+        inputs did not change, so that they are not recomputed.
+
+        :param model_trace: execution trace of the model.
+        :param tuple args: positional args the model was run with.
+        :param dict kwargs: keyword args the model was run with.
+        """
+        grad_enabled = torch.is_grad_enabled()
+        for name, site in model_trace.nodes.items():
+            if site["type"] != "sample" or name not in self._cache:
+                continue
+            values, key = self._get_inputs(model_trace, name, args, kwargs)
+            _, cached_key, log_probs = self._cache[name]
+            if key != cached_key:
+                continue
+            if grad_enabled and any(x.requires_grad for x in values + tuple(log_probs.values())
+                                    if torch.is_tensor(x)):
+                continue
+            site.update((k, x.detach()) for k, x in log_probs.items())
+
+    def update(self, model_trace, args, kwargs):
+        """
+        Caches the log prob terms computed for the sites of ``model_trace``.
+        """
+        for name, site in model_trace.nodes.items():
+            if site["type"] != "sample" or name not in self._inputs:
+                continue
+            log_probs = {key: site[key] for key in self._log_prob_keys
+                         if torch.is_tensor(site.get(key))}
+            if log_probs:
+                values, key = self._get_inputs(model_trace, name, args, kwargs)
+                self._cache[name] = values, key, log_probs
+
+
 class TraceTreeEvaluator(object):
     """
     Computes the log probability density of a trace (of a model with
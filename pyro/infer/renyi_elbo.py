@@ -6,8 +6,7 @@ import torch
 
 from pyro.distributions.util import is_identically_zero, logsumexp
 from pyro.infer.elbo import ELBO
-from pyro.infer.enum import get_importance_trace
-from pyro.infer.util import is_validation_enabled, torch_item
+from pyro.infer.util import torch_item
 from pyro.util import check_if_enumerated, warn_if_nan
 
 
@@ -35,10 +34,17 @@ class RenyiELBO(ELBO):
         (gradient) estimator. Default is 2.
     :param int max_iarange_nesting: Bound on max number of nested
         :func:`pyro.iarange` contexts. Default is infinity.
+    :param bool vectorize_particles: Whether to compute all particles in a
+        single batched pass, by wrapping the model and guide in an outermost
+        :class:`~pyro.iarange` over particles. This requires a finite value
+        for ``max_iarange_nesting``. Default is False.
     :param bool strict_enumeration_warning: Whether to warn about possible
         misuse of enumeration, i.e. that
         :class:`~pyro.infer.traceenum_elbo.TraceEnum_ELBO` is used iff there
         are enumerated sample sites.
+    :param bool static_structure: Whether to reuse trace validation across
+        steps while the structure of the model and guide is unchanged. See
+        :class:`~pyro.infer.elbo.ELBO`.
 
     References:
 
@@ -54,24 +60,24 @@ class RenyiELBO(ELBO):
                  num_particles=2,
                  max_iarange_nesting=float('inf'),
                  vectorize_particles=False,
-                 strict_enumeration_warning=True):
+                 strict_enumeration_warning=True,
+                 static_structure=False):
         if alpha == 1:
             raise ValueError("The order alpha should not be equal to 1. Please use Trace_ELBO class"
                              "for the case alpha = 1.")
         self.alpha = alpha
         super(RenyiELBO, self).__init__(num_particles, max_iarange_nesting, vectorize_particles,
-                                        strict_enumeration_warning)
+                                        strict_enumeration_warning, static_structure)
 
     def _get_trace(self, model, guide, *args, **kwargs):
         """
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "flat", self.max_iarange_nesting, model, guide, *args, **kwargs)
-        if is_validation_enabled():
-            check_if_enumerated(guide_trace)
-        return model_trace, guide_trace
+        return self._get_importance_trace("flat", model, guide, *args, **kwargs)
+
+    def _validate_traces(self, model_trace, guide_trace):
+        check_if_enumerated(guide_trace)
 
     def loss(self, model, guide, *args, **kwargs):
         """
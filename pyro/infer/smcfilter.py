@@ -0,0 +1,215 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+
+import torch
+
+import pyro
+import pyro.poutine as poutine
+from pyro.distributions import Categorical, Empirical
+from pyro.distributions.util import logsumexp
+from pyro.poutine.util import site_is_subsample
+
+
+class SMCFailed(ValueError):
+    """
+    Exception raised when :class:`SMCFilter` fails to find any hypothesis with
+    nonzero probability.
+    """
+    pass
+
+
+class SMCFilter(object):
+    """
+    :class:`SMCFilter` is the top-level interface for filtering via sequential
+    Monte Carlo.
+
+    The model and guide should be objects with two methods: ``.init(state, ...)``
+    and ``.step(state, ...)``, intended to be called first with :meth:`init`,
+    then with :meth:`step` repeatedly, typically once per time step. These two
+    methods should have the same signature as :meth:`init` and :meth:`step` of
+    this class, but with an extra first argument ``state`` that should be used
+    to store all tensors that depend on sampled variables. The ``state`` is a
+    dict-like :class:`SMCState` mapping arbitrary keys to tensors whose
+    leftmost dim is the particle dim. Models can read and write ``state`` but
+    guides should only read from it.
+
+    All particles are simulated in a single batched execution of the model and
+    guide, inside an outermost :class:`~pyro.iarange` over particles and a
+    :class:`~pyro.poutine.broadcast` poutine. After each step the particles are
+    resampled by systematic resampling whenever their effective sample size
+    falls below ``ess_threshold * num_particles``.
+
+    :param object model: probabilistic model with ``init`` and ``step`` methods
+    :param object guide: guide used for sampling, with ``init`` and ``step``
+        methods
+    :param int num_particles: The number of particles used to form the
+        distribution.
+    :param int max_iarange_nesting: Bound on max number of nested
+        :func:`pyro.iarange` contexts in the model and guide.
+    :param float ess_threshold: Fraction of ``num_particles`` below which the
+        effective sample size triggers resampling. Defaults to 0.5; use 1.0
+        to resample after every step.
+    """
+    def __init__(self, model, guide, num_particles, max_iarange_nesting, ess_threshold=0.5):
+        if not (0 < ess_threshold <= 1):
+            raise ValueError("Expected 0 < ess_threshold <= 1, but got {}".format(ess_threshold))
+        self.model = model
+        self.guide = guide
+        self.num_particles = num_particles
+        self.max_iarange_nesting = max_iarange_nesting + 1
+        self.ess_threshold = ess_threshold
+
+        # Equivalent to an empty dict, but also holds the particle weights.
+        self.state = SMCState(self.num_particles)
+        self._log_normalizer = 0.
+
+    def init(self, *args, **kwargs):
+        """
+        Perform any initialization for sequential importance resampling.
+        Any args or kwargs are passed to the model and guide
+        """
+        self.state.clear()
+        self._log_normalizer = 0.
+        self._process(self.model.init, self.guide.init, *args, **kwargs)
+
+    def step(self, *args, **kwargs):
+        """
+        Take a filtering step using sequential importance resampling updating the
+        particle weights and values while resampling if desired.
+        Any args or kwargs are passed to the model and guide
+        """
+        self._process(self.model.step, self.guide.step, *args, **kwargs)
+
+    def get_empirical(self):
+        """
+        :returns: a marginal distribution over all state tensors.
+        :rtype: a dictionary with keys which are latent variables and values
+            which are :class:`~pyro.distributions.Empirical` objects.
+        """
+        log_weights = self.state._log_weights
+        empirical = {}
+        for key, value in self.state.items():
+            marginal = Empirical()
+            marginal._samples = value
+            marginal._log_weights = log_weights
+            marginal._categorical = Categorical(logits=log_weights)
+            empirical[key] = marginal
+        return empirical
+
+    def get_log_normalizer(self):
+        """
+        :returns: an estimate of the log marginal likelihood of all
+            observations seen since :meth:`init`.
+        :rtype: float
+        """
+        return self._log_normalizer
+
+    def _vectorized(self, fn):
+        def wrapped_fn(*args, **kwargs):
+            with pyro.iarange("num_particles_vectorized", self.num_particles, dim=-self.max_iarange_nesting):
+                return fn(*args, **kwargs)
+
+        return poutine.broadcast(wrapped_fn)
+
+    def _process(self, model, guide, *args, **kwargs):
+        with poutine.block():
+            guide_trace = poutine.trace(self._vectorized(guide)).get_trace(self.state, *args, **kwargs)
+            model = poutine.replay(self._vectorized(model), trace=guide_trace)
+            model_trace = poutine.trace(model).get_trace(self.state, *args, **kwargs)
+
+        self._update_weights(model_trace, guide_trace)
+        self._maybe_importance_resample()
+
+    def _sum_to_particles(self, log_prob):
+        # The particle dim is the leftmost dim of batched log_probs.
+        if log_prob.dim() < self.max_iarange_nesting:
+            return log_prob.sum()
+        return log_prob.reshape(self.num_particles, -1).sum(-1)
+
+    def _update_weights(self, model_trace, guide_trace):
+        # w_t <-w_{t-1}*p(y_t|z_t) p(z_t|z_t-1)/q(z_t)
+        model_trace.compute_log_prob()
+        guide_trace.compute_log_prob()
+
+        log_weights = self.state._log_weights
+        for trace, sign in ((model_trace, 1.), (guide_trace, -1.)):
+            for site in trace.nodes.values():
+                if site["type"] == "sample" and not site_is_subsample(site):
+                    log_weights = log_weights + sign * self._sum_to_particles(site["log_prob"].detach())
+        self.state._log_weights = log_weights
+
+    def _maybe_importance_resample(self):
+        log_weights = self.state._log_weights
+        log_total = logsumexp(log_weights, 0)
+        if not torch.isfinite(log_total).all():
+            raise SMCFailed("Failed to find feasible hypothesis: all particles have zero weight")
+        # The weights are kept normalized, so log_total is the log of the
+        # incremental evidence p(y_t | y_1, ..., y_{t-1}).
+        self._log_normalizer += log_total.item()
+        log_weights = log_weights - log_total
+        self.state._log_weights = log_weights
+
+        # ESS = (sum w)^2 / sum w^2, where the weights are normalized.
+        ess = (-logsumexp(2 * log_weights, 0)).exp().item()
+        if ess < self.ess_threshold * self.num_particles:
+            self._importance_resample()
+
+    def _importance_resample(self):
+        index = _systematic_sample(self.state._log_weights)
+        self.state._resample(index)
+
+
+def _systematic_sample(log_weights):
+    """
+    Draws ``len(log_weights)`` ancestor indices by systematic resampling, in
+    ``O(len(log_weights))`` tensor ops.
+    """
+    num_particles = log_weights.size(0)
+    probs = (log_weights - logsumexp(log_weights, 0)).exp()
+    cdf = probs.cumsum(0)
+    cdf = cdf / cdf[-1]
+    # The j-th draw is at (j + u) / N; count the draws left of each cdf value.
+    u = torch.rand(()).item()
+    counts = (num_particles * cdf - u).ceil().clamp(0, num_particles).long()
+    # Ancestor of the j-th draw is the number of particles whose cdf covers
+    # fewer than j + 1 draws.
+    marks = log_weights.new_zeros(num_particles + 1)
+    marks.index_add_(0, counts, torch.ones_like(log_weights))
+    return marks[:num_particles].cumsum(0).long()
+
+
+class SMCState(dict):
+    """
+    Dictionary-like object to hold a vectorized collection of tensors to
+    represent all state during inference with :class:`SMCFilter`. During
+    inference, the :class:`SMCFilter` resamples these tensors along their
+    leftmost (particle) dim.
+
+    Keys may have arbitrary hashable type.
+    Values must be :class:`torch.Tensor` s.
+
+    :param int num_particles: The number of particles.
+    """
+    def __init__(self, num_particles):
+        assert isinstance(num_particles, int) and num_particles > 0
+        super(SMCState, self).__init__()
+        self._num_particles = num_particles
+        self._log_weights = torch.full((num_particles,), -math.log(num_particles))
+
+    def __setitem__(self, key, value):
+        if not torch.is_tensor(value):
+            raise TypeError("SMCState values must be torch.Tensors, but got {}".format(type(value)))
+        if value.dim() == 0 or value.size(0) != self._num_particles:
+            raise ValueError("Expected leftmost dim of state[{}] to be num_particles = {}, but got shape {}"
+                             .format(repr(key), self._num_particles, tuple(value.shape)))
+        super(SMCState, self).__setitem__(key, value)
+
+    def clear(self):
+        super(SMCState, self).clear()
+        self._log_weights = torch.full((self._num_particles,), -math.log(self._num_particles))
+
+    def _resample(self, index):
+        for key, value in self.items():
+            super(SMCState, self).__setitem__(key, value[index].contiguous())
+        self._log_weights = torch.full((self._num_particles,), -math.log(self._num_particles))
@@ -1,6 +1,10 @@
 from __future__ import absolute_import, division, print_function
 
+import threading
+
 import torch
+import torch.distributed
+from six.moves import queue
 
 import pyro
 import pyro.poutine as poutine
@@ -91,6 +95,14 @@ class SVI(TracePosterior):
         generated under the hood by `loss_and_grads`).
         Any args or kwargs are passed to the model and guide
         """
+        return torch_item(self._step(*args, **kwargs))
+
+    def _step(self, *args, **kwargs):
+        """
+        Takes a gradient step as :meth:`step` does, and returns the loss as
+        returned by the loss function. Subclasses override this to change how
+        the step is taken.
+        """
         # get loss and compute gradients
         with poutine.trace(param_only=True) as param_capture:
             loss = self.loss_and_grads(self.model, self.guide, *args, **kwargs)
@@ -105,4 +117,253 @@ class SVI(TracePosterior):
         # zero gradients
         pyro.infer.util.zero_grads(params)
 
-        return torch_item(loss)
+        return loss
+
+    def run_epochs(self, data_iter, num_epochs=1, prefetch=1, loss_window=1, callback=None,
+                   checkpoint_every=None, checkpoint_fn=None):
+        """
+        Takes one :meth:`step` per minibatch of ``data_iter`` for
+        ``num_epochs`` epochs, while the next minibatches are loaded on a
+        background thread.
+
+        Losses are averaged over windows of ``loss_window`` steps, and each
+        window's mean loss is reported to ``callback``. Losses returned as
+        tensors are summed on their device and only converted to a number
+        once per window, so that steps within a window do not wait for the
+        device. Note that losses which compute their value as a number, e.g.
+        to check it for NaNs, still read it back on every step.
+
+        :param data_iter: an iterable over minibatches, iterated once per
+            epoch, e.g. a :class:`torch.utils.data.DataLoader`. A minibatch
+            that is a tuple is passed to the model and guide as positional
+            args, any other minibatch as a single arg.
+        :param int num_epochs: the number of passes over ``data_iter``.
+        :param int prefetch: the number of minibatches loaded ahead of the
+            current step on a background thread; 0 loads them synchronously.
+        :param int loss_window: the number of steps over which losses are
+            accumulated before being reported.
+        :param callable callback: optional function called as
+            ``callback(epoch, step, loss)`` at the end of each window, with
+            the mean loss over the window and ``step`` counting from 0 within
+            the epoch.
+        :param int checkpoint_every: if given, ``checkpoint_fn(epoch, step)``
+            is called every ``checkpoint_every`` steps, counted across epochs.
+        :param callable checkpoint_fn: checkpointing function, e.g.
+            ``lambda epoch, step: svi.save_checkpoint("svi.pt")``.
+        :returns: the mean loss of each epoch
+        :rtype: list
+        """
+        if checkpoint_every is not None and checkpoint_fn is None:
+            raise ValueError("checkpoint_every requires a checkpoint_fn.")
+        epoch_losses = []
+        total_steps = 0
+        for epoch in range(num_epochs):
+            epoch_loss = 0.
+            window_loss = 0.
+            window_size = 0
+            step = -1
+            for step, batch in enumerate(_prefetch(data_iter, prefetch)):
+                args = batch if isinstance(batch, tuple) else (batch,)
+                loss = self._step(*args)
+                # accumulate on device, reading the loss back once per window
+                window_loss = window_loss + (loss.detach() if torch.is_tensor(loss) else loss)
+                window_size += 1
+                total_steps += 1
+                if window_size == loss_window:
+                    window_loss = torch_item(window_loss)
+                    epoch_loss += window_loss
+                    if callback is not None:
+                        callback(epoch, step, window_loss / window_size)
+                    window_loss = 0.
+                    window_size = 0
+                if checkpoint_every is not None and total_steps % checkpoint_every == 0:
+                    checkpoint_fn(epoch, step)
+            if window_size:
+                window_loss = torch_item(window_loss)
+                epoch_loss += window_loss
+                if callback is not None:
+                    callback(epoch, step, window_loss / window_size)
+            epoch_losses.append(epoch_loss / max(step + 1, 1))
+        return epoch_losses
+
+    def save_checkpoint(self, filename):
+        """
+        Saves the state of the param store and of the optimizer to a file.
+
+        :param str filename: file name to save to
+        """
+        state = {"params": pyro.get_param_store().get_state(),
+                 "optim": self.optim.get_state()}
+        with open(filename, "wb") as output_file:
+            torch.save(state, output_file)
+
+    def load_checkpoint(self, filename, map_location=None):
+        """
+        Loads a checkpoint saved by :meth:`save_checkpoint` into the param
+        store and the optimizer.
+
+        :param str filename: file name to load from
+        :param map_location: specifies how to remap storage locations
+        """
+        with open(filename, "rb") as input_file:
+            state = torch.load(input_file, map_location)
+        pyro.get_param_store().set_state(state["params"])
+        self.optim.set_state(state["optim"])
+
+
+def _prefetch(iterable, size):
+    """
+    Iterates over ``iterable`` while a background thread loads up to ``size``
+    items ahead. Exceptions raised while loading are re-raised in the caller.
+    """
+    if size <= 0:
+        for item in iterable:
+            yield item
+        return
+
+    items = queue.Queue(maxsize=size)
+    done = object()
+    stop = threading.Event()
+
+    def put(item, error=None):
+        # gives up once the consumer has stopped iterating
+        while not stop.is_set():
+            try:
+                items.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def load():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(done)
+        except Exception as e:
+            put(done, e)
+
+    thread = threading.Thread(target=load)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+
+
+class DistributedSVI(SVI):
+    """
+    Data-parallel variant of :class:`SVI` over the processes (ranks) of a
+    :mod:`torch.distributed` process group, e.g. using the ``"gloo"`` backend
+    on CPU. Each rank calls :meth:`step` with its own shard of the minibatch.
+    The log densities of the model and guide are scaled on each rank by the
+    fraction of the global minibatch in its shard, and the gradients of the
+    unconstrained params are summed across ranks before the optimizer step,
+    so that every rank takes the same step as :class:`SVI` would on the
+    global minibatch. This assumes that each rank's :class:`~pyro.iarange`
+    scales its shard up to the full data size, e.g. by passing the rank's
+    ``subsample`` indices.
+
+    Shards may differ in size, e.g. for a ragged last minibatch, if each
+    rank passes the size of its shard as a ``shard_size`` keyword argument
+    to :meth:`step` and :meth:`evaluate_loss`. This keyword is not passed
+    to the model and guide. Without it, all shards are assumed to have the
+    same size, and each rank is scaled by ``1 / world_size``.
+
+    Params are broadcast from rank 0 when first seen, so that all ranks
+    start from the same values, and every rank must encounter the same
+    params at each step.
+
+    .. note:: :func:`torch.distributed.init_process_group` must be called on
+        each rank before the first step.
+
+    Arguments are the same as for :class:`SVI`.
+    """
+    def __init__(self, *args, **kwargs):
+        super(DistributedSVI, self).__init__(*args, **kwargs)
+        self._synced_params = {}
+
+    def _loss_and_grads(self, scale, *args, **kwargs):
+        model = poutine.scale(self.model, scale=scale)
+        guide = poutine.scale(self.guide, scale=scale)
+        with poutine.trace(param_only=True) as param_capture:
+            loss = self.loss_and_grads(model, guide, *args, **kwargs)
+
+        param_store = pyro.get_param_store()
+        params = set(site["value"].unconstrained()
+                     for site in param_capture.trace.nodes.values())
+        # Collective ops need the same order of params on all ranks.
+        params = sorted(((param_store.param_name(p), p) for p in params), key=lambda x: x[0])
+        return loss, params
+
+    def _shard_scale(self, shard_size):
+        """
+        Returns the fraction of the global minibatch in this rank's shard.
+        """
+        total_size = torch.tensor(float(shard_size))
+        torch.distributed.all_reduce(total_size)
+        return shard_size / total_size.item()
+
+    def _sync_new_params(self, params):
+        """
+        Broadcasts params not seen before from rank 0, and returns whether
+        there were any.
+        """
+        synced = False
+        for name, p in params:
+            if self._synced_params.get(name) is not p:
+                torch.distributed.broadcast(p.data, 0)
+                self._synced_params[name] = p
+                synced = True
+        return synced
+
+    def _all_reduce_grads(self, params):
+        grads = [p.grad if p.grad is not None else torch.zeros_like(p) for _, p in params]
+        # Reduce all grads at once, packed into a single buffer.
+        flat_grads = torch.cat([grad.reshape(-1) for grad in grads])
+        torch.distributed.all_reduce(flat_grads)
+        offset = 0
+        for _, p in params:
+            p.grad = flat_grads[offset:offset + p.numel()].reshape(p.shape)
+            offset += p.numel()
+
+    def evaluate_loss(self, *args, **kwargs):
+        """
+        :returns: estimate of the loss on the global minibatch
+        :rtype: float
+
+        Evaluate the loss function, summed across ranks. Any args or kwargs,
+        except ``shard_size``, are passed to the model and guide.
+        """
+        scale = self._shard_scale(kwargs.pop("shard_size", 1))
+        with torch.no_grad():
+            loss = self.loss(poutine.scale(self.model, scale=scale),
+                             poutine.scale(self.guide, scale=scale), *args, **kwargs)
+            loss = torch.tensor(float(torch_item(loss)))
+            torch.distributed.all_reduce(loss)
+            return loss.item()
+
+    def _step(self, *args, **kwargs):
+        scale = self._shard_scale(kwargs.pop("shard_size", 1))
+        loss, params = self._loss_and_grads(scale, *args, **kwargs)
+        if self._sync_new_params(params):
+            # Gradients were computed at the initial values of this rank.
+            pyro.infer.util.zero_grads(set(p for _, p in params))
+            loss, params = self._loss_and_grads(scale, *args, **kwargs)
+        self._all_reduce_grads(params)
+
+        self.optim(set(p for _, p in params))
+
+        pyro.infer.util.zero_grads(set(p for _, p in params))
+
+        loss = torch.tensor(float(torch_item(loss)))
+        torch.distributed.all_reduce(loss)
+        return loss
@@ -6,14 +6,14 @@ import pyro
 import pyro.ops.jit
 from pyro.distributions.util import is_identically_zero
 from pyro.infer.elbo import ELBO
-from pyro.infer.enum import get_importance_trace
-from pyro.infer.util import MultiFrameTensor, get_iarange_stacks, is_validation_enabled, torch_item
+from pyro.infer.util import MultiFrameTensor, get_iarange_stacks, torch_item
 from pyro.util import check_if_enumerated, warn_if_nan
 
 
-def _compute_log_r(model_trace, guide_trace):
+def _compute_log_r(model_trace, guide_trace, stacks=None):
     log_r = MultiFrameTensor()
-    stacks = get_iarange_stacks(model_trace)
+    if stacks is None:
+        stacks = get_iarange_stacks(model_trace)
     for name, model_site in model_trace.nodes.items():
         if model_site["type"] == "sample":
             log_r_term = model_site["log_prob"]
@@ -48,11 +48,10 @@ class Trace_ELBO(ELBO):
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "flat", self.max_iarange_nesting, model, guide, *args, **kwargs)
-        if is_validation_enabled():
-            check_if_enumerated(guide_trace)
-        return model_trace, guide_trace
+        return self._get_importance_trace("flat", model, guide, *args, **kwargs)
+
+    def _validate_traces(self, model_trace, guide_trace):
+        check_if_enumerated(guide_trace)
 
     def loss(self, model, guide, *args, **kwargs):
         """
@@ -92,7 +91,8 @@ class Trace_ELBO(ELBO):
 
                 if not is_identically_zero(score_function_term):
                     if log_r is None:
-                        log_r = _compute_log_r(model_trace, guide_trace)
+                        stacks = self._get_plan("iarange_stacks", get_iarange_stacks, model_trace)
+                        log_r = _compute_log_r(model_trace, guide_trace, stacks)
                     site = log_r.sum_to(site["cond_indep_stack"])
                     surrogate_elbo_particle = surrogate_elbo_particle + (site * score_function_term).sum()
 
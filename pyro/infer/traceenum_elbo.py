@@ -4,6 +4,7 @@ import warnings
 import weakref
 from collections import OrderedDict
 
+import opt_einsum
 import torch
 from opt_einsum import shared_intermediates
 from six.moves import queue
@@ -15,10 +16,11 @@ import pyro.ops.jit
 import pyro.poutine as poutine
 from pyro.distributions.torch_distribution import ReshapedDistribution
 from pyro.distributions.util import is_identically_zero, scale_and_mask
-from pyro.ops.contract import contract_tensor_tree, contract_to_tensor
+from pyro.ops.contract import PackedLogRing, _chain_log_marginals, contract_tensor_tree, contract_to_tensor
+from pyro.ops.einsum import size_buckets
 from pyro.infer.elbo import ELBO
-from pyro.infer.enum import get_importance_trace, iter_discrete_escape, iter_discrete_extend
-from pyro.infer.util import Dice, is_validation_enabled
+from pyro.infer.enum import iter_discrete_escape, iter_discrete_extend
+from pyro.infer.util import Dice
 from pyro.poutine.enumerate_messenger import EnumerateMessenger
 from pyro.util import check_traceenum_requirements, warn_if_nan
 
@@ -45,8 +47,103 @@ def _check_model_guide_enumeration_constraint(model_enum_sites, guide_trace):
                                      .format(name, f.name))
 
 
-# TODO move this logic into a poutine
-def _compute_model_factors(model_trace, guide_trace):
+def _check_guide_dims_not_recycled(guide_trace):
+    enum_dims = [site["infer"]["_enumerate_dim"] for site in guide_trace.nodes.values()
+                 if site["type"] == "sample" and site["infer"].get("_enumerate_dim") is not None]
+    if len(set(enum_dims)) != len(enum_dims):
+        raise NotImplementedError("TraceEnum_ELBO does not support parallel enumeration "
+                                  "inside pyro.markov in the guide. Try moving the "
+                                  "enumerated sites to the model.")
+
+
+class _EnumPacking(object):
+    """
+    Packs model log factors whose enumeration dims have been recycled by
+    :func:`~pyro.markov`, so that they can be contracted by a
+    :class:`~pyro.ops.contract.PackedLogRing`. Each nontrivial dim is named by
+    a symbol: vectorized iarange dims are named by their frame, enumeration
+    dims of model enumerated sites by the id of the enumerated variable, and
+    all other dims (e.g. of guide enumeration) by their position.
+
+    :param set enum_ids: ids of the model enumerated variables.
+    """
+    def __init__(self, enum_ids):
+        self._enum_ids = enum_ids
+        self._symbols = {}
+        self._symbol_to_dim = {}
+        self._symbol_to_frame = {}
+        self.sum_symbols = set()
+        self.inputs = []
+        self.operands = []
+
+    def _get_symbol(self, key, dim):
+        symbol = self._symbols.get(key)
+        if symbol is None:
+            symbol = opt_einsum.get_symbol(len(self._symbols))
+            self._symbols[key] = symbol
+            self._symbol_to_dim[symbol] = dim
+        return symbol
+
+    def _frame_symbol(self, frame):
+        symbol = self._get_symbol(("frame", frame), frame.dim)
+        self._symbol_to_frame[symbol] = frame
+        return symbol
+
+    def pack(self, term, site):
+        frames = {f.dim: f for f in site["cond_indep_stack"] if f.vectorized}
+        dim_to_id = site["infer"].get("_dim_to_id", {})
+        dims = []
+        for dim in range(-term.dim(), 0):
+            if term.size(dim) == 1:
+                continue
+            if dim in frames:
+                symbol = self._frame_symbol(frames[dim])
+            elif dim_to_id.get(dim) in self._enum_ids:
+                symbol = self._get_symbol(("id", dim_to_id[dim]), dim)
+                self.sum_symbols.add(symbol)
+            else:
+                symbol = self._get_symbol(("dim", dim), dim)
+            dims.append(symbol)
+        dims = ''.join(dims)
+        term = term.reshape(tuple(term.size(dim) for dim in range(-term.dim(), 0) if term.size(dim) > 1))
+        self.inputs.append(dims)
+        self.operands.append(term)
+        return term
+
+    def enum_symbol(self, site):
+        """
+        Returns the symbol of the enumeration dim of a model enumerated site,
+        or ``None`` if no log factor depends on that site.
+        """
+        id_ = site["infer"]["_dim_to_id"][site["infer"]["_enumerate_dim"]]
+        return self._symbols.get(("id", id_))
+
+    def pack_ordinal(self, ordinal):
+        return frozenset(self._frame_symbol(f) for f in ordinal)
+
+    def unpack(self, term, dims):
+        if not dims:
+            return term
+        order = sorted(range(len(dims)), key=lambda i: self._symbol_to_dim[dims[i]])
+        term = term.permute(*order)
+        shape = [1] * -self._symbol_to_dim[dims[order[0]]]
+        for size, i in zip(term.shape, order):
+            shape[self._symbol_to_dim[dims[i]]] = size
+        return term.reshape(shape)
+
+    def unpack_ordinal(self, ordinal):
+        return frozenset(self._symbol_to_frame[symbol] for symbol in ordinal)
+
+
+def _compute_model_structure(model_trace, guide_trace):
+    """
+    Computes the part of :func:`_compute_model_factors` that depends only on
+    the structure of the model and guide traces: the ordinal of each sample
+    site, the names of model cost sites and model enumerated sites grouped by
+    ordinal, the rightmost enumeration dim (``None`` if the model has no
+    enumerated sites), and whether :func:`~pyro.markov` recycled any model
+    enumeration dims.
+    """
     # y depends on x iff ordering[x] <= ordering[y]
     # TODO refine this coarse dependency ordering using time.
     ordering = {name: frozenset(f for f in site["cond_indep_stack"] if f.vectorized)
@@ -55,28 +152,50 @@ def _compute_model_factors(model_trace, guide_trace):
                 if site["type"] == "sample"}
 
     # Collect model sites that may have been enumerated in the model.
-    cost_sites = OrderedDict()
-    enum_sites = OrderedDict()
+    cost_names = OrderedDict()
+    enum_names = OrderedDict()
     enum_dims = []
     for name, site in model_trace.nodes.items():
         if site["type"] == "sample":
             if name in guide_trace.nodes or site["infer"].get("_enumerate_dim") is None:
-                cost_sites.setdefault(ordering[name], []).append(site)
+                cost_names.setdefault(ordering[name], []).append(name)
             else:
-                enum_sites.setdefault(ordering[name], []).append(site)
+                enum_names.setdefault(ordering[name], []).append(name)
                 enum_dims.append(site["fn"].event_dim - site["value"].dim())
+    _check_guide_dims_not_recycled(guide_trace)
+    if not enum_names:
+        return ordering, cost_names, enum_names, None, False
+    _check_model_guide_enumeration_constraint(enum_names, guide_trace)
+    enum_boundary = max(enum_dims) + 1
+    assert enum_boundary <= 0
+    recycled = len(set(enum_dims)) != len(enum_dims)
+    return ordering, cost_names, enum_names, enum_boundary, recycled
+
+
+# TODO move this logic into a poutine
+def _compute_model_factors(model_trace, guide_trace, structure=None):
+    if structure is None:
+        structure = _compute_model_structure(model_trace, guide_trace)
+    ordering, cost_names, enum_names, enum_boundary, recycled = structure
+    cost_sites = OrderedDict((t, [model_trace.nodes[name] for name in names])
+                             for t, names in cost_names.items())
+    enum_sites = OrderedDict((t, [model_trace.nodes[name] for name in names])
+                             for t, names in enum_names.items())
     log_factors = OrderedDict()
     sum_dims = {}
     scale = 1
+    packing = None
     if not enum_sites:
         marginal_costs = OrderedDict((t, [site["log_prob"] for site in sites_t])
                                      for t, sites_t in cost_sites.items())
-        return marginal_costs, log_factors, ordering, sum_dims, scale
-    _check_model_guide_enumeration_constraint(enum_sites, guide_trace)
+        return marginal_costs, log_factors, ordering, sum_dims, scale, packing
+
+    # Recycled enumeration dims are told apart by the ids of enumerated variables.
+    if recycled:
+        packing = _EnumPacking(set(site["infer"]["_dim_to_id"][site["infer"]["_enumerate_dim"]]
+                                   for sites_t in enum_sites.values() for site in sites_t))
 
     # Marginalize out all variables that have been enumerated in the model.
-    enum_boundary = max(enum_dims) + 1
-    assert enum_boundary <= 0
     marginal_costs = OrderedDict()
     scales = set()
     for t, sites_t in cost_sites.items():
@@ -88,6 +207,8 @@ def _compute_model_factors(model_trace, guide_trace):
                 # For sites that depend on an enumerated variable, we need to apply
                 # the mask inside- and the scale outside- of the log expectation.
                 cost = scale_and_mask(site["unscaled_log_prob"], mask=site["mask"])
+                if packing is not None:
+                    cost = packing.pack(cost, site)
                 log_factors.setdefault(t, []).append(cost)
                 scales.add(site["scale"])
     if log_factors:
@@ -96,26 +217,39 @@ def _compute_model_factors(model_trace, guide_trace):
             if any(t <= u for u in log_factors):
                 for site in sites_t:
                     logprob = site["unscaled_log_prob"]
+                    if packing is not None:
+                        logprob = packing.pack(logprob, site)
                     log_factors.setdefault(t, []).append(logprob)
                     scales.add(site["scale"])
         _check_shared_scale(scales)
         scale = scales.pop()
+    if packing is not None:
+        log_factors = OrderedDict((packing.pack_ordinal(t), xs) for t, xs in log_factors.items())
+        sum_dims = {x: set(dims) & packing.sum_symbols
+                    for dims, x in zip(packing.inputs, packing.operands)}
+        return marginal_costs, log_factors, ordering, sum_dims, scale, packing
     sum_dims = {x: set(i for i in range(-x.dim(), enum_boundary) if x.shape[i] > 1)
                 for xs in log_factors.values() for x in xs}
-    return marginal_costs, log_factors, ordering, sum_dims, scale
+    return marginal_costs, log_factors, ordering, sum_dims, scale, packing
 
 
-def _compute_dice_elbo(model_trace, guide_trace):
+def _compute_dice_elbo(model_trace, guide_trace, structure=None):
     # Accumulate marginal model costs.
-    marginal_costs, log_factors, ordering, sum_dims, scale = _compute_model_factors(
-            model_trace, guide_trace)
-    if log_factors:
+    marginal_costs, log_factors, ordering, sum_dims, scale, packing = _compute_model_factors(
+            model_trace, guide_trace, structure)
+    if log_factors and packing is not None:
+        # Contract recycled enumeration dims by name, then unpack the results.
+        ring = PackedLogRing(packing.inputs, packing.operands)
+        log_factors = contract_tensor_tree(log_factors, sum_dims, ring=ring)
+        log_factors = OrderedDict((packing.unpack_ordinal(t), [packing.unpack(x, ring.dims(x)) for x in xs])
+                                  for t, xs in log_factors.items())
+    elif log_factors:
         log_factors = contract_tensor_tree(log_factors, sum_dims)
-        for t, log_factors_t in log_factors.items():
-            marginal_costs_t = marginal_costs.setdefault(t, [])
-            for term in log_factors_t:
-                term = scale_and_mask(term, scale=scale)
-                marginal_costs_t.append(term)
+    for t, log_factors_t in log_factors.items():
+        marginal_costs_t = marginal_costs.setdefault(t, [])
+        for term in log_factors_t:
+            term = scale_and_mask(term, scale=scale)
+            marginal_costs_t.append(term)
     costs = marginal_costs
 
     # Accumulate negative guide costs.
@@ -137,7 +271,9 @@ def _make_dist(dist_, logits):
 
 def _compute_marginals(model_trace, guide_trace):
     args = _compute_model_factors(model_trace, guide_trace)
-    marginal_costs, log_factors, ordering, sum_dims, scale = args
+    marginal_costs, log_factors, ordering, sum_dims, scale, packing = args
+    if packing is not None:
+        return _compute_packed_marginals(model_trace, guide_trace, log_factors, sum_dims, packing)
 
     marginal_dists = OrderedDict()
     with shared_intermediates() as cache:
@@ -158,6 +294,39 @@ def _compute_marginals(model_trace, guide_trace):
     return marginal_dists
 
 
+def _compute_packed_marginals(model_trace, guide_trace, log_factors, sum_dims, packing):
+    # Chains of recycled enumeration dims are marginalized all at once by
+    # forward-backward; otherwise we contract once per enumerated site.
+    marginal_dists = OrderedDict()
+    with shared_intermediates() as cache:
+        ring = PackedLogRing(packing.inputs, packing.operands, cache=cache)
+        chain = None
+        if len(log_factors) == 1:
+            terms, = log_factors.values()
+            chain = _chain_log_marginals(ring, terms, set().union(*sum_dims.values()))
+        for name, site in model_trace.nodes.items():
+            if (site["type"] != "sample" or
+                    name in guide_trace.nodes or
+                    site["infer"].get("_enumerate_dim") is None):
+                continue
+
+            enum_dim = site["infer"]["_enumerate_dim"]
+            symbol = packing.enum_symbol(site)
+            if chain is not None and symbol in chain[1]:
+                dims, logits = chain[0] + symbol, chain[1][symbol]
+            else:
+                site_sum_dims = {term: dims - {symbol} for term, dims in sum_dims.items()}
+                ordinal = packing.pack_ordinal(frozenset(f for f in site["cond_indep_stack"] if f.vectorized))
+                logits = contract_to_tensor(log_factors, site_sum_dims, ordinal, ring=ring)
+                dims = ring.dims(logits)
+            logits = packing.unpack(logits, dims)
+            logits = logits.unsqueeze(-1).transpose(-1, enum_dim - 1)
+            while logits.shape[0] == 1:
+                logits.squeeze_(0)
+            marginal_dists[name] = _make_dist(site["fn"], logits)
+    return marginal_dists
+
+
 class BackwardSampleMessenger(pyro.poutine.messenger.Messenger):
     """
     Implements forward filtering / backward sampling for sampling
@@ -166,6 +335,9 @@ class BackwardSampleMessenger(pyro.poutine.messenger.Messenger):
     def __init__(self, enum_trace, guide_trace):
         self.enum_trace = enum_trace
         args = _compute_model_factors(enum_trace, guide_trace)
+        if args[5] is not None:
+            raise NotImplementedError("TraceEnum_ELBO.sample_posterior() is not "
+                                      "compatible with enumeration inside pyro.markov.")
         self.log_factors = args[1]
         self.sum_dims = args[3]
         self.cache = None
@@ -225,31 +397,42 @@ class TraceEnum_ELBO(ELBO):
     This assumes restricted dependency structure on the model and guide:
     variables outside of an :class:`~pyro.iarange` can never depend on
     variables inside that :class:`~pyro.iarange`.
+
+    :param list size_buckets: an optional sorted list of sizes up to which
+        tensor sizes are rounded when looking up cached contraction
+        expressions, so that e.g. minibatches of varying size share them.
+        See :func:`pyro.ops.einsum.size_buckets`. Other args are as in
+        :class:`~pyro.infer.elbo.ELBO`.
     """
+    def __init__(self, *args, **kwargs):
+        self.size_buckets = kwargs.pop("size_buckets", None)
+        super(TraceEnum_ELBO, self).__init__(*args, **kwargs)
 
     def _get_trace(self, model, guide, *args, **kwargs):
         """
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "flat", self.max_iarange_nesting, model, guide, *args, **kwargs)
+        return self._get_importance_trace("flat", model, guide, *args, **kwargs)
 
-        if is_validation_enabled():
-            check_traceenum_requirements(model_trace, guide_trace)
+    def _validate_traces(self, model_trace, guide_trace):
+        check_traceenum_requirements(model_trace, guide_trace)
 
-            has_enumerated_sites = any(site["infer"].get("enumerate")
-                                       for trace in (guide_trace, model_trace)
-                                       for name, site in trace.nodes.items()
-                                       if site["type"] == "sample")
+        has_enumerated_sites = any(site["infer"].get("enumerate")
+                                   for trace in (guide_trace, model_trace)
+                                   for name, site in trace.nodes.items()
+                                   if site["type"] == "sample")
 
-            if self.strict_enumeration_warning and not has_enumerated_sites:
-                warnings.warn('TraceEnum_ELBO found no sample sites configured for enumeration. '
-                              'If you want to enumerate sites, you need to @config_enumerate or set '
-                              'infer={"enumerate": "sequential"} or infer={"enumerate": "parallel"}? '
-                              'If you do not want to enumerate, consider using Trace_ELBO instead.')
+        if self.strict_enumeration_warning and not has_enumerated_sites:
+            warnings.warn('TraceEnum_ELBO found no sample sites configured for enumeration. '
+                          'If you want to enumerate sites, you need to @config_enumerate or set '
+                          'infer={"enumerate": "sequential"} or infer={"enumerate": "parallel"}? '
+                          'If you do not want to enumerate, consider using Trace_ELBO instead.')
 
-        return model_trace, guide_trace
+    def _compute_dice_elbo(self, model_trace, guide_trace):
+        structure = self._get_plan("model_structure", _compute_model_structure, model_trace, guide_trace)
+        with size_buckets(self.size_buckets):
+            return _compute_dice_elbo(model_trace, guide_trace, structure)
 
     def _get_traces(self, model, guide, *args, **kwargs):
         """
@@ -291,7 +474,7 @@ class TraceEnum_ELBO(ELBO):
         """
         elbo = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-            elbo_particle = _compute_dice_elbo(model_trace, guide_trace)
+            elbo_particle = self._compute_dice_elbo(model_trace, guide_trace)
             if is_identically_zero(elbo_particle):
                 continue
 
@@ -314,7 +497,7 @@ class TraceEnum_ELBO(ELBO):
         """
         elbo = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-            elbo_particle = _compute_dice_elbo(model_trace, guide_trace)
+            elbo_particle = self._compute_dice_elbo(model_trace, guide_trace)
             if is_identically_zero(elbo_particle):
                 continue
 
@@ -338,7 +521,7 @@ class TraceEnum_ELBO(ELBO):
         """
         elbo = 0.0
         for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-            elbo_particle = _compute_dice_elbo(model_trace, guide_trace)
+            elbo_particle = self._compute_dice_elbo(model_trace, guide_trace)
             if is_identically_zero(elbo_particle):
                 continue
 
@@ -423,7 +606,7 @@ class JitTraceEnum_ELBO(TraceEnum_ELBO):
                 self = weakself()
                 elbo = 0.0
                 for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
-                    elbo += _compute_dice_elbo(model_trace, guide_trace)
+                    elbo += self._compute_dice_elbo(model_trace, guide_trace)
                 return elbo * (-1.0 / self.num_particles)
 
             self._differentiable_loss = differentiable_loss
@@ -10,9 +10,8 @@ import pyro
 import pyro.ops.jit
 from pyro.distributions.util import is_identically_zero
 from pyro.infer import ELBO
-from pyro.infer.enum import get_importance_trace
-from pyro.infer.util import (MultiFrameTensor, detach_iterable, get_iarange_stacks,
-                             is_validation_enabled, torch_backward, torch_item)
+from pyro.infer.util import MultiFrameTensor, detach_iterable, get_iarange_stacks, torch_backward, torch_item
+from pyro.poutine.trace_messenger import identify_dense_edges
 from pyro.util import check_if_enumerated, warn_if_nan
 
 
@@ -32,8 +31,17 @@ def _get_baseline_options(site):
     return options_tuple
 
 
-def _compute_downstream_costs(model_trace, guide_trace,  #
-                              non_reparam_nodes):
+def _compute_downstream_cost_plan(model_trace, guide_trace,  #
+                                  non_reparam_nodes):
+    """
+    Computes the part of :func:`_compute_downstream_costs` that depends only
+    on the dependency structure of the model and guide traces, namely which
+    cost terms are summed into the downstream cost of each guide site.
+
+    :returns: a tuple ``(guide_steps, model_children, downstream_guide_cost_nodes, stacks)``
+        where ``guide_steps`` lists ``(node, children, missing_nodes)`` in
+        reverse topological order of the guide sample sites
+    """
     # recursively compute downstream cost nodes for all sample sites in model and guide
     # (even though ultimately just need for non-reparameterizable sample sites)
     # 1. downstream costs used for rao-blackwellization
@@ -45,15 +53,11 @@ def _compute_downstream_costs(model_trace, guide_trace,  #
     ordered_guide_nodes_dict = {n: i for i, n in enumerate(topo_sort_guide_nodes)}
 
     downstream_guide_cost_nodes = {}
-    downstream_costs = {}
-    stacks = get_iarange_stacks(model_trace)
-
+    guide_steps = []
     for node in topo_sort_guide_nodes:
-        downstream_costs[node] = MultiFrameTensor((stacks[node],
-                                                   model_trace.nodes[node]['log_prob'] -
-                                                   guide_trace.nodes[node]['log_prob']))
         nodes_included_in_sum = set([node])
         downstream_guide_cost_nodes[node] = set([node])
+        included_children = []
         # make more efficient by ordering children appropriately (higher children first)
         children = [(k, -ordered_guide_nodes_dict[k]) for k in guide_trace.successors(node)]
         sorted_children = sorted(children, key=itemgetter(1))
@@ -61,19 +65,17 @@ def _compute_downstream_costs(model_trace, guide_trace,  #
             child_cost_nodes = downstream_guide_cost_nodes[child]
             downstream_guide_cost_nodes[node].update(child_cost_nodes)
             if nodes_included_in_sum.isdisjoint(child_cost_nodes):  # avoid duplicates
-                downstream_costs[node].add(*downstream_costs[child].items())
+                included_children.append(child)
                 # XXX nodes_included_in_sum logic could be more fine-grained, possibly leading
                 # to speed-ups in case there are many duplicates
                 nodes_included_in_sum.update(child_cost_nodes)
-        missing_downstream_costs = downstream_guide_cost_nodes[node] - nodes_included_in_sum
         # include terms we missed because we had to avoid duplicates
-        for missing_node in missing_downstream_costs:
-            downstream_costs[node].add((stacks[missing_node],
-                                        model_trace.nodes[missing_node]['log_prob'] -
-                                        guide_trace.nodes[missing_node]['log_prob']))
+        missing_nodes = list(downstream_guide_cost_nodes[node] - nodes_included_in_sum)
+        guide_steps.append((node, included_children, missing_nodes))
 
     # finish assembling complete downstream costs
     # (the above computation may be missing terms from model)
+    model_children = {}
     for site in non_reparam_nodes:
         children_in_model = set()
         for node in downstream_guide_cost_nodes[site]:
@@ -82,9 +84,39 @@ def _compute_downstream_costs(model_trace, guide_trace,  #
         children_in_model.difference_update(downstream_guide_cost_nodes[site])
         for child in children_in_model:
             assert (model_trace.nodes[child]["type"] == "sample")
+        model_children[site] = list(children_in_model)
+        downstream_guide_cost_nodes[site].update(children_in_model)
+
+    return guide_steps, model_children, downstream_guide_cost_nodes, get_iarange_stacks(model_trace)
+
+
+def _compute_downstream_costs(model_trace, guide_trace,  #
+                              non_reparam_nodes, plan=None):
+    """
+    Computes the downstream cost of each non-reparameterizable guide site,
+    following a plan computed by :func:`_compute_downstream_cost_plan` if
+    one is given.
+    """
+    if plan is None:
+        plan = _compute_downstream_cost_plan(model_trace, guide_trace, non_reparam_nodes)
+    guide_steps, model_children, downstream_guide_cost_nodes, stacks = plan
+
+    downstream_costs = {}
+    for node, children, missing_nodes in guide_steps:
+        downstream_costs[node] = MultiFrameTensor((stacks[node],
+                                                   model_trace.nodes[node]['log_prob'] -
+                                                   guide_trace.nodes[node]['log_prob']))
+        for child in children:
+            downstream_costs[node].add(*downstream_costs[child].items())
+        for missing_node in missing_nodes:
+            downstream_costs[node].add((stacks[missing_node],
+                                        model_trace.nodes[missing_node]['log_prob'] -
+                                        guide_trace.nodes[missing_node]['log_prob']))
+
+    for site in non_reparam_nodes:
+        for child in model_children[site]:
             downstream_costs[site].add((stacks[child],
                                         model_trace.nodes[child]['log_prob']))
-            downstream_guide_cost_nodes[site].update([child])
 
     for k in non_reparam_nodes:
         downstream_costs[k] = downstream_costs[k].sum_to(guide_trace.nodes[k]["cond_indep_stack"])
@@ -113,16 +145,32 @@ def _compute_elbo_reparam(model_trace, guide_trace, non_reparam_nodes):
     return elbo, surrogate_elbo
 
 
-def _compute_elbo_non_reparam(guide_trace, non_reparam_nodes, downstream_costs):
+def _check_baseline_shape(node, baseline, downstream_cost, particle_dim=None):
+    if baseline.shape == downstream_cost.shape:
+        return
+    # with vectorized particles, a baseline may be shared by all particles
+    if particle_dim is not None and downstream_cost.dim() >= -particle_dim:
+        shared_shape = list(downstream_cost.shape)
+        shared_shape[particle_dim] = 1
+        padded_shape = [1] * (downstream_cost.dim() - baseline.dim()) + list(baseline.shape)
+        if padded_shape == shared_shape:
+            return
+    raise ValueError("Expected baseline at site {} to be {} instead got {}".format(
+        node, downstream_cost.shape, baseline.shape))
+
+
+def _compute_elbo_non_reparam(guide_trace, non_reparam_nodes, downstream_costs, particle_dim=None):
     # construct all the reinforce-like terms.
     # we include only downstream costs to reduce variance
     # optionally include baselines to further reduce variance
     # XXX should the average baseline be in the param store as below?
+    # particle_dim is the dim of vectorized particles, over which baselines are broadcast
     surrogate_elbo = 0.0
     baseline_loss = 0.0
     for node in non_reparam_nodes:
         guide_site = guide_trace.nodes[node]
         downstream_cost = downstream_costs[node]
+        has_particle_dim = particle_dim is not None and downstream_cost.dim() >= -particle_dim
         baseline = 0.0
         (nn_baseline, nn_baseline_input, use_decaying_avg_baseline, baseline_beta,
             baseline_value) = _get_baseline_options(guide_site)
@@ -131,12 +179,16 @@ def _compute_elbo_non_reparam(guide_trace, non_reparam_nodes, downstream_costs):
         assert(not (use_nn_baseline and use_baseline_value)), \
             "cannot use baseline_value and nn_baseline simultaneously"
         if use_decaying_avg_baseline:
-            dc_shape = downstream_cost.shape
+            avg_downstream_cost = downstream_cost
+            if has_particle_dim:
+                # average over particles, so that all particles share the baseline
+                avg_downstream_cost = downstream_cost.mean(particle_dim, keepdim=True)
+            dc_shape = avg_downstream_cost.shape
             param_name = "__baseline_avg_downstream_cost_" + node
             with torch.no_grad():
                 avg_downstream_cost_old = pyro.param(param_name,
                                                      guide_site['value'].new_zeros(dc_shape))
-                avg_downstream_cost_new = (1 - baseline_beta) * downstream_cost + \
+                avg_downstream_cost_new = (1 - baseline_beta) * avg_downstream_cost + \
                     baseline_beta * avg_downstream_cost_old
             pyro.get_param_store()[param_name] = avg_downstream_cost_new
             baseline += avg_downstream_cost_old
@@ -152,9 +204,7 @@ def _compute_elbo_non_reparam(guide_trace, non_reparam_nodes, downstream_costs):
 
         score_function_term = guide_site["score_parts"].score_function
         if use_nn_baseline or use_decaying_avg_baseline or use_baseline_value:
-            if downstream_cost.shape != baseline.shape:
-                raise ValueError("Expected baseline at site {} to be {} instead got {}".format(
-                    node, downstream_cost.shape, baseline.shape))
+            _check_baseline_shape(node, baseline, downstream_cost, particle_dim)
             downstream_cost = downstream_cost - baseline
         surrogate_elbo += (score_function_term * downstream_cost.detach()).sum()
 
@@ -175,6 +225,11 @@ class TraceGraph_ELBO(ELBO):
     - :class:`~pyro.iarange` generators
     - :class:`~pyro.irange` generators
 
+    With ``vectorize_particles=True`` all particles are computed in a single
+    batched pass. Decaying average baselines are then averaged over particles,
+    and neural network baselines and ``baseline_value`` may omit the particle
+    dim, in which case they are shared by all particles.
+
     References
 
     [1] `Gradient Estimation Using Stochastic Computation Graphs`,
@@ -189,11 +244,10 @@ class TraceGraph_ELBO(ELBO):
         Returns a single trace from the guide, and the model that is run
         against it.
         """
-        model_trace, guide_trace = get_importance_trace(
-            "dense", self.max_iarange_nesting, model, guide, *args, **kwargs)
-        if is_validation_enabled():
-            check_if_enumerated(guide_trace)
-        return model_trace, guide_trace
+        return self._get_importance_trace("dense", model, guide, *args, **kwargs)
+
+    def _validate_traces(self, model_trace, guide_trace):
+        check_if_enumerated(guide_trace)
 
     def loss(self, model, guide, *args, **kwargs):
         """
@@ -226,17 +280,36 @@ class TraceGraph_ELBO(ELBO):
             loss += self._loss_and_grads_particle(weight, model_trace, guide_trace)
         return loss
 
+    def _particle_dim(self):
+        if self.vectorize_particles and self.num_particles > 1:
+            return -self.max_iarange_nesting
+        return None
+
+    def _get_downstream_cost_plan(self, model_trace, guide_trace, non_reparam_nodes):
+        if self.static_structure:
+            # Traces are flat under static_structure, so dependency edges are
+            # only identified when the structure changes.
+            model_trace = model_trace.to_graph()
+            guide_trace = guide_trace.to_graph()
+            identify_dense_edges(model_trace)
+            identify_dense_edges(guide_trace)
+        return _compute_downstream_cost_plan(model_trace, guide_trace, non_reparam_nodes)
+
     def _loss_and_grads_particle(self, weight, model_trace, guide_trace):
         # compute elbo for reparameterized nodes
-        non_reparam_nodes = set(guide_trace.nonreparam_stochastic_nodes)
+        non_reparam_nodes = self._get_plan("non_reparam_nodes",
+                                           lambda: set(guide_trace.nonreparam_stochastic_nodes))
         elbo, surrogate_elbo = _compute_elbo_reparam(model_trace, guide_trace, non_reparam_nodes)
 
         # the following computations are only necessary if we have non-reparameterizable nodes
         baseline_loss = 0.0
         if non_reparam_nodes:
-            downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace, non_reparam_nodes)
+            plan = self._get_plan("downstream_costs", self._get_downstream_cost_plan,
+                                  model_trace, guide_trace, non_reparam_nodes)
+            downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace, non_reparam_nodes, plan)
             surrogate_elbo_term, baseline_loss = _compute_elbo_non_reparam(guide_trace,
-                                                                           non_reparam_nodes, downstream_costs)
+                                                                           non_reparam_nodes, downstream_costs,
+                                                                           self._particle_dim())
             surrogate_elbo += surrogate_elbo_term
 
         # collect parameters to train from model and guide
@@ -283,16 +356,21 @@ class JitTraceGraph_ELBO(TraceGraph_ELBO):
                 weight = 1.0 / self.num_particles
                 for model_trace, guide_trace in self._get_traces(model, guide, *args, **kwargs):
                     # compute elbo for reparameterized nodes
-                    non_reparam_nodes = set(guide_trace.nonreparam_stochastic_nodes)
+                    non_reparam_nodes = self._get_plan("non_reparam_nodes",
+                                                       lambda: set(guide_trace.nonreparam_stochastic_nodes))
                     elbo, surrogate_elbo = _compute_elbo_reparam(model_trace, guide_trace, non_reparam_nodes)
 
                     # the following computations are only necessary if we have non-reparameterizable nodes
                     baseline_loss = 0.0
                     if non_reparam_nodes:
-                        downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace, non_reparam_nodes)
+                        plan = self._get_plan("downstream_costs", self._get_downstream_cost_plan,
+                                              model_trace, guide_trace, non_reparam_nodes)
+                        downstream_costs, _ = _compute_downstream_costs(model_trace, guide_trace,
+                                                                        non_reparam_nodes, plan)
                         surrogate_elbo_term, baseline_loss = _compute_elbo_non_reparam(guide_trace,
                                                                                        non_reparam_nodes,
-                                                                                       downstream_costs)
+                                                                                       downstream_costs,
+                                                                                       self._particle_dim())
                         surrogate_elbo += surrogate_elbo_term
 
                     loss = loss - weight * elbo
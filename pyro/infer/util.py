@@ -83,6 +83,28 @@ def get_iarange_stacks(trace):
             if node["type"] == "sample" and not site_is_subsample(node)}
 
 
+def get_site_signature(trace):
+    """
+    Returns a hashable summary of the structure of a trace, namely the name,
+    type, distribution type, value shape, independence context and
+    enumeration configuration of each sample and param site in order. Other
+    nodes, such as the ``_INPUT`` and ``_RETURN`` nodes recorded by
+    :class:`~pyro.poutine.trace_messenger.TraceHandler`, are skipped. Two traces with equal
+    signatures share their dependency structure, so anything computed from
+    that structure alone can be reused between them. This is used by
+    :class:`~pyro.infer.elbo.ELBO` when ``static_structure=True``.
+    """
+    return tuple((name, site["type"], site.get("is_observed"), type(site.get("fn")),
+                  getattr(site.get("fn"), "has_rsample", None),
+                  tuple(getattr(site["value"], "shape", ())),
+                  tuple(site["cond_indep_stack"]),
+                  tuple((key, site["infer"].get(key))
+                        for key in ("enumerate", "_enumerate_dim", "_enum_total",
+                                    "num_samples", "is_auxiliary")))
+                 for name, site in trace.nodes.items()
+                 if site["type"] in ("sample", "param"))
+
+
 class MultiFrameTensor(dict):
     """
     A container for sums of Tensors among different :class:`iarange` contexts.
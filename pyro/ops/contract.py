@@ -10,8 +10,8 @@ from opt_einsum import shared_intermediates
 from six import add_metaclass
 from six.moves import map
 
-from pyro.distributions.util import broadcast_shape
-from pyro.ops.einsum import contract
+from pyro.distributions.util import broadcast_shape, logsumexp
+from pyro.ops.einsum import contract, size_buckets
 from pyro.ops.sumproduct import logsumproductexp
 
 
@@ -178,8 +178,16 @@ class PackedLogRing(TensorRing):
     def sumproduct(self, terms, dims):
         inputs = [self.dims(term) for term in terms]
         output = ''.join(sorted(set(''.join(inputs)) - set(dims)))
-        equation = ','.join(inputs) + '->' + output
-        term = contract(equation, *terms, backend='pyro.ops.einsum.torch_log')
+        chain = _build_chain(self, terms, dims) if len(dims) >= 3 else None
+        if chain is not None:
+            # Contract chains in logarithmic depth rather than one dim at a time.
+            nodes, batch_dims, logits = chain
+            assert batch_dims == output
+            term = sequential_logmatmulexp(logits)
+            term = logsumexp(term.reshape(term.shape[:-2] + (-1,)), -1)
+        else:
+            equation = ','.join(inputs) + '->' + output
+            term = contract(equation, *terms, backend='pyro.ops.einsum.torch_log')
         self._save_tensor(term)
         self._cache['dims', id(term)] = output
         return term
@@ -216,6 +224,153 @@ class PackedLogRing(TensorRing):
         return term
 
 
+def _logmatmulexp(x, y):
+    """
+    Numerically stable version of ``(x.exp() @ y.exp()).log()``.
+    """
+    x_shift = x.detach().max(-1, keepdim=True)[0]
+    y_shift = y.detach().max(-2, keepdim=True)[0]
+    x_shift.masked_fill_(x_shift == -float('inf'), 0.)
+    y_shift.masked_fill_(y_shift == -float('inf'), 0.)
+    xy = torch.matmul((x - x_shift).exp(), (y - y_shift).exp()).log()
+    return xy + x_shift + y_shift
+
+
+def sequential_logmatmulexp(logits):
+    """
+    Computes the log-space matrix product of a sequence of matrices, i.e.
+    ``logits[..., 0, :, :] @ ... @ logits[..., -1, :, :]`` where ``@`` is
+    matrix multiplication in log space. This contracts pairs of adjacent
+    matrices in parallel, so that a sequence of ``T`` matrices is reduced by
+    ``O(log(T))`` batched matrix multiplications.
+
+    :param torch.Tensor logits: a tensor of shape ``batch_shape + (T, K, K)``.
+    :return: a tensor of shape ``batch_shape + (K, K)``.
+    :rtype: torch.Tensor
+    """
+    batch_shape = logits.shape[:-3]
+    state_dim = logits.size(-1)
+    while logits.size(-3) > 1:
+        time = logits.size(-3)
+        even_time = time // 2 * 2
+        even_part = logits[..., :even_time, :, :]
+        x_y = even_part.reshape(batch_shape + (even_time // 2, 2, state_dim, state_dim))
+        x, y = x_y[..., 0, :, :], x_y[..., 1, :, :]
+        contracted = _logmatmulexp(x, y)
+        if time > even_time:
+            contracted = torch.cat((contracted, logits[..., -1:, :, :]), dim=-3)
+        logits = contracted
+    return logits.squeeze(-3)
+
+
+def _prefix_logmatmulexp(logits):
+    """
+    Computes all prefix products of :func:`sequential_logmatmulexp` in
+    ``O(log(T))`` batched matrix multiplications.
+    """
+    time = logits.size(-3)
+    shift = 1
+    while shift < time:
+        contracted = _logmatmulexp(logits[..., :-shift, :, :], logits[..., shift:, :, :])
+        logits = torch.cat((logits[..., :shift, :, :], contracted), dim=-3)
+        shift *= 2
+    return logits
+
+
+def _align(ring, term, target):
+    # Permute and unsqueeze a packed term to broadcast against the dims in target.
+    dims = ring.dims(term)
+    if dims:
+        term = term.permute(*sorted(range(len(dims)), key=lambda i: target.index(dims[i])))
+    return term.reshape(tuple(ring._batch_size[dim] if dim in dims else 1 for dim in target))
+
+
+def _build_chain(ring, terms, dims):
+    """
+    If ``terms`` form a chain over ``dims``, i.e. each term depends on at most
+    two of ``dims`` and the terms depending on two of ``dims`` link them along
+    a path, returns a tuple ``(nodes, batch_dims, logits)`` where ``nodes``
+    lists ``dims`` in order along the chain and ``logits`` stacks one
+    transition matrix per link, of shape ``batch_shape + (len(nodes) - 1, K, K)``.
+    Terms depending on a single dim and on no dims are absorbed into the
+    transition matrices. Otherwise returns ``None``.
+    """
+    links = defaultdict(list)
+    unary = defaultdict(list)
+    constants = []
+    neighbors = defaultdict(set)
+    for term in terms:
+        term_dims = ring.dims(term)
+        term_sum_dims = [dim for dim in term_dims if dim in dims]
+        if len(term_sum_dims) > 2 or len(set(term_dims)) != len(term_dims):
+            return None
+        if len(term_sum_dims) == 2:
+            x, y = term_sum_dims
+            neighbors[x].add(y)
+            neighbors[y].add(x)
+            links[frozenset(term_sum_dims)].append(term)
+        elif term_sum_dims:
+            unary[term_sum_dims[0]].append(term)
+        else:
+            constants.append(term)
+    if len(neighbors) != len(dims) or any(len(n) > 2 for n in neighbors.values()):
+        return None
+    ends = sorted(dim for dim, n in neighbors.items() if len(n) == 1)
+    if len(ends) != 2:
+        return None
+    state_dim = ring._batch_size[ends[0]]
+    if any(ring._batch_size[dim] != state_dim for dim in dims):
+        return None
+
+    # Walk along the chain.
+    nodes = [ends[0]]
+    while nodes[-1] != ends[1]:
+        next_dims = neighbors[nodes[-1]].difference(nodes[-2:])
+        if len(next_dims) != 1:
+            return None
+        nodes.append(next_dims.pop())
+    if len(nodes) != len(dims):
+        return None  # the remaining dims form cycles
+
+    # Stack transition matrices.
+    batch_dims = ''.join(sorted(set(''.join(map(ring.dims, terms))) - set(dims)))
+    shape = tuple(ring._batch_size[dim] for dim in batch_dims) + (state_dim, state_dim)
+    logits = []
+    for x, y in zip(nodes, nodes[1:]):
+        target = batch_dims + x + y
+        parts = links[frozenset((x, y))] + unary[y]
+        if x == nodes[0]:
+            parts = parts + unary[x] + constants
+        logits.append(sum(_align(ring, term, target) for term in parts).expand(shape))
+    return nodes, batch_dims, torch.stack(logits, dim=-3)
+
+
+def _chain_log_marginals(ring, terms, dims):
+    """
+    If ``terms`` form a chain over ``dims`` (see :func:`_build_chain`),
+    computes the unnormalized log marginal of every dim by forward-backward
+    message passing, in ``O(log(len(dims)))`` batched matrix multiplications.
+
+    :returns: a tuple ``(batch_dims, marginals)`` where ``marginals`` maps
+        each dim ``d`` to a tensor with dims ``batch_dims + d``, or ``None``
+        if ``terms`` do not form a chain.
+    """
+    chain = _build_chain(ring, terms, dims) if len(dims) >= 2 else None
+    if chain is None:
+        return None
+    nodes, batch_dims, logits = chain
+    time_dim = logits.dim() - 3
+    reverse = torch.arange(len(nodes) - 2, -1, -1, dtype=torch.long, device=logits.device)
+
+    # Forward messages to nodes[1:] and backward messages to nodes[:-1].
+    alpha = logsumexp(_prefix_logmatmulexp(logits), -2)
+    beta = _prefix_logmatmulexp(logits.index_select(time_dim, reverse).transpose(-1, -2))
+    beta = logsumexp(beta, -2).index_select(time_dim, reverse)
+    zero = alpha.new_zeros(alpha.shape[:-2] + (1, alpha.size(-1)))
+    marginals = torch.cat((zero, alpha), dim=-2) + torch.cat((beta, zero), dim=-2)
+    return batch_dims, {dim: marginals[..., i, :] for i, dim in enumerate(nodes)}
+
+
 def _partition_terms(ring, terms, dims):
     """
     Given a list of terms and a set of contraction dims, partitions the terms
@@ -478,6 +633,10 @@ def ubersum(equation, *operands, **kwargs):
     :param str batch_dims: an optional string of batch dims.
     :param dict cache: an optional :func:`~opt_einsum.shared_intermediates`
         cache.
+    :param list size_buckets: an optional sorted list of sizes up to which
+        operand sizes are rounded when looking up cached contraction
+        expressions, so that calls whose sizes vary within a bucket share
+        them. See :func:`pyro.ops.einsum.size_buckets`.
     :return: a tuple of tensors of requested shape, one entry per output.
     :rtype: tuple
     :raises ValueError: if tensor sizes mismatch or an output requests a
@@ -488,6 +647,7 @@ def ubersum(equation, *operands, **kwargs):
     # Extract kwargs.
     cache = kwargs.pop('cache', None)
     batch_dims = kwargs.pop('batch_dims', '')
+    buckets = kwargs.pop('size_buckets', None)
     backend = kwargs.pop('backend', 'pyro.ops.einsum.torch_log')
     if backend != 'pyro.ops.einsum.torch_log':
         raise NotImplementedError
@@ -513,7 +673,7 @@ def ubersum(equation, *operands, **kwargs):
 
     # Compute outputs, sharing intermediate computations.
     results = []
-    with shared_intermediates(cache) as cache:
+    with size_buckets(buckets), shared_intermediates(cache) as cache:
         ring = PackedLogRing(inputs, operands, cache=cache)
         for output in outputs:
             nosum_dims = set(batch_dims + output)
@@ -44,7 +44,13 @@ class DualAveraging(object):
         self.t0 = t0
         self.kappa = kappa
         self.gamma = gamma
+        self.reset()
 
+    def reset(self):
+        """
+        Resets the states of the scheme, e.g. after the ``prox_center`` has
+        been moved to a new location.
+        """
         self._x_avg = 0  # average of primal sequence
         self._g_avg = 0  # average of dual sequence
         self._t = 0
@@ -1,10 +1,208 @@
 from __future__ import absolute_import, division, print_function
 
+import bisect
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import opt_einsum
+import torch
 
 from pyro.ops.einsum.paths import optimize
 
-_PATH_CACHE = {}
+
+class PathCache(object):
+    """
+    Size-bounded least-recently-used cache of contraction expressions, keyed
+    by equation, operand shapes and contraction options.
+
+    The cache counts ``hits`` (lookups answered without a path search) and
+    ``misses`` (lookups that ran a path search), and can be saved to disk and
+    loaded in another process, so that workers do not each repeat the same
+    path searches. Loaded paths are used to build expressions on demand.
+
+    Contraction paths are valid for operands of any size, so when operand
+    sizes vary between calls (e.g. with variable-length minibatches),
+    expressions can be shared by rounding sizes up to ``size_buckets``
+    before looking them up. For example::
+
+        with size_buckets([2 ** i for i in range(1, 16)]):
+            ...
+
+    :param int max_size: the maximum number of cached expressions, and of
+        cached paths. Least recently used entries are evicted first.
+    :param list size_buckets: an optional sorted list of sizes. Each dim of
+        size greater than 1 is rounded up to the smallest bucket at least as
+        large, so that all keys in the same bucket share one cached expression
+        and path. Sizes larger than all buckets are not rounded.
+    """
+    def __init__(self, max_size=1024, size_buckets=None):
+        self.max_size = max_size
+        self.size_buckets = size_buckets
+        self._exprs = OrderedDict()
+        self._paths = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._exprs)
+
+    def __contains__(self, key):
+        key = self.bucket_key(key)
+        return key in self._exprs or key in self._paths
+
+    def bucket_key(self, key):
+        """
+        Rounds the shapes of ``key = (equation, shapes, kwargs)`` up to
+        ``size_buckets``.
+        """
+        if not self.size_buckets:
+            return key
+        equation, shapes, kwargs = key
+        buckets = self.size_buckets
+        shapes = tuple(tuple(size if size <= 1 or size > buckets[-1]
+                             else buckets[bisect.bisect_left(buckets, size)]
+                             for size in shape)
+                       for shape in shapes)
+        return equation, shapes, kwargs
+
+    def get(self, key):
+        """
+        Returns the cached expression for the size bucket of ``key``, or
+        ``None``.
+        """
+        key = self.bucket_key(key)
+        expr = self._exprs.pop(key, None)
+        if expr is not None:
+            self._exprs[key] = expr  # mark as most recently used
+            self.hits += 1
+        return expr
+
+    def get_path(self, key):
+        """
+        Returns a cached contraction path for ``key``, possibly loaded from
+        disk or shared by all keys in the same size bucket, or ``None``.
+        """
+        key = self.bucket_key(key)
+        path = self._paths.pop(key, None)
+        if path is not None:
+            self._paths[key] = path
+            self.hits += 1
+        return path
+
+    def set(self, key, expr):
+        """
+        Caches the expression ``expr`` for the size bucket of ``key``,
+        evicting the least recently used expressions while the cache is over
+        ``max_size``.
+        """
+        self._set(self._exprs, self.bucket_key(key), expr)
+
+    def set_path(self, key, path):
+        """
+        Caches the contraction path ``path`` for the size bucket of ``key``.
+        """
+        self._set(self._paths, self.bucket_key(key), path)
+
+    def _set(self, entries, key, value):
+        entries.pop(key, None)
+        entries[key] = value
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Clears all cached expressions and loaded paths, and resets counters.
+        """
+        self._exprs.clear()
+        self._paths.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        :returns: a dict of counters, for instrumentation.
+        :rtype: dict
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._exprs), "max_size": self.max_size}
+
+    def get_state(self):
+        """
+        Get the serializable state of the cache, a dict mapping keys to
+        contraction paths.
+        """
+        state = dict(self._paths)
+        for key, expr in self._exprs.items():
+            state.setdefault(key, _get_path(expr))
+        return state
+
+    def set_state(self, state):
+        """
+        Add paths from ``state`` (as returned by :meth:`get_state`) to the
+        cache.
+        """
+        assert isinstance(state, dict), "malformed PathCache state"
+        for key, path in state.items():
+            self._set(self._paths, key, path)
+
+    def save(self, filename):
+        """
+        Save contraction paths to disk
+
+        :param filename: file name to save to
+        :type filename: str
+        """
+        with open(filename, "wb") as output_file:
+            torch.save(self.get_state(), output_file)
+
+    def load(self, filename):
+        """
+        Loads contraction paths from disk, e.g. at process start
+
+        :param filename: file name to load from
+        :type filename: str
+        """
+        with open(filename, "rb") as input_file:
+            state = torch.load(input_file)
+        self.set_state(state)
+
+
+def _get_path(expr):
+    return [contraction[0] for contraction in expr.contraction_list]
+
+
+_PATH_CACHE = PathCache()
+
+
+def get_path_cache():
+    """
+    Returns the global :class:`PathCache` used by :func:`contract_expression`.
+    """
+    return _PATH_CACHE
+
+
+@contextmanager
+def size_buckets(buckets):
+    """
+    Context manager that rounds operand sizes up to ``buckets`` when looking
+    up expressions in the global :class:`PathCache`, so that contractions
+    whose sizes vary within a bucket share one cached expression. Does
+    nothing if ``buckets`` is ``None``.
+
+    :param list buckets: a sorted list of sizes, see :class:`PathCache`.
+    """
+    if buckets is None:
+        yield
+        return
+    old = _PATH_CACHE.size_buckets
+    _PATH_CACHE.size_buckets = buckets
+    try:
+        yield
+    finally:
+        _PATH_CACHE.size_buckets = old
 
 
 def contract_expression(equation, *shapes, **kwargs):
@@ -14,17 +212,36 @@ def contract_expression(equation, *shapes, **kwargs):
 
     :param str optimize: one of 'pyro' (cheaper), 'greedy' (more expensive, but
         leads to better paths), or 'optimal' (very expensive, best paths).
-    :param bool cache_path: whether to cache the contraction path.
-        Defaults to True.
+    :param bool cache_path: whether to cache the contraction path in the
+        global :class:`PathCache`. Defaults to True.
     """
     # memoize the contraction path
     cache_path = kwargs.pop('cache_path', True)
-    if cache_path:
-        kwargs_key = tuple(kwargs.items())
-        key = equation, shapes, kwargs_key
-        if key in _PATH_CACHE:
-            return _PATH_CACHE[key]
+    if not cache_path:
+        return _contract_expression(equation, shapes, kwargs)
+    kwargs_key = tuple(kwargs.items())
+    # expressions do not depend on sizes other than 1, so they are shared
+    # by all shapes in the same size bucket
+    key = _PATH_CACHE.bucket_key((equation, shapes, kwargs_key))
+    expr = _PATH_CACHE.get(key)
+    if expr is not None:
+        return expr
 
+    # reuse a loaded path, or search for a path
+    bucket_shapes = key[1]
+    path = _PATH_CACHE.get_path(key)
+    if path is None:
+        _PATH_CACHE.misses += 1
+        expr = _contract_expression(equation, bucket_shapes, kwargs)
+        _PATH_CACHE.set_path(key, _get_path(expr))
+    else:
+        kwargs['optimize'] = path
+        expr = opt_einsum.contract_expression(equation, *bucket_shapes, **kwargs)
+    _PATH_CACHE.set(key, expr)
+    return expr
+
+
+def _contract_expression(equation, shapes, kwargs):
     # use Pyro's cheap optimizer for contraction paths
     if kwargs.get('optimize', 'pyro') == 'pyro':
         inputs, output = equation.split('->')
@@ -32,12 +249,8 @@ def contract_expression(equation, *shapes, **kwargs):
         sizes = {dim: size for dims, shape in zip(inputs, shapes)
                  for dim, size in zip(dims, shape)}
         path = optimize(inputs, output, sizes)
-        kwargs['optimize'] = path
-
-    expr = opt_einsum.contract_expression(equation, *shapes, **kwargs)
-    if cache_path:
-        _PATH_CACHE[key] = expr
-    return expr
+        kwargs = dict(kwargs, optimize=path)
+    return opt_einsum.contract_expression(equation, *shapes, **kwargs)
 
 
 def contract(equation, *operands, **kwargs):
@@ -57,4 +270,4 @@ def contract(equation, *operands, **kwargs):
     return expr(*operands, backend=backend, out=out)
 
 
-__all__ = ['contract', 'contract_expression']
+__all__ = ['PathCache', 'contract', 'contract_expression', 'get_path_cache', 'size_buckets']
@@ -4,47 +4,160 @@ import torch
 
 EINSUM_SYMBOLS_BASE = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
+# The maximum number of elements in temporaries created by einsum.
+# Larger contractions are computed block by block.
+BLOCK_SIZE = 2 ** 24
+
 
 def transpose(a, axes):
     return a.permute(*axes)
 
 
-def einsum(equation, *operands):
+def _logsumexp(x, dim):
+    shift = x.detach().max(dim, keepdim=True)[0]
+    shift.masked_fill_(shift == -float('inf'), 0.)
+    return (x - shift).exp().sum(dim).log() + shift.squeeze(dim)
+
+
+def _product(sizes):
+    result = 1
+    for size in sizes:
+        result *= size
+    return result
+
+
+def _reshape_to_output(x, dims, output):
+    # permute a tensor reduced over non-output dims to match output
+    x = x.reshape(torch.Size(size for size, dim in zip(x.shape, dims) if dim in output))
+    if x.dim():
+        x = x.reshape((1,) * (len(output) - x.dim()) + x.shape)
+        dims = [dim for dim in dims if dim in output]
+        dims = [dim for dim in output if dim not in dims] + dims
+        x = x.permute(*(dims.index(dim) for dim in output))
+    return x
+
+
+def _split(fn, inputs, output, operands, sizes, total_size):
     """
-    Log-sum-exp implementation of einsum.
+    Computes ``fn`` block by block along the largest dim, so that each block
+    has about ``BLOCK_SIZE`` elements. Returns ``None`` if no dim can be split.
     """
-    # rename symbols to support PyTorch 0.4.1 and earlier,
-    # which allow only symbols a-z.
-    symbols = sorted(set(equation) - set(',->'))
-    rename = dict(zip(symbols, 'abcdefghijklmnopqrstuvwxyz'))
-    equation = ''.join(rename.get(s, s) for s in equation)
-
-    inputs, output = equation.split('->')
-    inputs = inputs.split(',')
+    dim = max(sorted(sizes), key=lambda d: sizes[d])
+    size = sizes[dim]
+    if size == 1:
+        return None
+    step = max(1, size * BLOCK_SIZE // total_size)
+    parts = []
+    for start in range(0, size, step):
+        length = min(step, size - start)
+        block_operands = [x.narrow(dims.index(dim), start, length)
+                          if dim in dims and x.size(dims.index(dim)) == size else x
+                          for dims, x in zip(inputs, operands)]
+        block_sizes = sizes.copy()
+        block_sizes[dim] = length
+        parts.append(fn(inputs, output, block_operands, block_sizes))
+    if dim in output:
+        return torch.cat(parts, output.index(dim))
+    return _logsumexp(torch.stack(parts), 0)
+
+
+def _exp_einsum(inputs, output, operands, sizes):
+    """
+    Contracts operands by exponentiating them after subtracting their max
+    over contracted dims. This is fast, but may underflow unless at most one
+    operand varies along the contracted dims.
+    """
+    total_size = max(sum(x.numel() for x in operands), _product(sizes[dim] for dim in output))
+    if total_size > BLOCK_SIZE:
+        result = _split(_exp_einsum, inputs, output, operands, sizes, total_size)
+        if result is not None:
+            return result
 
     shifts = []
     exp_operands = []
     for dims, operand in zip(inputs, operands):
-        shift = operand
+        shift = operand.detach()
         for i, dim in enumerate(dims):
             if dim not in output:
                 shift = shift.max(i, keepdim=True)[0]
+        shift = shift.masked_fill(shift == -float('inf'), 0.)
         exp_operands.append((operand - shift).exp())
+        shifts.append(_reshape_to_output(shift, dims, output))
 
-        # permute shift to match output
-        shift = shift.reshape(torch.Size(size for size, dim in zip(operand.shape, dims)
-                                         if dim in output))
-        if shift.dim():
-            shift = shift.reshape((1,) * (len(output) - shift.dim()) + shift.shape)
-            dims = [dim for dim in dims if dim in output]
-            dims = [dim for dim in output if dim not in dims] + dims
-            shift = shift.permute(*(dims.index(dim) for dim in output))
-        shifts.append(shift)
-
+    equation = ','.join(inputs) + '->' + output
     result = torch.einsum(equation, exp_operands).log()
     return sum(shifts + [result])
 
 
+def _exact_einsum(inputs, output, operands, sizes):
+    """
+    Contracts operands by ``logsumexp`` of their broadcasted sum. This is
+    slower, but does not underflow.
+    """
+    contracted = ''.join(sorted(set(sizes) - set(output)))
+    all_dims = output + contracted
+    shape = tuple(sizes[dim] for dim in all_dims)
+    total_size = _product(shape)
+    if total_size > BLOCK_SIZE:
+        result = _split(_exact_einsum, inputs, output, operands, sizes, total_size)
+        if result is not None:
+            return result
+
+    term = 0.
+    for dims, operand in zip(inputs, operands):
+        if dims:
+            order = sorted(range(len(dims)), key=lambda i: all_dims.index(dims[i]))
+            operand = operand.permute(*order)
+            dims = [dims[i] for i in order]
+        term = term + operand.reshape(tuple(operand.size(dims.index(dim)) if dim in dims else 1
+                                            for dim in all_dims))
+    term = term.expand(shape)
+    if not contracted:
+        return term
+    return _logsumexp(term.reshape(shape[:len(output)] + (-1,)), -1)
+
+
+def einsum(equation, *operands):
+    """
+    Log-sum-exp implementation of einsum.
+
+    If at most one operand varies along the contracted dims, operands are
+    exponentiated after subtracting their max over contracted dims, then
+    contracted by :func:`torch.einsum`. The max term of each sum is then
+    exactly one, so this cannot underflow. Other contractions, e.g. pairwise
+    matrix products, are computed by an exact log-sum-exp over the broadcasted
+    sum of the operands. This is slower than :func:`torch.einsum`, but does
+    not underflow and does not synchronize with the device. Contractions
+    whose temporaries would exceed ``BLOCK_SIZE`` elements are computed block
+    by block along their largest dims.
+    """
+    # rename symbols to support PyTorch 0.4.1 and earlier,
+    # which allow only symbols a-z.
+    symbols = sorted(set(equation) - set(',->'))
+    rename = dict(zip(symbols, 'abcdefghijklmnopqrstuvwxyz'))
+    equation = ''.join(rename.get(s, s) for s in equation)
+
+    inputs, output = equation.split('->')
+    inputs = inputs.split(',')
+    operands = list(operands)
+    for i, dims in enumerate(inputs):
+        if len(set(dims)) != len(dims):
+            # Take diagonals first, which selects rather than sums entries.
+            unique_dims = ''.join(sorted(set(dims), key=dims.index))
+            operands[i] = torch.einsum(dims + '->' + unique_dims, [operands[i]])
+            inputs[i] = unique_dims
+    sizes = {}
+    for dims, operand in zip(inputs, operands):
+        for dim, size in zip(dims, operand.shape):
+            sizes[dim] = max(sizes.get(dim, 1), size)
+
+    num_contracted = sum(any(dim not in output and size > 1 for dim, size in zip(dims, operand.shape))
+                         for dims, operand in zip(inputs, operands))
+    if num_contracted <= 1:
+        return _exp_einsum(inputs, output, operands, sizes)
+    return _exact_einsum(inputs, output, operands, sizes)
+
+
 # Copyright (c) 2014 Daniel Smith
 # This function is copied and adapted from:
 # https://github.com/dgasmith/opt_einsum/blob/a6dd686/opt_einsum/backends/torch.py
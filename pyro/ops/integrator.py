@@ -1,34 +1,55 @@
 from __future__ import absolute_import, division, print_function
 
+import torch
 from torch.autograd import grad
 
 
-def velocity_verlet(z, r, potential_fn, step_size, num_steps=1):
+def velocity_verlet(z, r, potential_fn, step_size, num_steps=1, inverse_mass_matrix=None):
     """
     Second order symplectic integrator that uses the velocity verlet algorithm.
 
-    :param dict z: dictionary of sample site names and their current values
-        (type :class:`~torch.Tensor`).
-    :param dict r: dictionary of sample site names and corresponding momenta
-        (type :class:`~torch.Tensor`).
+    The state may be given either as dictionaries keyed by sample site, or in
+    packed form, as two 1-D tensors holding all the latents (resp. momenta)
+    concatenated in sorted site order. The packed form updates the whole state
+    with a single fused ``axpy`` per half step and a single ``grad`` call per
+    step, avoiding the per-site Python bookkeeping of the dictionary form.
+
+    :param z: dictionary of sample site names and their current values
+        (type :class:`~torch.Tensor`), or a packed 1-D tensor.
+    :param r: dictionary of sample site names and corresponding momenta
+        (type :class:`~torch.Tensor`), or a packed 1-D tensor.
     :param callable potential_fn: function that returns potential energy given z
         for each sample site. The negative gradient of the function with respect
         to ``z`` determines the rate of change of the corresponding sites'
         momenta ``r``.
     :param float step_size: step size for each time step iteration.
     :param int num_steps: number of discrete time steps over which to integrate.
+    :param torch.Tensor inverse_mass_matrix: optional inverse mass matrix of the
+        kinetic energy, either a vector (diagonal mass) or a square matrix (dense
+        mass) over the latents flattened in sorted site order. Defaults to the
+        identity.
     :return tuple (z_next, r_next): final position and momenta, having same types as (z, r).
     """
+    if torch.is_tensor(z):
+        z_next, r_next = z, r
+        grads, _ = _grad(potential_fn, z_next)
+        for _ in range(num_steps):
+            z_next, r_next, grads, _ = _packed_step(z_next, r_next, potential_fn, step_size,
+                                                    grads, inverse_mass_matrix)
+        return z_next, r_next
+
     z_next = z.copy()
     r_next = r.copy()
     grads, _ = _grad(potential_fn, z_next)
 
     for _ in range(num_steps):
-        for site_name in z_next:
+        for site_name in r_next:
             # r(n+1/2)
             r_next[site_name] = r_next[site_name] + 0.5 * step_size * (-grads[site_name])
+        r_grads = _kinetic_grad(inverse_mass_matrix, r_next)
+        for site_name in z_next:
             # z(n+1)
-            z_next[site_name] = z_next[site_name] + step_size * r_next[site_name]
+            z_next[site_name] = z_next[site_name] + step_size * r_grads[site_name]
         grads, _ = _grad(potential_fn, z_next)
         for site_name in r_next:
             # r(n+1)
@@ -36,29 +57,48 @@ def velocity_verlet(z, r, potential_fn, step_size, num_steps=1):
     return z_next, r_next
 
 
-def single_step_velocity_verlet(z, r, potential_fn, step_size, z_grads=None):
+def single_step_velocity_verlet(z, r, potential_fn, step_size, z_grads=None, inverse_mass_matrix=None):
     """
     A special case of ``velocity_verlet`` integrator where ``num_steps=1``. It is particular
     helpful for NUTS kernel.
 
     :param torch.Tensor z_grads: optional gradients of potential energy at current ``z``.
+    :param torch.Tensor inverse_mass_matrix: optional inverse mass matrix (see
+        :func:`velocity_verlet`).
     :return tuple (z_next, r_next, z_grads, potential_energy): next position and momenta,
         together with the potential energy and its gradient w.r.t. ``z_next``.
     """
+    grads = _grad(potential_fn, z)[0] if z_grads is None else z_grads
+    if torch.is_tensor(z):
+        return _packed_step(z, r, potential_fn, step_size, grads, inverse_mass_matrix)
+
     z_next = z.copy()
     r_next = r.copy()
-    grads = _grad(potential_fn, z_next)[0] if z_grads is None else z_grads
 
-    for site_name in z_next:
+    for site_name in r_next:
         r_next[site_name] = r_next[site_name] + 0.5 * step_size * (-grads[site_name])
-        z_next[site_name] = z_next[site_name] + step_size * r_next[site_name]
+    r_grads = _kinetic_grad(inverse_mass_matrix, r_next)
+    for site_name in z_next:
+        z_next[site_name] = z_next[site_name] + step_size * r_grads[site_name]
     grads, potential_energy = _grad(potential_fn, z_next)
     for site_name in r_next:
         r_next[site_name] = r_next[site_name] + 0.5 * step_size * (-grads[site_name])
     return z_next, r_next, grads, potential_energy
 
 
+def _packed_step(z, r, potential_fn, step_size, z_grads, inverse_mass_matrix):
+    r_next = r.add(-0.5 * step_size, z_grads)  # r(n+1/2)
+    z_next = z.add(step_size, _kinetic_grad(inverse_mass_matrix, r_next))  # z(n+1)
+    z_grads, potential_energy = _grad(potential_fn, z_next)
+    r_next = r_next.add(-0.5 * step_size, z_grads)  # r(n+1)
+    return z_next, r_next, z_grads, potential_energy
+
+
 def _grad(potential_fn, z):
+    if torch.is_tensor(z):
+        z = z.detach().requires_grad_()
+        potential_energy = potential_fn(z)
+        return grad(potential_energy, z)[0], potential_energy
     z_keys, z_nodes = zip(*z.items())
     for node in z_nodes:
         node.requires_grad = True
@@ -67,3 +107,30 @@ def _grad(potential_fn, z):
     for node in z_nodes:
         node.requires_grad = False
     return dict(zip(z_keys, grads)), potential_energy
+
+
+def _kinetic_grad(inverse_mass_matrix, r):
+    """
+    Gradient of the kinetic energy ``0.5 * r^T M^{-1} r`` w.r.t. the momenta ``r``.
+    """
+    if inverse_mass_matrix is None:
+        return r
+    if torch.is_tensor(r):
+        return _flat_kinetic_grad(inverse_mass_matrix, r)
+    site_names = sorted(r)
+    r_flat = torch.cat([r[site_name].reshape(-1) for site_name in site_names])
+    grads_flat = _flat_kinetic_grad(inverse_mass_matrix, r_flat)
+    # unpacking
+    grads = {}
+    pos = 0
+    for site_name in site_names:
+        next_pos = pos + r[site_name].numel()
+        grads[site_name] = grads_flat[pos:next_pos].reshape(r[site_name].shape)
+        pos = next_pos
+    return grads
+
+
+def _flat_kinetic_grad(inverse_mass_matrix, r_flat):
+    if inverse_mass_matrix.dim() == 1:
+        return inverse_mass_matrix * r_flat
+    return inverse_mass_matrix.matmul(r_flat)
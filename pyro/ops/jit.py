@@ -37,14 +37,16 @@ class CompiledFunction(object):
             @torch.jit.compile(**self._jit_options)
             def compiled(unconstrained_params, *args):
                 self = weakself()
-                constrained_params = {}
-                for name, unconstrained_param in zip(self._param_names, unconstrained_params):
-                    constrained_param = pyro.param(name)  # assume param has been initialized
-                    assert constrained_param.unconstrained() is unconstrained_param
-                    constrained_params[name] = constrained_param
-
-                return poutine.replay(
-                    self.fn, params=constrained_params)(*args, **kwargs)
+                # Memoized constrained values would be seen as constants by the tracer.
+                with pyro.get_param_store().memoization_disabled():
+                    constrained_params = {}
+                    for name, unconstrained_param in zip(self._param_names, unconstrained_params):
+                        constrained_param = pyro.param(name)  # assume param has been initialized
+                        assert constrained_param.unconstrained() is unconstrained_param
+                        constrained_params[name] = constrained_param
+
+                    return poutine.replay(
+                        self.fn, params=constrained_params)(*args, **kwargs)
 
             self.compiled = compiled
 
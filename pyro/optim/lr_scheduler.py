@@ -11,6 +11,8 @@ class PyroLRScheduler(PyroOptim):
     :param optim_constructor: a torch.optim.lr_scheduler
     :param optim_args: a dictionary of learning arguments for the optimizer or a callable that returns
         such dictionaries. must contain the key 'optimizer' with pytorch optimizer value
+    :param bool grouped: if True, a single scheduler (of a single optimizer) drives all parameters,
+        see :class:`~pyro.optim.optim.PyroOptim`.
 
     Example::
 
@@ -19,7 +21,7 @@ class PyroLRScheduler(PyroOptim):
         svi = SVI(model, guide, pyro_scheduler, loss=TraceGraph_ELBO())
         svi.step()
     """
-    def __init__(self, scheduler_constructor, optim_args):
+    def __init__(self, scheduler_constructor, optim_args, grouped=False):
         # pytorch scheduler
         self.pt_scheduler_constructor = scheduler_constructor
         # torch optimizer
@@ -29,7 +31,7 @@ class PyroLRScheduler(PyroOptim):
         self.kwargs = optim_args
         # current epoch
         self.epoch = None
-        super(PyroLRScheduler, self).__init__(pt_optim_constructor, optim_kwargs)
+        super(PyroLRScheduler, self).__init__(pt_optim_constructor, optim_kwargs, grouped=grouped)
 
     def __call__(self, params, *args, **kwargs):
         kwargs['epoch'] = self.epoch
@@ -39,5 +41,19 @@ class PyroLRScheduler(PyroOptim):
         optim = super(PyroLRScheduler, self)._get_optim(params)
         return self.pt_scheduler_constructor(optim, **self.kwargs)
 
+    def _get_optimizer(self, optim_obj):
+        return optim_obj.optimizer
+
+    def _add_param_group(self, optim_obj, group):
+        super(PyroLRScheduler, self)._add_param_group(optim_obj, group)
+        # extend the per-group lists that the scheduler set up at construction
+        group = optim_obj.optimizer.param_groups[-1]
+        if hasattr(optim_obj, 'base_lrs'):
+            group.setdefault('initial_lr', group['lr'])
+            optim_obj.base_lrs.append(group['initial_lr'])
+        for attr in ('lr_lambdas', 'min_lrs'):
+            if hasattr(optim_obj, attr):
+                getattr(optim_obj, attr).append(getattr(optim_obj, attr)[-1])
+
     def set_epoch(self, epoch):
         self.epoch = epoch
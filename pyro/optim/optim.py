@@ -15,9 +15,13 @@ class PyroOptim(object):
     :param optim_constructor: a torch.optim.Optimizer
     :param optim_args: a dictionary of learning arguments for the optimizer or a callable that returns
         such dictionaries
+    :param bool grouped: if True, a single torch optimizer is used for all parameters, with one
+        param group per parameter that is added when the parameter is first seen. Otherwise a
+        separate torch optimizer is instantiated for each parameter.
     """
-    def __init__(self, optim_constructor, optim_args):
+    def __init__(self, optim_constructor, optim_args, grouped=False):
         self.pt_optim_constructor = optim_constructor
+        self.grouped = grouped
 
         # must be callable or dict
         assert callable(optim_args) or isinstance(
@@ -29,6 +33,10 @@ class PyroOptim(object):
         # holds the torch optimizer objects
         self.optim_objs = {}
 
+        # holds the single torch optimizer object, and its param groups keyed by param, if grouped
+        self.grouped_optim_obj = None
+        self._param_groups = {}
+
         # holds the current epoch
         self.epoch = None
 
@@ -41,39 +49,115 @@ class PyroOptim(object):
         :type params: an iterable of strings
 
         Do an optimization step for each param in params. If a given param has never been seen before,
-        initialize an optimizer for it.
+        initialize an optimizer for it (or add a param group for it, if grouped).
         """
+        if self.grouped:
+            self._grouped_step(params, *args, **kwargs)
+        else:
+            for p in params:
+                # if we have not seen this param before, we instantiate and optim object to deal with it
+                if p not in self.optim_objs:
+                    # create a single optim object for that param
+                    self.optim_objs[p] = self._get_optim(p)
+                    # set state from _state_waiting_to_be_consumed if present
+                    param_name = pyro.get_param_store().param_name(p)
+                    if param_name in self._state_waiting_to_be_consumed:
+                        state = self._state_waiting_to_be_consumed.pop(param_name)
+                        self.optim_objs[p].load_state_dict(state)
+
+                # actually perform the step for the optim object
+                self.optim_objs[p].step(*args, **kwargs)
+
+                # if optim object was a scheduler, perform an actual optim step
+                if isinstance(self.optim_objs[p], torch.optim.lr_scheduler._LRScheduler):
+                    optim_kwargs = kwargs.copy()
+                    optim_kwargs.pop('epoch', None)
+                    self.optim_objs[p].optimizer.step(*args, **optim_kwargs)
+
+        # torch optimizers update params through .data, which does not
+        # invalidate the constrained values memoized by the param store
+        pyro.get_param_store().clear_cache()
+
+    def _grouped_step(self, params, *args, **kwargs):
+        params = set(params)
         for p in params:
-            # if we have not seen this param before, we instantiate and optim object to deal with it
-            if p not in self.optim_objs:
-                # create a single optim object for that param
-                self.optim_objs[p] = self._get_optim(p)
-                # set state from _state_waiting_to_be_consumed if present
-                param_name = pyro.get_param_store().param_name(p)
-                if param_name in self._state_waiting_to_be_consumed:
-                    state = self._state_waiting_to_be_consumed.pop(param_name)
-                    self.optim_objs[p].load_state_dict(state)
-
-            # actually perform the step for the optim object
-            self.optim_objs[p].step(*args, **kwargs)
-
-            # if optim object was a scheduler, perform an actual optim step
-            if isinstance(self.optim_objs[p], torch.optim.lr_scheduler._LRScheduler):
-                optim_kwargs = kwargs.copy()
-                optim_kwargs.pop('epoch', None)
-                self.optim_objs[p].optimizer.step(*args, **optim_kwargs)
+            if p not in self._param_groups:
+                self._add_grouped_param(p)
+
+        # Only params passed in take a step, as with one optimizer per param, so
+        # other params are hidden from the optimizer by temporarily removing their grads.
+        inactive = [(p, p.grad) for p in self._param_groups if p not in params and p.grad is not None]
+        for p, _ in inactive:
+            p.grad = None
+
+        self.grouped_optim_obj.step(*args, **kwargs)
+
+        # if optim object was a scheduler, perform an actual optim step
+        if isinstance(self.grouped_optim_obj, torch.optim.lr_scheduler._LRScheduler):
+            optim_kwargs = kwargs.copy()
+            optim_kwargs.pop('epoch', None)
+            self.grouped_optim_obj.optimizer.step(*args, **optim_kwargs)
+
+        for p, grad in inactive:
+            p.grad = grad
+
+    def _add_grouped_param(self, p):
+        param_name = pyro.get_param_store().param_name(p)
+        state = self._state_waiting_to_be_consumed.pop(param_name, None)
+        if self.grouped_optim_obj is None:
+            self.grouped_optim_obj = self._get_optim(p)
+            group = self._get_optimizer(self.grouped_optim_obj).param_groups[0]
+        else:
+            group = dict(self._get_optim_args(p), params=[p])
+            self._add_param_group(self.grouped_optim_obj, group)
+            # the optimizer fills in its defaults
+            group = self._get_optimizer(self.grouped_optim_obj).param_groups[-1]
+        self._param_groups[p] = group
+
+        # set state from _state_waiting_to_be_consumed if present
+        if state is not None:
+            group.update((k, v) for k, v in state['param_groups'][0].items() if k != 'params')
+            optimizer = self._get_optimizer(self.grouped_optim_obj)
+            for param_state in state['state'].values():
+                optimizer.state[p] = {k: _cast_like(v, p) for k, v in param_state.items()}
+
+    def _get_optimizer(self, optim_obj):
+        """
+        Returns the torch optimizer of the object created by :meth:`_get_optim`.
+        """
+        return optim_obj
+
+    def _add_param_group(self, optim_obj, group):
+        self._get_optimizer(optim_obj).add_param_group(group)
 
     def get_state(self):
         """
         Get state associated with all the optimizers in the form of a dictionary with
         key-value pairs (parameter name, optim state dicts)
         """
+        if self.grouped:
+            return self._get_grouped_state()
         state_dict = {}
         for param in self.optim_objs:
             param_name = pyro.get_param_store().param_name(param)
             state_dict[param_name] = self.optim_objs[param].state_dict()
         return state_dict
 
+    def _get_grouped_state(self):
+        # Split the state of the single optimizer into per-param state dicts, in
+        # the same format as the state dict of an optimizer of a single param.
+        state_dict = {}
+        if self.grouped_optim_obj is None:
+            return state_dict
+        optimizer = self._get_optimizer(self.grouped_optim_obj)
+        for p, group in self._param_groups.items():
+            param_name = pyro.get_param_store().param_name(p)
+            state_dict[param_name] = {
+                'state': {0: optimizer.state[p]} if p in optimizer.state else {},
+                'param_groups': [dict(group, params=[0])],
+            }
+        return state_dict
+
     def set_state(self, state_dict):
         """
         Set the state associated with all the optimizers using the state obtained
@@ -126,17 +210,26 @@ class PyroOptim(object):
             return self.pt_optim_args
 
 
-def AdagradRMSProp(optim_args):
+def _cast_like(value, param):
+    # as in torch.optim.Optimizer.load_state_dict
+    if not torch.is_tensor(value):
+        return value
+    if value.is_floating_point():
+        return value.to(dtype=param.dtype, device=param.device)
+    return value.to(device=param.device)
+
+
+def AdagradRMSProp(optim_args, grouped=False):
     """
     A wrapper for an optimizer that is a mash-up of
     :class:`~torch.optim.Adagrad` and :class:`~torch.optim.RMSprop`.
     """
-    return PyroOptim(pt_AdagradRMSProp, optim_args)
+    return PyroOptim(pt_AdagradRMSProp, optim_args, grouped=grouped)
 
 
-def ClippedAdam(optim_args):
+def ClippedAdam(optim_args, grouped=False):
     """
     A wrapper for a modification of the :class:`~torch.optim.Adam`
     optimization algorithm that supports gradient clipping.
     """
-    return PyroOptim(pt_ClippedAdam, optim_args)
+    return PyroOptim(pt_ClippedAdam, optim_args, grouped=grouped)
@@ -13,7 +13,8 @@ for _name, _Optim in torch.optim.__dict__.items():
     if _Optim is torch.optim.Optimizer:
         continue
 
-    _PyroOptim = (lambda _Optim: lambda optim_args: PyroOptim(_Optim, optim_args))(_Optim)
+    _PyroOptim = (lambda _Optim: lambda optim_args, grouped=False:
+                  PyroOptim(_Optim, optim_args, grouped=grouped))(_Optim)
     _PyroOptim.__name__ = _name
     _PyroOptim.__doc__ = 'Wraps :class:`torch.optim.{}` with :class:`~pyro.optim.optim.PyroOptim`.'.format(_name)
 
@@ -30,7 +31,8 @@ for _name, _Optim in torch.optim.lr_scheduler.__dict__.items():
     if _Optim is torch.optim.Optimizer:
         continue
 
-    _PyroOptim = (lambda _Optim: lambda optim_args: PyroLRScheduler(_Optim, optim_args))(_Optim)
+    _PyroOptim = (lambda _Optim: lambda optim_args, grouped=False:
+                  PyroLRScheduler(_Optim, optim_args, grouped=grouped))(_Optim)
     _PyroOptim.__name__ = _name
     _PyroOptim.__doc__ = 'Wraps :class:`torch.optim.{}` with '.format(_name) +\
                          ':class:`~pyro.optim.lr_scheduler.PyroLRScheduler`.'
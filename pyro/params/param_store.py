@@ -2,6 +2,7 @@ from __future__ import absolute_import, division, print_function
 
 import re
 import weakref
+from contextlib import contextmanager
 
 import torch
 from torch.distributions import constraints, transform_to
@@ -40,6 +41,8 @@ class ParamStoreDict(object):
         self._params = {}  # dictionary from param name to param
         self._param_to_name = {}  # dictionary from unconstrained param to param name
         self._constraints = {}  # dictionary from param name to constraint object
+        self._constrained_cache = {}  # dictionary from param name to memoized constrained value
+        self._memoize = True
 
     def clear(self):
         """
@@ -48,6 +51,7 @@ class ParamStoreDict(object):
         self._params = {}
         self._param_to_name = {}
         self._constraints = {}
+        self._constrained_cache = {}
 
     def items(self):
         """
@@ -92,20 +96,86 @@ class ParamStoreDict(object):
         unconstrained_value = constrained_value.unconstrained()
         self._param_to_name.pop(unconstrained_value)
         self._constraints.pop(name)
+        self._constrained_cache.pop(name, None)
 
     def __getitem__(self, name):
         """
         Get the constrained value of a named parameter.
+
+        The constrained value is memoized until the unconstrained value is
+        replaced or modified in place through autograd (which bumps its
+        version), the grad mode changes, a backward pass goes through the
+        constrained value, or :meth:`clear_cache` is called. Updates through
+        ``.data`` do not bump the version and are not detected, so after
+        updating params this way, e.g. with a :mod:`torch.optim` optimizer,
+        call :meth:`clear_cache`. :class:`~pyro.optim.optim.PyroOptim` does
+        this after each step.
         """
         unconstrained_value = self._params[name]
+        constraint = self._constraints[name]
+        if constraint is constraints.real:
+            # identity transform, nothing to memoize
+            unconstrained_value.unconstrained = weakref.ref(unconstrained_value)
+            return unconstrained_value
+
+        if not self._memoize:
+            constrained_value = transform_to(constraint)(unconstrained_value)
+            constrained_value.unconstrained = weakref.ref(unconstrained_value)
+            return constrained_value
+
+        key = (unconstrained_value, unconstrained_value._version, torch.is_grad_enabled())
+        cached = self._constrained_cache.get(name)
+        if cached is not None and cached[0][0] is key[0] and cached[0][1:] == key[1:]:
+            return cached[1]
 
         # compute the constrained value
-        constraint = self._constraints[name]
         constrained_value = transform_to(constraint)(unconstrained_value)
         constrained_value.unconstrained = weakref.ref(unconstrained_value)
+        self._constrained_cache[name] = key, constrained_value
+        if constrained_value.requires_grad:
+            # The graph of the constrained value is freed by a backward pass,
+            # after which it cannot be reused.
+            constrained_value.register_hook(self._invalidation_hook(name, constrained_value))
 
         return constrained_value
 
+    def clear_cache(self, name=None):
+        """
+        Drops the memoized constrained value of the named parameter, or of all
+        parameters if ``name`` is ``None``, so that it is recomputed on the
+        next access.
+
+        :param str name: optional name of a parameter.
+        """
+        if name is None:
+            self._constrained_cache.clear()
+        else:
+            self._constrained_cache.pop(name, None)
+
+    @contextmanager
+    def memoization_disabled(self):
+        """
+        Context manager within which constrained values are recomputed on
+        every access, e.g. so that the transforms are recorded while tracing
+        with the JIT.
+        """
+        memoize, self._memoize = self._memoize, False
+        try:
+            yield
+        finally:
+            self._memoize = memoize
+
+    def _invalidation_hook(self, name, constrained_value):
+        constrained_value = weakref.ref(constrained_value)
+        cache = weakref.ref(self._constrained_cache)
+
+        def hook(grad):
+            cache_ = cache()
+            if cache_ is not None and name in cache_ and cache_[name][1] is constrained_value():
+                del cache_[name]
+
+        return hook
+
     def __setitem__(self, name, new_constrained_value):
         """
         Set the constrained value of an existing parameter, or the value of a
@@ -125,6 +195,7 @@ class ParamStoreDict(object):
         # store a bidirectional mapping between name and unconstrained tensor
         self._params[name] = unconstrained_value
         self._param_to_name[unconstrained_value] = name
+        self._constrained_cache.pop(name, None)
 
     def setdefault(self, name, init_constrained_value, constraint=constraints.real):
         """
@@ -252,6 +323,7 @@ class ParamStoreDict(object):
         for param_name, param in state['params'].items():
             self._params[param_name] = param
             self._param_to_name[param] = param_name
+            self._constrained_cache.pop(param_name, None)
 
         for param_name, constraint in state['constraints'].items():
             if isinstance(constraint, type(constraints.real)):
@@ -1,9 +1,9 @@
 from __future__ import absolute_import, division, print_function
 
 from .handlers import block, broadcast, condition, do, enum, escape, indep, infer_config, lift, \
-    mask, replay, queue, scale, trace
+    markov, mask, replay, queue, scale, trace
 from .runtime import NonlocalExit
-from .trace_struct import Trace
+from .trace_struct import FlatTrace, Trace
 from .util import enable_validation, is_validation_enabled
 
 
@@ -15,10 +15,12 @@ __all__ = [
     "enable_validation",
     "enum",
     "escape",
+    "FlatTrace",
     "indep",
     "infer_config",
     "is_validation_enabled",
     "lift",
+    "markov",
     "mask",
     "NonlocalExit",
     "replay",
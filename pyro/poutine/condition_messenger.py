@@ -1,7 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 from .messenger import Messenger
-from .trace_struct import Trace
+from .trace_struct import FlatTrace, Trace
 
 
 class ConditionMessenger(Messenger):
@@ -35,7 +35,7 @@ class ConditionMessenger(Messenger):
         if name in self.data:
             assert not msg["is_observed"], \
                 "should not change values of existing observes"
-            if isinstance(self.data, Trace):
+            if isinstance(self.data, (Trace, FlatTrace)):
                 msg["value"] = self.data.nodes[name]["value"]
             else:
                 msg["value"] = self.data[name]
@@ -1,6 +1,13 @@
 from __future__ import absolute_import, division, print_function
 
+import itertools
+
 from .messenger import Messenger
+from .util import site_is_subsample
+
+# Unique ids of enumerated variables, which tell apart variables that share a
+# recycled enumeration dim.
+_ENUM_IDS = itertools.count()
 
 
 class EnumerateMessenger(Messenger):
@@ -8,6 +15,13 @@ class EnumerateMessenger(Messenger):
     Enumerates in parallel over discrete sample sites marked
     ``infer={"enumerate": "parallel"}``.
 
+    Each enumerated site is allocated a tensor dimension left of all other
+    enumeration dims. Inside a :func:`~pyro.markov` context, a site is
+    instead allocated the rightmost dimension not used by any site in its
+    Markov scope, so that enumeration dims are recycled along time steps.
+    Every sample site records in ``msg["infer"]["_dim_to_id"]`` the ids of
+    the enumerated variables of the enumeration dims it may depend on.
+
     :param first_available_dim: The first tensor dimension (counting
         from the right) that is available for parallel enumeration. This
         dimension and all dimensions left may be used internally by Pyro.
@@ -18,10 +32,20 @@ class EnumerateMessenger(Messenger):
         super(EnumerateMessenger, self).__init__()
         self.first_available_dim = first_available_dim
         self.next_available_dim = None
+        self._first_dim = None
+        self._global_dims = None  # enum dim -> id, for dims that are never recycled
+        self._current_dims = None  # enum dim -> id of the latest variable at that dim
+        self._value_dims = None  # site name -> (enum dim -> id), for dims of the site's value
+        self._param_dims = None  # site name -> (enum dim -> id), for dims in scope of the site
 
     def __enter__(self):
         first = self.first_available_dim
         self.next_available_dim = first() if callable(first) else first
+        self._first_dim = self.next_available_dim
+        self._global_dims = {}
+        self._current_dims = {}
+        self._value_dims = {}
+        self._param_dims = {}
         return super(EnumerateMessenger, self).__enter__()
 
     def _pyro_sample(self, msg):
@@ -29,35 +53,81 @@ class EnumerateMessenger(Messenger):
         :param msg: current message at a trace site.
         :returns: a sample from the stochastic function at the site.
         """
-        if msg["done"] or msg["type"] != "sample" or msg["is_observed"]:
+        if msg["done"] or msg["type"] != "sample" or site_is_subsample(msg):
+            return
+
+        # Collect the enumeration dims that this site may depend on.
+        scope = msg["infer"].get("_markov_scope")
+        if scope is None:
+            param_dims = self._current_dims.copy()
+        else:
+            param_dims = self._global_dims.copy()
+            for name in scope:
+                param_dims.update(self._value_dims.get(name, {}))
+        self._param_dims[msg["name"]] = param_dims
+
+        if msg["is_observed"] or msg["infer"].get("enumerate") != "parallel":
             return
 
-        if msg["infer"].get("enumerate") == "parallel":
-            dist = msg["fn"]
-            num_samples = msg["infer"].get("num_samples")
-            if num_samples is None:
-                # Enumerate over the support of the distribution.
-                value = dist.enumerate_support(expand=msg["infer"].get("expand", False))
-            else:
-                # Monte Carlo sample the distribution.
-                value = dist(sample_shape=(num_samples,))
-            assert len(value.shape) == 1 + len(dist.batch_shape) + len(dist.event_shape)
-
-            # Ensure enumeration happens at an available tensor dimension.
-            # This allocates the next available dim for enumeration, to the left all other dims.
-            actual_dim = len(dist.batch_shape)  # the leftmost dim of log_prob, counting from the right
+        dist = msg["fn"]
+        num_samples = msg["infer"].get("num_samples")
+        if num_samples is None:
+            # Enumerate over the support of the distribution.
+            value = dist.enumerate_support(expand=msg["infer"].get("expand", False))
+        else:
+            # Monte Carlo sample the distribution.
+            value = dist(sample_shape=(num_samples,))
+        assert len(value.shape) == 1 + len(dist.batch_shape) + len(dist.event_shape)
+
+        # Ensure enumeration happens at an available tensor dimension.
+        # Outside of pyro.markov, this allocates the next available dim for enumeration,
+        # to the left all other dims. Inside pyro.markov, this recycles the first dim
+        # that is not used by any site in the Markov scope.
+        actual_dim = len(dist.batch_shape)  # the leftmost dim of log_prob, counting from the right
+        if scope is None or self.next_available_dim == float('inf'):
             target_dim = self.next_available_dim  # possibly even farther left than actual_dim
-            self.next_available_dim += 1
-            if target_dim == float('inf'):
-                raise ValueError("max_iarange_nesting must be set to a finite value for parallel enumeration")
-            if actual_dim > target_dim:
-                raise ValueError("Expected enumerated value to have dim at most {} but got shape {}".format(
-                    target_dim + len(dist.event_shape), value.shape))
-            elif target_dim > actual_dim:
-                # Reshape to move actual_dim to target_dim.
-                diff = target_dim - actual_dim
-                value = value.reshape(value.shape[:1] + (1,) * diff + value.shape[1:])
-
-            msg["infer"]["_enumerate_dim"] = -1 - target_dim
-            msg["value"] = value
-            msg["done"] = True
+        else:
+            target_dim = self._first_dim
+            while -1 - target_dim in param_dims:
+                target_dim += 1
+        if target_dim == float('inf'):
+            raise ValueError("max_iarange_nesting must be set to a finite value for parallel enumeration")
+        self.next_available_dim = max(self.next_available_dim, target_dim + 1)
+        if actual_dim > target_dim:
+            if dist.batch_shape[actual_dim - 1 - target_dim] != 1:
+                raise ValueError("Expected enumerated value to have dim at most {} but got shape {}. "
+                                 "Is a site that this site depends on outside of its pyro.markov scope?"
+                                 .format(target_dim + len(dist.event_shape), value.shape))
+            # Move the enumerated dim to target_dim, which is free in the batch shape.
+            value = value.transpose(0, actual_dim - target_dim)
+            while value.dim() > 1 + target_dim + len(dist.event_shape) and value.size(0) == 1:
+                value = value.squeeze(0)
+        elif target_dim > actual_dim:
+            # Reshape to move actual_dim to target_dim.
+            diff = target_dim - actual_dim
+            value = value.reshape(value.shape[:1] + (1,) * diff + value.shape[1:])
+
+        enum_dim = -1 - target_dim
+        id_ = next(_ENUM_IDS)
+        self._current_dims[enum_dim] = id_
+        if scope is None:
+            self._global_dims[enum_dim] = id_
+        msg["infer"]["_enumerate_dim"] = enum_dim
+        msg["infer"]["_dim_to_id"] = {enum_dim: id_}
+        msg["value"] = value
+        msg["done"] = True
+
+    def _postprocess_message(self, msg):
+        if msg["type"] != "sample" or msg["name"] not in self._param_dims:
+            return
+        # Record the dims in scope of this site, needed to interpret its log_prob tensor.
+        # This is done after all handlers have run, since replay may swap msg["infer"].
+        dim_to_id = msg["infer"].setdefault("_dim_to_id", {})
+        for dim, id_ in self._param_dims.pop(msg["name"]).items():
+            dim_to_id.setdefault(dim, id_)
+
+        # Record the dims exposed by this site's value, which are in scope of downstream sites.
+        value = msg["value"]
+        shape = value.shape[:value.dim() - msg["fn"].event_dim]
+        self._value_dims[msg["name"]] = {dim: id_ for dim, id_ in dim_to_id.items()
+                                         if len(shape) >= -dim and shape[dim] > 1}
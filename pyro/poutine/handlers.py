@@ -62,6 +62,7 @@ from .escape_messenger import EscapeMessenger
 from .indep_messenger import IndepMessenger
 from .infer_config_messenger import InferConfigMessenger
 from .lift_messenger import LiftMessenger
+from .markov_messenger import MarkovMessenger
 from .mask_messenger import MaskMessenger
 from .replay_messenger import ReplayMessenger
 from .runtime import NonlocalExit
@@ -380,6 +381,42 @@ def enum(fn=None, first_available_dim=None):
     return msngr(fn) if fn is not None else msngr
 
 
+def markov(fn=None, history=1):
+    """
+    Markov dependency declaration.
+
+    This can be used in a variety of ways:
+
+    - as a context manager
+    - as a decorator for recursive functions
+    - as an iterator for markov chains
+
+    Each step only depends on the ``history`` previous steps, so that
+    :class:`~pyro.infer.traceenum_elbo.TraceEnum_ELBO` can recycle the
+    enumeration dims of out-of-scope steps. For example, an HMM::
+
+        x = 0
+        for t in pyro.markov(range(len(data))):
+            x = pyro.sample("x_{}".format(t), dist.Categorical(probs_x[x]),
+                            infer={"enumerate": "parallel"})
+            pyro.sample("y_{}".format(t), dist.Normal(locs[x], 1.), obs=data[t])
+
+    :param fn: a stochastic function (callable containing Pyro primitive
+        calls), or an iterable over time steps.
+    :param int history: The number of previous steps visible from the
+        current step. Defaults to 1.
+    :returns: stochastic function decorated with a
+        :class:`~pyro.poutine.markov_messenger.MarkovMessenger`, or an
+        iterator if ``fn`` is iterable.
+    """
+    msngr = MarkovMessenger(history=history)
+    if fn is None:
+        return msngr
+    if callable(fn):
+        return msngr(fn)
+    return msngr.generator(iterable=fn)
+
+
 #########################################
 # Begin composite operations
 #########################################
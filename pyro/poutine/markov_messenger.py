@@ -0,0 +1,75 @@
+from __future__ import absolute_import, division, print_function
+
+from .messenger import Messenger
+from .runtime import _PYRO_STACK
+from .util import site_is_subsample
+
+
+class MarkovMessenger(Messenger):
+    """
+    Markov dependency declaration.
+
+    This declares that every sample site only depends on the sample sites of
+    the current step and of the ``history`` previous steps. Each entry of the
+    messenger starts a new step, so the messenger can be used as an iterator
+    over time steps, or as a decorator of a recursive function (which enters
+    the same messenger once per recursive call). Sample sites are annotated
+    with the set of names of the sites in scope, which allows
+    :class:`~pyro.poutine.enumerate_messenger.EnumerateMessenger` to recycle
+    enumeration dims of sites that are out of scope.
+
+    :param int history: The number of previous steps visible from the current
+        step. Defaults to 1.
+    """
+    def __init__(self, history=1):
+        if not (isinstance(history, int) and history >= 0):
+            raise ValueError("Expected history to be a nonnegative int, but got {}".format(history))
+        super(MarkovMessenger, self).__init__()
+        self.history = history
+        self._iterable = None
+        self._pos = -1
+        self._stack = []  # one set of site names per nested step
+
+    def generator(self, iterable):
+        self._iterable = iterable
+        return self
+
+    def __iter__(self):
+        depth = 0
+        completed = False
+        try:
+            for value in self._iterable:
+                self.__enter__()
+                depth += 1
+                yield value
+            completed = True
+        finally:
+            # Steps stay nested until the end of the iteration, so that each
+            # step sees the steps before it.
+            exc_type = None if completed else GeneratorExit
+            for _ in range(depth):
+                self.__exit__(exc_type, None, None)
+
+    def __enter__(self):
+        self._pos += 1
+        self._stack.append(set())
+        if self._pos == 0:
+            return super(MarkovMessenger, self).__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.pop()
+        self._pos -= 1
+        if self._pos == -1 and (exc_type is None or self in _PYRO_STACK):
+            return super(MarkovMessenger, self).__exit__(exc_type, exc_value, traceback)
+
+    def _pyro_sample(self, msg):
+        if msg["done"] or site_is_subsample(msg):
+            return
+        scope = msg["infer"].setdefault("_markov_scope", set())
+        for step in self._stack[max(0, self._pos - self.history):]:
+            scope.update(step)
+
+    def _postprocess_message(self, msg):
+        if msg["type"] == "sample" and not site_is_subsample(msg):
+            self._stack[self._pos].add(msg["name"])
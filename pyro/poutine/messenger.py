@@ -1,7 +1,18 @@
 from __future__ import absolute_import, division, print_function
 
+import six
+
 from .runtime import _PYRO_STACK
 
+# Flags for whether a messenger class handles a message type, keyed by
+# (messenger class, message type). See :meth:`Messenger._get_dispatch`.
+_DISPATCH_CACHE = {}
+
+
+def _overrides(cls, name):
+    return six.get_unbound_function(getattr(cls, name)) is not \
+        six.get_unbound_function(getattr(Messenger, name))
+
 
 class Messenger(object):
     """
@@ -106,6 +117,26 @@ class Messenger(object):
     def _reset(self):
         pass
 
+    @classmethod
+    def _get_dispatch(cls, msg_type):
+        """
+        :param str msg_type: type of the message, e.g. "sample"
+        :returns: a pair of flags for whether ``_process_message`` and
+            ``_postprocess_message`` of this class may act on messages of
+            type ``msg_type``. These are used by
+            :func:`~pyro.poutine.runtime.apply_stack` to skip no-op handlers,
+            and are cached per class and message type.
+        """
+        key = (cls, msg_type)
+        try:
+            return _DISPATCH_CACHE[key]
+        except KeyError:
+            pass
+        process = _overrides(cls, "_process_message") or _overrides(cls, "_pyro_{}".format(msg_type))
+        postprocess = _overrides(cls, "_postprocess_message")
+        _DISPATCH_CACHE[key] = process, postprocess
+        return process, postprocess
+
     def _process_message(self, msg):
         """
         :param msg: current message at a trace site
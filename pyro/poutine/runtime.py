@@ -1,4 +1,5 @@
 from pyro.params.param_store import _MODULE_NAMESPACE_DIVIDER, ParamStoreDict  # noqa: F401
+from pyro.poutine.util import is_validation_enabled
 
 # the global pyro stack
 _PYRO_STACK = []
@@ -99,7 +100,8 @@ def default_process_message(msg):
     :param msg: a message to be processed
     :returns: None
     """
-    validate_message(msg)
+    if is_validation_enabled():
+        validate_message(msg)
     if msg["type"] == "sample":
         fn, args, kwargs = \
             msg["fn"], msg["args"], msg["kwargs"]
@@ -157,6 +159,10 @@ def apply_stack(initial_msg):
            execute ``_postprocess_message`` to update the message and internal messenger state with the site results
         4. If the message field "continuation" is not ``None``, call it with the message
 
+    Messengers that do not handle the type of the message (see
+    :meth:`~pyro.poutine.messenger.Messenger._get_dispatch`) are skipped in
+    steps 1 and 3. The message is only validated if validation is enabled.
+
     :param dict initial_msg: the starting version of the trace site
     :returns: ``None``
     """
@@ -165,22 +171,29 @@ def apply_stack(initial_msg):
 
     # msg is used to pass information up and down the stack
     msg = initial_msg
+    msg_type = msg["type"]
+    validate = is_validation_enabled()
 
-    counter = 0
+    # frames whose _postprocess_message needs to be called, from the top down
+    postprocess_frames = []
     # go until time to stop?
     for frame in stack:
-        validate_message(msg)
+        if validate:
+            validate_message(msg)
 
-        counter = counter + 1
+        process, postprocess = frame._get_dispatch(msg_type)
+        if postprocess:
+            postprocess_frames.append(frame)
 
-        frame._process_message(msg)
+        if process:
+            frame._process_message(msg)
 
         if msg["stop"]:
             break
 
     default_process_message(msg)
 
-    for frame in reversed(stack[0:counter]):
+    for frame in reversed(postprocess_frames):
         frame._postprocess_message(msg)
 
     cont = msg["continuation"]
@@ -190,6 +203,22 @@ def apply_stack(initial_msg):
     return None
 
 
+def stack_handles(msg_type):
+    """
+    Checks whether any messenger in the current stack may act on messages
+    of type ``msg_type``. If not, applying the stack is equivalent to
+    :func:`default_process_message`.
+
+    :param str msg_type: type of the message, e.g. "param"
+    :returns: bool
+    """
+    for frame in _PYRO_STACK:
+        process, postprocess = frame._get_dispatch(msg_type)
+        if process or postprocess:
+            return True
+    return False
+
+
 def am_i_wrapped():
     """
     Checks whether the current computation is wrapped in a poutine.
@@ -1,7 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 from .messenger import Messenger
-from .trace_struct import Trace
+from .trace_struct import FlatTrace, Trace
 from .util import site_is_subsample
 
 
@@ -58,10 +58,10 @@ class TraceMessenger(Messenger):
         self.graph_type = graph_type
         self.param_only = param_only
         self.strict_names = strict_names
-        self.trace = Trace(graph_type=self.graph_type)
+        self.trace = self._new_trace()
 
     def __enter__(self):
-        self.trace = Trace(graph_type=self.graph_type)
+        self.trace = self._new_trace()
         return super(TraceMessenger, self).__enter__()
 
     def __exit__(self, *args, **kwargs):
@@ -81,6 +81,11 @@ class TraceMessenger(Messenger):
             identify_dense_edges(self.trace)
         return super(TraceMessenger, self).__exit__(*args, **kwargs)
 
+    def _new_trace(self):
+        if self.graph_type == "flat":
+            return FlatTrace()
+        return Trace(graph_type=self.graph_type)
+
     def __call__(self, fn):
         """
         TODO docs
@@ -98,7 +103,7 @@ class TraceMessenger(Messenger):
         return self.trace.copy()
 
     def _reset(self):
-        tr = Trace(graph_type=self.graph_type)
+        tr = self._new_trace()
         if "_INPUT" in self.trace.nodes:
             tr.add_node("_INPUT",
                         name="_INPUT", type="input",
@@ -9,107 +9,13 @@ from pyro.poutine.util import is_validation_enabled
 from pyro.util import warn_if_nan, warn_if_inf
 
 
-class Trace(networkx.DiGraph):
+class _TraceSites(object):
     """
-    Execution trace data structure built on top of :class:`networkx.DiGraph`.
-
-    An execution trace of a Pyro program is a record of every call
-    to ``pyro.sample()`` and ``pyro.param()`` in a single execution of that program.
-    Traces are directed graphs whose nodes represent primitive calls or input/output,
-    and whose edges represent conditional dependence relationships
-    between those primitive calls. They are created and populated by ``poutine.trace``.
-
-    Each node (or site) in a trace contains the name, input and output value of the site,
-    as well as additional metadata added by inference algorithms or user annotation.
-    In the case of ``pyro.sample``, the trace also includes the stochastic function
-    at the site, and any observed data added by users.
-
-    Consider the following Pyro program:
-
-        >>> def model(x):
-        ...     s = pyro.param("s", torch.tensor(0.5))
-        ...     z = pyro.sample("z", dist.Normal(x, s))
-        ...     return z ** 2
-
-    We can record its execution using ``pyro.poutine.trace``
-    and use the resulting data structure to compute the log-joint probability
-    of all of the sample sites in the execution or extract all parameters.
-
-        >>> trace = pyro.poutine.trace(model).get_trace(0.0)
-        >>> logp = trace.log_prob_sum()
-        >>> params = [trace.nodes[name]["value"].unconstrained() for name in trace.param_nodes]
-
-    We can also inspect or manipulate individual nodes in the trace.
-    ``trace.nodes`` contains a ``collections.OrderedDict``
-    of site names and metadata corresponding to ``x``, ``s``, ``z``, and the return value:
-
-        >>> list(name for name in trace.nodes.keys())  # doctest: +SKIP
-        ["_INPUT", "s", "z", "_RETURN"]
-
-    As in :class:`networkx.DiGraph`, values of ``trace.nodes`` are dictionaries of node metadata:
-
-        >>> trace.nodes["z"]  # doctest: +SKIP
-        {'type': 'sample', 'name': 'z', 'is_observed': False,
-         'fn': Normal(), 'value': tensor(0.6480), 'args': (), 'kwargs': {},
-         'infer': {}, 'scale': 1.0, 'cond_indep_stack': (),
-         'done': True, 'stop': False, 'continuation': None}
-
-    ``'infer'`` is a dictionary of user- or algorithm-specified metadata.
-    ``'args'`` and ``'kwargs'`` are the arguments passed via ``pyro.sample``
-    to ``fn.__call__`` or ``fn.log_prob``.
-    ``'scale'`` is used to scale the log-probability of the site when computing the log-joint.
-    ``'cond_indep_stack'`` contains data structures corresponding to ``pyro.iarange`` contexts
-    appearing in the execution.
-    ``'done'``, ``'stop'``, and ``'continuation'`` are only used by Pyro's internals.
+    Methods computing over and selecting the sites of a trace, shared by
+    :class:`Trace` and :class:`FlatTrace`. Subclasses provide ``nodes``, an
+    ordered mapping from site names to site dicts.
     """
-
-    node_dict_factory = collections.OrderedDict
-
-    def __init__(self, *args, **kwargs):
-        """
-        :param string graph_type: string specifying the kind of trace graph to construct
-
-        Constructor. Currently identical to :meth:`networkx.DiGraph.__init__`,
-        except for storing the graph_type attribute
-        """
-        graph_type = kwargs.pop("graph_type", "flat")
-        assert graph_type in ("flat", "dense"), \
-            "{} not a valid graph type".format(graph_type)
-        self.graph_type = graph_type
-        super(Trace, self).__init__(*args, **kwargs)
-
-    def add_node(self, site_name, *args, **kwargs):
-        """
-        :param string site_name: the name of the site to be added
-
-        Adds a site to the trace.
-
-        Identical to :meth:`networkx.DiGraph.add_node`
-        but raises an error when attempting to add a duplicate node
-        instead of silently overwriting.
-        """
-        if site_name in self:
-            site = self.nodes[site_name]
-            if site['type'] != kwargs['type']:
-                # Cannot sample or observe after a param statement.
-                raise RuntimeError("{} is already in the trace as a {}".format(site_name, site['type']))
-            elif kwargs['type'] != "param":
-                # Cannot sample after a previous sample statement.
-                raise RuntimeError("Multiple {} sites named '{}'".format(kwargs['type'], site_name))
-
-        # XXX should copy in case site gets mutated, or dont bother?
-        super(Trace, self).add_node(site_name, *args, **kwargs)
-
-    def copy(self):
-        """
-        Makes a shallow copy of self with nodes and edges preserved.
-        Identical to :meth:`networkx.DiGraph.copy`, but preserves the type
-        and the self.graph_type attribute
-        """
-        trace = super(Trace, self).copy()
-        trace.__class__ = Trace
-        trace.graph_type = self.graph_type
-        return trace
+    __slots__ = ()
 
     def log_prob_sum(self, site_filter=lambda name, site: True):
         """
@@ -230,3 +136,200 @@ class Trace(networkx.DiGraph):
         for name, node in self.nodes.items():
             if node["type"] == "sample" and not node["is_observed"]:
                 yield name, node
+
+
+class Trace(networkx.DiGraph, _TraceSites):
+    """
+    Execution trace data structure built on top of :class:`networkx.DiGraph`.
+
+    An execution trace of a Pyro program is a record of every call
+    to ``pyro.sample()`` and ``pyro.param()`` in a single execution of that program.
+    Traces are directed graphs whose nodes represent primitive calls or input/output,
+    and whose edges represent conditional dependence relationships
+    between those primitive calls. They are created and populated by ``poutine.trace``.
+
+    Each node (or site) in a trace contains the name, input and output value of the site,
+    as well as additional metadata added by inference algorithms or user annotation.
+    In the case of ``pyro.sample``, the trace also includes the stochastic function
+    at the site, and any observed data added by users.
+
+    Consider the following Pyro program:
+
+        >>> def model(x):
+        ...     s = pyro.param("s", torch.tensor(0.5))
+        ...     z = pyro.sample("z", dist.Normal(x, s))
+        ...     return z ** 2
+
+    We can record its execution using ``pyro.poutine.trace``
+    and use the resulting data structure to compute the log-joint probability
+    of all of the sample sites in the execution or extract all parameters.
+
+        >>> trace = pyro.poutine.trace(model).get_trace(0.0)
+        >>> logp = trace.log_prob_sum()
+        >>> params = [trace.nodes[name]["value"].unconstrained() for name in trace.param_nodes]
+
+    We can also inspect or manipulate individual nodes in the trace.
+    ``trace.nodes`` contains a ``collections.OrderedDict``
+    of site names and metadata corresponding to ``x``, ``s``, ``z``, and the return value:
+
+        >>> list(name for name in trace.nodes.keys())  # doctest: +SKIP
+        ["_INPUT", "s", "z", "_RETURN"]
+
+    As in :class:`networkx.DiGraph`, values of ``trace.nodes`` are dictionaries of node metadata:
+
+        >>> trace.nodes["z"]  # doctest: +SKIP
+        {'type': 'sample', 'name': 'z', 'is_observed': False,
+         'fn': Normal(), 'value': tensor(0.6480), 'args': (), 'kwargs': {},
+         'infer': {}, 'scale': 1.0, 'cond_indep_stack': (),
+         'done': True, 'stop': False, 'continuation': None}
+
+    ``'infer'`` is a dictionary of user- or algorithm-specified metadata.
+    ``'args'`` and ``'kwargs'`` are the arguments passed via ``pyro.sample``
+    to ``fn.__call__`` or ``fn.log_prob``.
+    ``'scale'`` is used to scale the log-probability of the site when computing the log-joint.
+    ``'cond_indep_stack'`` contains data structures corresponding to ``pyro.iarange`` contexts
+    appearing in the execution.
+    ``'done'``, ``'stop'``, and ``'continuation'`` are only used by Pyro's internals.
+    """
+
+    node_dict_factory = collections.OrderedDict
+
+    def __init__(self, *args, **kwargs):
+        """
+        :param string graph_type: string specifying the kind of trace graph to construct
+
+        Constructor. Currently identical to :meth:`networkx.DiGraph.__init__`,
+        except for storing the graph_type attribute
+        """
+        graph_type = kwargs.pop("graph_type", "flat")
+        assert graph_type in ("flat", "dense"), \
+            "{} not a valid graph type".format(graph_type)
+        self.graph_type = graph_type
+        super(Trace, self).__init__(*args, **kwargs)
+
+    def add_node(self, site_name, *args, **kwargs):
+        """
+        :param string site_name: the name of the site to be added
+
+        Adds a site to the trace.
+
+        Identical to :meth:`networkx.DiGraph.add_node`
+        but raises an error when attempting to add a duplicate node
+        instead of silently overwriting.
+        """
+        if site_name in self:
+            site = self.nodes[site_name]
+            if site['type'] != kwargs['type']:
+                # Cannot sample or observe after a param statement.
+                raise RuntimeError("{} is already in the trace as a {}".format(site_name, site['type']))
+            elif kwargs['type'] != "param":
+                # Cannot sample after a previous sample statement.
+                raise RuntimeError("Multiple {} sites named '{}'".format(kwargs['type'], site_name))
+
+        # XXX should copy in case site gets mutated, or dont bother?
+        super(Trace, self).add_node(site_name, *args, **kwargs)
+
+    def copy(self):
+        """
+        Makes a shallow copy of self with nodes and edges preserved.
+        Identical to :meth:`networkx.DiGraph.copy`, but preserves the type
+        and the self.graph_type attribute
+        """
+        trace = super(Trace, self).copy()
+        trace.__class__ = Trace
+        trace.graph_type = self.graph_type
+        return trace
+
+
+class _SiteDict(collections.OrderedDict):
+    """
+    Ordered mapping from site names to sites, which like the ``nodes`` view
+    of :class:`networkx.DiGraph` can also be called to list its contents.
+    """
+    def __call__(self, data=False, default=None):
+        if data is False:
+            return list(self)
+        if data is True:
+            return list(self.items())
+        return [(name, site.get(data, default)) for name, site in self.items()]
+
+
+class FlatTrace(_TraceSites):
+    """
+    Execution trace of a ``"flat"`` graph, i.e. one whose edges are not
+    recorded. This is the trace recorded by :func:`~pyro.poutine.trace` with
+    the default ``graph_type="flat"``.
+
+    Unlike :class:`Trace` it is not a :class:`networkx.DiGraph`, but a plain
+    ordered dict of sites: ``nodes`` maps site names to the site dicts passed
+    to :meth:`add_node`, which are stored without being copied. It supports
+    the site API of :class:`Trace` (``nodes``, :meth:`log_prob_sum`, the
+    ``compute_*`` methods and the ``*_nodes`` properties), and like the
+    ``nodes`` view of a :class:`networkx.DiGraph`, ``nodes`` can be called to
+    list its contents.
+
+    Use :meth:`to_graph` to get a :class:`Trace` holding copies of the
+    sites, e.g. to add dependency edges or to use :mod:`networkx` algorithms.
+    """
+    __slots__ = ("graph_type", "nodes")
+
+    def __init__(self, graph_type="flat"):
+        assert graph_type == "flat", "FlatTrace only supports graph_type='flat'"
+        self.graph_type = graph_type
+        self.nodes = _SiteDict()
+
+    def __contains__(self, site_name):
+        return site_name in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_node(self, site_name, **kwargs):
+        """
+        :param string site_name: the name of the site to be added
+
+        Adds a site to the trace, raising an error when attempting to add a
+        duplicate node, as in :meth:`Trace.add_node`.
+        """
+        site = self.nodes.get(site_name)
+        if site is None:
+            self.nodes[site_name] = kwargs
+        elif site['type'] != kwargs['type']:
+            # Cannot sample or observe after a param statement.
+            raise RuntimeError("{} is already in the trace as a {}".format(site_name, site['type']))
+        elif kwargs['type'] != "param":
+            # Cannot sample after a previous sample statement.
+            raise RuntimeError("Multiple {} sites named '{}'".format(kwargs['type'], site_name))
+        else:
+            site.update(kwargs)
+
+    def remove_node(self, site_name):
+        """
+        :param string site_name: the name of the site to be removed
+
+        Removes a site from the trace.
+        """
+        del self.nodes[site_name]
+
+    def copy(self):
+        """
+        Makes a shallow copy of self, copying the site dicts but not their
+        values, as :meth:`Trace.copy` does.
+        """
+        trace = FlatTrace(graph_type=self.graph_type)
+        trace.nodes.update((name, site.copy()) for name, site in self.nodes.items())
+        return trace
+
+    def to_graph(self):
+        """
+        :returns: a :class:`Trace` holding shallow copies of the sites of
+            self, and no edges.
+        :rtype: Trace
+        """
+        trace = Trace(graph_type=self.graph_type)
+        for name, site in self.nodes.items():
+            trace.add_node(name, **site)
+        return trace
@@ -2,6 +2,7 @@ from __future__ import absolute_import, division, print_function
 
 import copy
 import numbers
+import threading
 import warnings
 from collections import OrderedDict
 from contextlib import contextmanager
@@ -14,7 +15,8 @@ import pyro.infer as infer
 import pyro.poutine as poutine
 from pyro.distributions.distribution import Distribution
 from pyro.params import param_with_module_name
-from pyro.poutine.runtime import _DIM_ALLOCATOR, _MODULE_NAMESPACE_DIVIDER, _PYRO_PARAM_STORE, am_i_wrapped, apply_stack
+from pyro.poutine.runtime import (_DIM_ALLOCATOR, _MODULE_NAMESPACE_DIVIDER, _PYRO_PARAM_STORE, am_i_wrapped,
+                                  apply_stack, stack_handles)
 from pyro.util import deep_getattr, set_rng_seed  # noqa: F401
 
 
@@ -92,7 +94,7 @@ class _Subsample(Distribution):
     Internal use only. This should only be used by `iarange`.
     """
 
-    def __init__(self, size, subsample_size, use_cuda=None, device=None):
+    def __init__(self, size, subsample_size, use_cuda=None, device=None, subsampler=None):
         """
         :param int size: the size of the range to subsample from
         :param int subsample_size: the size of the returned subsample
@@ -100,9 +102,12 @@ class _Subsample(Distribution):
             Whether to use cuda tensors.
         :param str device: device to place the `sample` and `log_prob`
             results on.
+        :param EpochSubsample subsampler: optional stateful strategy that
+            draws the subsamples, in place of independent random draws.
         """
         self.size = size
         self.subsample_size = subsample_size
+        self.subsampler = subsampler
         self.use_cuda = use_cuda
         if self.use_cuda is not None:
             if self.use_cuda ^ (device != "cpu"):
@@ -117,6 +122,9 @@ class _Subsample(Distribution):
         """
         if sample_shape:
             raise NotImplementedError
+        if self.subsampler is not None:
+            result = self.subsampler.sample().to(self.device)
+            return result.cuda() if self.use_cuda else result
         subsample_size = self.subsample_size
         if subsample_size is None or subsample_size > self.size:
             subsample_size = self.size
@@ -134,17 +142,158 @@ class _Subsample(Distribution):
         return result.cuda() if self.use_cuda else result
 
 
+class EpochSubsample(object):
+    """
+    Stateful subsampling strategy for :class:`iarange` and :class:`irange`
+    that walks through a random permutation of ``range(size)`` epoch by
+    epoch, so that every index is seen once per epoch. Each subsample costs
+    ``O(subsample_size)``, plus an ``O(size)`` :func:`torch.randperm` once
+    per epoch. Subsamples always have ``subsample_size`` indices: a subsample
+    straddling two epochs is completed from the start of the next epoch.
+
+    Pass an instance as the ``subsample`` argument of :class:`iarange` or
+    :class:`irange`. Create it once, outside the model and guide, since it
+    keeps track of its position in the current epoch::
+
+        batches = EpochSubsample(len(data), 100, getitem=data.__getitem__, prefetch=True)
+
+        def model():
+            with iarange("data", len(data), subsample=batches) as ind:
+                batch = batches.get_batch(ind)
+                ...
+
+    If ``getitem`` is given, :meth:`get_batch` returns ``getitem(ind)`` for the
+    current subsample. With ``prefetch=True`` the next subsample is drawn in
+    advance and ``getitem`` is applied to it on a background thread, which
+    hides the latency of e.g. reading minibatches from disk.
+
+    :param int size: The size of the collection being subsampled.
+    :param int subsample_size: Size of minibatches used in subsampling.
+    :param callable getitem: Optional function mapping a
+        :class:`torch.LongTensor` of indices to the corresponding data.
+    :param bool prefetch: Whether to apply ``getitem`` to the next subsample
+        on a background thread. Requires ``getitem``.
+    """
+    def __init__(self, size, subsample_size, getitem=None, prefetch=False):
+        if prefetch and getitem is None:
+            raise ValueError("EpochSubsample prefetching requires a getitem function.")
+        self.size = size
+        self.subsample_size = min(subsample_size, size)
+        self.getitem = getitem
+        self.prefetch = prefetch
+        self.epoch = 0
+        self._perm = None
+        self._pos = 0
+        self._current = None
+        self._next = None
+
+    def _next_indices(self):
+        chunks = []
+        needed = self.subsample_size
+        while needed:
+            if self._perm is None or self._pos == self.size:
+                if self._perm is not None:
+                    self.epoch += 1
+                self._perm = torch.randperm(self.size)
+                self._pos = 0
+            chunk = self._perm[self._pos:self._pos + needed]
+            self._pos += len(chunk)
+            needed -= len(chunk)
+            chunks.append(chunk)
+        return chunks[0] if len(chunks) == 1 else torch.cat(chunks)
+
+    def sample(self):
+        """
+        Advances to the next subsample.
+
+        :returns: the indices of the next subsample
+        :rtype: torch.LongTensor
+        """
+        if self._next is None:
+            self._current = _Batch(self._next_indices())
+        else:
+            self._current = self._next
+        if self.prefetch:
+            self._next = _Batch(self._next_indices(), self.getitem)
+        return self._current.indices
+
+    def get_batch(self, indices=None):
+        """
+        Returns ``getitem(indices)``, reusing the (possibly prefetched) data of
+        the current subsample if ``indices`` are its indices.
+
+        :param torch.LongTensor indices: Indices yielded by an :class:`iarange`
+            using this subsampler. Defaults to those of the current subsample.
+        """
+        if self.getitem is None:
+            raise ValueError("EpochSubsample.get_batch requires a getitem function.")
+        current = self._current
+        if current is None:
+            raise ValueError("EpochSubsample.get_batch called before the first subsample was drawn.")
+        if indices is None or indices is current.indices or (
+                indices.shape == current.indices.shape and
+                (indices.cpu() == current.indices).all()):
+            return current.get(self.getitem)
+        return self.getitem(indices)
+
+
+class _Batch(object):
+    """
+    A subsample drawn by :class:`EpochSubsample` together with its data,
+    which is either loaded lazily or prefetched on a background thread.
+    """
+    def __init__(self, indices, getitem=None):
+        self.indices = indices
+        self._result = None
+        self._thread = None
+        if getitem is not None:
+            self._thread = threading.Thread(target=self._load, args=(getitem,))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _load(self, getitem):
+        try:
+            self._result = (getitem(self.indices), None)
+        except Exception as e:
+            self._result = (None, e)
+
+    def get(self, getitem):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        elif self._result is None:
+            self._load(getitem)
+        data, error = self._result
+        if error is not None:
+            raise error
+        return data
+
+
 def _subsample(name, size=None, subsample_size=None, subsample=None, use_cuda=None, device=None):
     """
     Helper function for iarange and irange. See their docstrings for details.
     """
+    subsampler = None
+    if isinstance(subsample, EpochSubsample):
+        subsampler, subsample = subsample, None
+        if size is None:
+            size = subsampler.size
+        if subsample_size is None:
+            subsample_size = subsampler.subsample_size
+        if size != subsampler.size or min(subsample_size, size) != subsampler.subsample_size:
+            raise ValueError("size and subsample_size do not match those of the EpochSubsample, "
+                             "{} vs {}.".format((size, subsample_size),
+                                                (subsampler.size, subsampler.subsample_size)))
+        subsample_size = subsampler.subsample_size
+
     if size is None:
         assert subsample_size is None
         assert subsample is None
         size = -1  # This is PyTorch convention for "arbitrary size"
         subsample_size = -1
     elif subsample is None:
-        subsample = sample(name, _Subsample(size, subsample_size, use_cuda=use_cuda, device=device))
+        subsample = sample(name, _Subsample(size, subsample_size, use_cuda=use_cuda, device=device,
+                                            subsampler=subsampler))
 
     if subsample_size is None:
         subsample_size = len(subsample)
@@ -196,8 +345,9 @@ class iarange(object):
         Defaults to `size`.
     :param subsample: Optional custom subsample for user-defined subsampling
         schemes. If specified, then `subsample_size` will be set to
-        `len(subsample)`.
-    :type subsample: Anything supporting `len()`.
+        `len(subsample)`. Alternatively, an :class:`EpochSubsample` that
+        draws the subsamples epoch by epoch.
+    :type subsample: Anything supporting `len()`, or :class:`EpochSubsample`.
     :param int dim: An optional dimension to use for this independence index.
         If specified, ``dim`` should be negative, i.e. should index from the
         right. If not specified, ``dim`` is set to the rightmost dim that is
@@ -283,8 +433,9 @@ class irange(object):
         Defaults to ``size``.
     :param subsample: Optional custom subsample for user-defined subsampling
         schemes. If specified, then ``subsample_size`` will be set to
-        ``len(subsample)``.
-    :type subsample: Anything supporting ``len()``.
+        ``len(subsample)``. Alternatively, an :class:`EpochSubsample` that
+        draws the subsamples epoch by epoch.
+    :type subsample: Anything supporting ``len()``, or :class:`EpochSubsample`.
     :param bool use_cuda: DEPRECATED, use the `device` arg instead.
         Optional bool specifying whether to use cuda tensors for `subsample`
         and `log_prob`. Defaults to ``torch.Tensor.is_cuda``.
@@ -338,7 +489,7 @@ def param(name, *args, **kwargs):
     :param name: name of parameter
     :returns: parameter
     """
-    if not am_i_wrapped():
+    if not am_i_wrapped() or not stack_handles("param"):
         return _PYRO_PARAM_STORE.get_param(name, *args, **kwargs)
     else:
         msg = {
@@ -12,6 +12,7 @@ trap _cleanup EXIT
 # Reference is with respect to the `dev` branch, by default.
 REF_HEAD=${1:-dev}
 BENCHMARK_FILE=tests/perf/test_benchmark.py
+MCMC_BENCHMARK_FILE=tests/perf/test_mcmc_benchmark.py
 IS_BENCHMARK_FILE_IN_DEV=1
 REF_TMP_DIR=.tmp_test_dir
 
@@ -50,6 +51,13 @@ if [ -e ${BENCHMARK_FILE} ]; then
         --benchmark-timer ${TIMER}
 fi
 
+# Sampling efficiency (ESS per second / per gradient, divergences, tree depths)
+# of the MCMC kernels, which wall time alone does not capture.
+if [ -e ${MCMC_BENCHMARK_FILE} ]; then
+    python ${MCMC_BENCHMARK_FILE} -o ../.benchmarks/mcmc_${REF_HEAD}.json || \
+        echo "ERR: MCMC benchmarks failed on branch upstream/${REF_HEAD}."
+fi
+
 # cd back into the current repo to run comparison benchmarks
 popd
 
@@ -63,3 +71,10 @@ else
     pytest -vx tests/perf/test_benchmark.py --benchmark-name=short --benchmark-columns=min,median,max \
         --benchmark-sort=name --benchmark-timer ${TIMER}
 fi
+
+MCMC_REF_RESULTS=.benchmarks/mcmc_${REF_HEAD}.json
+if [ -e ${MCMC_REF_RESULTS} ]; then
+    python ${MCMC_BENCHMARK_FILE} --compare ${MCMC_REF_RESULTS}
+else
+    python ${MCMC_BENCHMARK_FILE}
+fi
@@ -0,0 +1,44 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+import torch
+
+from pyro.infer.mcmc.adaptation import WarmupAdapter, adapt_window
+from tests.common import assert_equal
+
+
+@pytest.mark.parametrize("adapt_step_size, adapt_mass, warmup_steps, expected", [
+    (False, False, 100, [(0, 14), (15, 89), (90, 99)]),
+    (False, True, 50, [(0, 6), (7, 44), (45, 49)]),
+    (True, False, 150, [(0, 74), (75, 99), (100, 149)]),
+    (True, True, 200, [(0, 74), (75, 99), (100, 149), (150, 199)]),
+    (True, True, 280, [(0, 74), (75, 99), (100, 229), (230, 279)]),
+    (True, True, 18, [(0, 17)]),
+])
+def test_adaptation_schedule(adapt_step_size, adapt_mass, warmup_steps, expected):
+    adapter = WarmupAdapter(0.1,
+                            adapt_step_size=adapt_step_size,
+                            adapt_mass_matrix=adapt_mass)
+    adapter.configure(warmup_steps, mass_matrix_size=3)
+    expected_schedule = [adapt_window(i, j) for i, j in expected]
+    assert_equal(adapter.adaptation_schedule, expected_schedule, prec=0)
+
+
+@pytest.mark.parametrize("is_diag_mass", [True, False])
+def test_mass_matrix_adaptation(is_diag_mass):
+    warmup_steps = 200
+    scale = torch.tensor([0.1, 1., 10.])
+    adapter = WarmupAdapter(adapt_mass_matrix=True, is_diag_mass=is_diag_mass)
+    adapter.configure(warmup_steps, mass_matrix_size=3)
+    assert_equal(adapter.r_dist.sample().shape, torch.Size([3]))
+    for t in range(warmup_steps):
+        z = {"x": torch.randn(2) * scale[:2], "y": torch.randn(1) * scale[2:]}
+        adapter.step(t, z, accept_prob=0.8)
+    inverse_mass_matrix = adapter.inverse_mass_matrix
+    if is_diag_mass:
+        variance = inverse_mass_matrix
+    else:
+        assert_equal(inverse_mass_matrix.shape, torch.Size([3, 3]))
+        variance = inverse_mass_matrix.diag()
+    # the last slow window (100 to 149) collected 50 samples
+    assert_equal(variance.sqrt() / scale, torch.ones(3), prec=0.5)
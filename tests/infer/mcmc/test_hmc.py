@@ -12,6 +12,7 @@ import pyro.distributions as dist
 from pyro.infer import EmpiricalMarginal
 from pyro.infer.mcmc.hmc import HMC
 from pyro.infer.mcmc.mcmc import MCMC
+from pyro.ops.integrator import _grad
 import pyro.poutine as poutine
 from tests.common import assert_equal
 
@@ -172,6 +173,103 @@ def test_logistic_regression():
     assert_equal(rmse(true_coefs, beta_posterior.mean).item(), 0.0, prec=0.1)
 
 
+def test_vectorized_chains():
+    num_chains = 4
+    data = dist.Normal(2., 1.).sample(sample_shape=(100,))
+
+    def model(data):
+        loc = pyro.sample("loc", dist.Normal(0., 1.))
+        with pyro.iarange("data", len(data), dim=-1):
+            pyro.sample("obs", dist.Normal(loc, 1.), obs=data)
+
+    hmc_kernel = HMC(model, trajectory_length=1, adapt_step_size=True,
+                     max_iarange_nesting=1, num_vectorized_chains=num_chains)
+    mcmc_run = MCMC(hmc_kernel, num_samples=300, warmup_steps=100).run(data)
+    posterior = EmpiricalMarginal(mcmc_run, sites="loc")
+    # each chain's samples carry a leading chain dim
+    assert posterior.mean.shape == (num_chains, 1)
+    expected_mean = data.sum() / (len(data) + 1)
+    assert_equal(posterior.mean, expected_mean.expand(num_chains, 1), prec=0.1)
+
+
+def test_vectorized_chains_requires_max_iarange_nesting():
+    def model():
+        pyro.sample("x", dist.Normal(0., 1.))
+
+    with pytest.raises(ValueError):
+        HMC(model, num_vectorized_chains=2)
+
+
+@pytest.mark.parametrize("packed_latents", [False, True])
+def test_logistic_regression_jit(packed_latents):
+    dim = 3
+    data = torch.randn(2000, dim)
+    true_coefs = torch.arange(1., dim + 1.)
+    labels = dist.Bernoulli(logits=(true_coefs * data).sum(-1)).sample()
+
+    def model(data):
+        coefs_mean = torch.zeros(dim)
+        coefs = pyro.sample('beta', dist.Normal(coefs_mean, torch.ones(dim)))
+        y = pyro.sample('y', dist.Bernoulli(logits=(coefs * data).sum(-1)), obs=labels)
+        return y
+
+    hmc_kernel = HMC(model, step_size=0.0855, num_steps=4, packed_latents=packed_latents, jit_compile=True)
+    mcmc_run = MCMC(hmc_kernel, num_samples=500, warmup_steps=100).run(data)
+    assert hmc_kernel._compiled_potential_fn is None  # reset by cleanup
+    beta_posterior = EmpiricalMarginal(mcmc_run, sites='beta')
+    assert_equal(rmse(true_coefs, beta_posterior.mean).item(), 0.0, prec=0.1)
+
+
+def test_jit_fallback_warning():
+    def model():
+        x = pyro.sample('x', dist.Normal(0., 1.))
+        # values read back into Python are frozen into the traced graph
+        pyro.sample('obs', dist.Normal(x.item(), 1.), obs=torch.tensor(0.))
+
+    hmc_kernel = HMC(model, step_size=0.1, num_steps=2, jit_compile=True)
+    with pytest.warns(UserWarning, match="Failed to compile"):
+        hmc_kernel.setup()
+    assert hmc_kernel._compiled_potential_fn is None
+    hmc_kernel.cleanup()
+
+
+def test_log_prob_cache():
+    data = torch.tensor([0.5, -1.])
+    observed = []
+
+    class CountingNormal(dist.Normal):
+        def log_prob(self, value):
+            observed.append(value.item())
+            return super(CountingNormal, self).log_prob(value)
+
+    def model(data):
+        for i in pyro.irange("groups", 2):
+            loc = pyro.sample("loc_{}".format(i), dist.Normal(0., 1.))
+            pyro.sample("obs_{}".format(i), CountingNormal(loc, 1.), obs=data[i])
+
+    hmc_kernel = HMC(model, step_size=0.1, num_steps=2)
+    hmc_kernel.setup(data)
+    z = {"loc_0": torch.tensor(0.), "loc_1": torch.tensor(0.)}
+    with torch.no_grad():
+        hmc_kernel._potential_energy(z)
+        # only `obs_1` depends on `loc_1`, so `obs_0` is not recomputed
+        del observed[:]
+        z["loc_1"] = torch.tensor(1.)
+        actual = hmc_kernel._potential_energy(z)
+    assert observed == [-1.]
+    locs = torch.tensor([0., 1.])
+    expected = -(dist.Normal(0., 1.).log_prob(locs) + dist.Normal(locs, 1.).log_prob(data)).sum()
+    assert_equal(actual, expected)
+
+    # terms that the gradient depends on are recomputed
+    del observed[:]
+    grads, _ = _grad(hmc_kernel._potential_energy, z)
+    assert sorted(observed) == [-1., 0.5]
+    assert_equal(grads["loc_0"], torch.tensor(-0.5))
+    assert_equal(grads["loc_1"], torch.tensor(3.))
+    hmc_kernel.cleanup()
+
+
 def test_beta_bernoulli():
     def model(data):
         alpha = torch.tensor([1.1, 1.1])
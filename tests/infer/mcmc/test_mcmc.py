@@ -1,3 +1,4 @@
+import pytest
 import torch
 
 import pyro
@@ -48,3 +49,17 @@ def test_mcmc_interface():
     sample_std = marginal.variance.sqrt()
     assert_equal(sample_mean, torch.tensor([0.0]), prec=0.08)
     assert_equal(sample_std, torch.tensor([1.0]), prec=0.08)
+
+
+@pytest.mark.parametrize("num_chains", [1, 2])
+def test_mcmc_num_chains(num_chains):
+    data = torch.tensor([1.0])
+    kernel = PriorKernel(normal_normal_model)
+    mcmc = MCMC(kernel=kernel, num_samples=400, warmup_steps=50, num_chains=num_chains).run(data)
+    marginal = EmpiricalMarginal(mcmc)
+    assert_equal(marginal.sample_size, 400 * num_chains)
+    assert sorted(set(mcmc.chain_ids)) == list(range(num_chains))
+    for chain_id in range(num_chains):
+        assert mcmc.chain_ids.count(chain_id) == 400
+    assert_equal(marginal.mean, torch.tensor([0.0]), prec=0.15)
+    assert_equal(marginal.variance.sqrt(), torch.tensor([1.0]), prec=0.15)
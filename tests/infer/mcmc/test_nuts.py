@@ -10,7 +10,7 @@ import pyro
 import pyro.distributions as dist
 from pyro.infer import EmpiricalMarginal
 from pyro.infer.mcmc.mcmc import MCMC
-from pyro.infer.mcmc.nuts import NUTS
+from pyro.infer.mcmc.nuts import NUTS, _leaf_idx_to_ckpt_idxs
 import pyro.poutine as poutine
 from tests.common import assert_equal
 
@@ -167,7 +167,8 @@ def test_dirichlet_categorical():
     assert_equal(posterior.mean, true_probs, prec=0.02)
 
 
-def test_gamma_beta():
+@pytest.mark.parametrize("packed_latents", [False, True])
+def test_gamma_beta(packed_latents):
     def model(data):
         alpha_prior = pyro.sample('alpha', dist.Gamma(concentration=1., rate=1.))
         beta_prior = pyro.sample('beta', dist.Gamma(concentration=1., rate=1.))
@@ -176,7 +177,7 @@ def test_gamma_beta():
     true_alpha = torch.tensor(5.)
     true_beta = torch.tensor(1.)
     data = dist.Beta(concentration1=true_alpha, concentration0=true_beta).sample(torch.Size((5000,)))
-    nuts_kernel = NUTS(model, adapt_step_size=True)
+    nuts_kernel = NUTS(model, adapt_step_size=True, packed_latents=packed_latents)
     mcmc_run = MCMC(nuts_kernel, num_samples=500, warmup_steps=200).run(data)
     posterior = EmpiricalMarginal(mcmc_run, sites=['alpha', 'beta'])
     assert_equal(posterior.mean, torch.stack([true_alpha, true_beta]), prec=0.05)
@@ -254,3 +255,35 @@ def test_gaussian_hmm_enum_shape(num_steps, use_einsum):
     nuts_kernel = NUTS(model, adapt_step_size=True, max_iarange_nesting=0,
                        experimental_use_einsum=use_einsum)
     MCMC(nuts_kernel, num_samples=5, warmup_steps=5).run(data)
+
+
+@pytest.mark.parametrize("full_mass", [False, True])
+def test_logistic_regression_with_mass_matrix_adaptation(full_mass):
+    dim = 3
+    data = torch.randn(2000, dim)
+    true_coefs = torch.arange(1., dim + 1.)
+    labels = dist.Bernoulli(logits=(true_coefs * data).sum(-1)).sample()
+
+    def model(data):
+        coefs_mean = torch.zeros(dim)
+        coefs = pyro.sample('beta', dist.Normal(coefs_mean, torch.ones(dim)))
+        y = pyro.sample('y', dist.Bernoulli(logits=(coefs * data).sum(-1)), obs=labels)
+        return y
+
+    nuts_kernel = NUTS(model, adapt_step_size=True, adapt_mass_matrix=True, full_mass=full_mass)
+    mcmc_run = MCMC(nuts_kernel, num_samples=300, warmup_steps=200).run(data)
+    posterior = EmpiricalMarginal(mcmc_run, sites='beta')
+    assert_equal(rmse(true_coefs, posterior.mean).item(), 0.0, prec=0.1)
+
+
+@pytest.mark.parametrize("leaf_idx, ckpt_idxs", [
+    (0, (1, 0)),
+    (1, (0, 0)),
+    (6, (3, 2)),
+    (7, (0, 2)),
+    (11, (1, 2)),
+    (13, (2, 2)),
+    (15, (0, 3)),
+])
+def test_leaf_idx_to_ckpt_idxs(leaf_idx, ckpt_idxs):
+    assert _leaf_idx_to_ckpt_idxs(leaf_idx) == ckpt_idxs
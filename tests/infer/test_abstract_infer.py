@@ -1,11 +1,12 @@
 from __future__ import absolute_import, division, print_function
 
+import pytest
 import torch
 
 import pyro
 import pyro.distributions as dist
 import pyro.poutine as poutine
-from pyro.infer import EmpiricalMarginal, TracePredictive
+from pyro.infer import EmpiricalMarginal, Importance, TracePredictive
 from pyro.infer.mcmc import MCMC, NUTS
 from tests.common import assert_equal
 
@@ -29,6 +30,37 @@ def test_posterior_predictive():
     assert_equal(marginal_return_vals.mean, torch.ones(5) * 700, prec=30)
 
 
+@pytest.mark.parametrize("use_store_dir", [False, True])
+def test_posterior_predictive_sample_store(use_store_dir, tmpdir):
+    true_probs = torch.ones(5) * 0.7
+    num_trials = torch.ones(5) * 1000
+    num_success = dist.Binomial(num_trials, true_probs).sample()
+    conditioned_model = poutine.condition(model, data={"obs": num_success})
+    nuts_kernel = NUTS(conditioned_model, adapt_step_size=True)
+    store_dir = str(tmpdir) if use_store_dir else None
+    mcmc_run = MCMC(nuts_kernel, num_samples=2000, warmup_steps=200,
+                    store_sites=["phi"], thin=2, store_dir=store_dir).run(num_trials)
+    assert not mcmc_run.exec_traces
+    assert len(mcmc_run.sample_store) == 1000
+    assert mcmc_run.sample_store["phi"].shape == (1000, 5)
+    assert_equal(EmpiricalMarginal(mcmc_run, "phi").mean, true_probs, prec=0.05)
+    posterior_predictive = TracePredictive(model, mcmc_run, num_samples=10000).run(num_trials)
+    marginal_return_vals = EmpiricalMarginal(posterior_predictive)
+    assert_equal(marginal_return_vals.mean, torch.ones(5) * 700, prec=30)
+
+
+def test_empirical_marginal_missing_store_site():
+    def model():
+        pyro.sample("loc", dist.Normal(0., 1.))
+
+    posterior = Importance(model, num_samples=10, store_sites=["loc"]).run()
+    assert EmpiricalMarginal(posterior, "loc").sample().shape == ()
+    with pytest.raises(ValueError, match="_RETURN"):
+        EmpiricalMarginal(posterior)
+    with pytest.raises(ValueError, match="scale"):
+        EmpiricalMarginal(posterior, ["loc", "scale"])
+
+
 def test_nesting():
     def nested():
         true_probs = torch.ones(5) * 0.7
@@ -0,0 +1,65 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import pytest
+import torch
+import torch.distributed
+import torch.multiprocessing as mp
+
+import pyro
+import pyro.distributions as dist
+import pyro.optim as optim
+from pyro.infer import SVI, DistributedSVI, Trace_ELBO
+from tests.common import assert_equal
+
+WORLD_SIZE = 2
+
+
+def model(data, idx):
+    loc = pyro.sample("loc", dist.Normal(0., 1.))
+    with pyro.iarange("data", len(data), subsample=idx):
+        pyro.sample("obs", dist.Normal(loc, 1.), obs=data[idx])
+
+
+def guide(data, idx):
+    # each rank initializes differently, rank 0 wins
+    loc = pyro.param("loc_q", torch.randn(()))
+    pyro.sample("loc", dist.Delta(loc))
+
+
+def run_rank(rank, init_method, data, num_steps, result_queue):
+    torch.distributed.init_process_group("gloo", init_method=init_method,
+                                         world_size=WORLD_SIZE, rank=rank)
+    pyro.set_rng_seed(rank)
+    pyro.clear_param_store()
+    svi = DistributedSVI(model, guide, optim.SGD({"lr": 0.01}), loss=Trace_ELBO())
+    idx = torch.arange(len(data)).long()[rank::WORLD_SIZE]
+    losses = [svi.step(data, idx, shard_size=len(idx)) for _ in range(num_steps)]
+    result_queue.put((rank, losses, pyro.param("loc_q").detach()))
+
+
+@pytest.mark.skipif(not torch.distributed.is_available(), reason="torch.distributed is not available")
+@pytest.mark.parametrize("num_data", [8, 7], ids=["even", "ragged"])
+def test_distributed_svi_matches_svi(num_data, tmpdir):
+    num_steps = 5
+    data = torch.randn(num_data)
+    init_method = "file://" + os.path.join(str(tmpdir), "init")
+    result_queue = mp.Queue()
+    workers = [mp.Process(target=run_rank, args=(rank, init_method, data, num_steps, result_queue))
+               for rank in range(WORLD_SIZE)]
+    for w in workers:
+        w.start()
+    results = sorted(result_queue.get(timeout=60) for _ in workers)
+    for w in workers:
+        w.join()
+
+    # replay the same updates in a single process, from rank 0's init
+    pyro.set_rng_seed(0)
+    pyro.clear_param_store()
+    svi = SVI(model, guide, optim.SGD({"lr": 0.01}), loss=Trace_ELBO())
+    idx = torch.arange(num_data).long()
+    expected_losses = [svi.step(data, idx) for _ in range(num_steps)]
+    for rank, losses, loc in results:
+        assert_equal(losses, expected_losses, prec=1e-4)
+        assert_equal(loc, pyro.param("loc_q").detach(), prec=1e-5)
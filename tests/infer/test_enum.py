@@ -20,6 +20,7 @@ from pyro.infer import SVI, config_enumerate
 from pyro.infer.enum import iter_discrete_traces
 from pyro.infer.traceenum_elbo import TraceEnum_ELBO
 from pyro.infer.util import LAST_CACHE_SIZE
+from pyro.ops.einsum import get_path_cache
 from pyro.util import torch_isnan
 from tests.common import assert_equal, skipif_param
 
@@ -1279,6 +1280,43 @@ def test_hmm_enumerate_model_and_guide(num_steps):
     elbo.differentiable_loss(model, guide, data)
 
 
+@pytest.mark.parametrize('history', [1, 2])
+@pytest.mark.parametrize('num_steps', [1, 2, 3, 10, 20])
+@pytest.mark.parametrize('iarange_size', [None, 3])
+def test_elbo_hmm_markov(iarange_size, num_steps, history):
+    pyro.clear_param_store()
+    shape = (num_steps,) if iarange_size is None else (num_steps, iarange_size)
+    data = dist.Categorical(torch.tensor([0.5, 0.5])).sample(shape)
+
+    def model(data, markov):
+        transition_probs = pyro.param("transition_probs",
+                                      torch.tensor([[0.75, 0.25], [0.25, 0.75]]),
+                                      constraint=constraints.simplex)
+        emission_probs = pyro.param("emission_probs",
+                                    torch.tensor([[0.75, 0.25], [0.25, 0.75]]),
+                                    constraint=constraints.simplex)
+        with ExitStack() as stack:
+            if iarange_size is not None:
+                stack.enter_context(pyro.iarange("sequences", iarange_size, dim=-1))
+            x = 0
+            steps = pyro.markov(range(num_steps), history=history) if markov else range(num_steps)
+            for t in steps:
+                x = pyro.sample("x_{}".format(t), dist.Categorical(transition_probs[x]),
+                                infer={"enumerate": "parallel"})
+                pyro.sample("y_{}".format(t), dist.Categorical(emission_probs[x]), obs=data[t])
+                # Enumeration dims are recycled after history + 1 steps.
+                if markov:
+                    assert x.dim() <= 1 + history + (iarange_size is not None)
+
+    def guide(data, markov):
+        pass
+
+    elbo = TraceEnum_ELBO(max_iarange_nesting=0 if iarange_size is None else 1)
+    expected_loss = elbo.differentiable_loss(model, guide, data, False)
+    actual_loss = elbo.differentiable_loss(model, guide, data, True)
+    _check_loss_and_grads(expected_loss, actual_loss)
+
+
 def _check_loss_and_grads(expected_loss, actual_loss):
     assert_equal(actual_loss, expected_loss,
                  msg='Expected:\n{}\nActual:\n{}'.format(expected_loss.detach().cpu().numpy(),
@@ -3084,6 +3122,35 @@ def test_compute_marginals_hmm(size):
         assert d1.probs[1] < d2.probs[1]
 
 
+@pytest.mark.parametrize('iarange_size', [None, 3])
+@pytest.mark.parametrize('size', [1, 2, 3, 10, 20])
+def test_compute_marginals_hmm_markov(size, iarange_size):
+    shape = (size,) if iarange_size is None else (size, iarange_size)
+    data = dist.Categorical(torch.tensor([0.5, 0.5])).sample(shape)
+
+    @config_enumerate(default="parallel")
+    def model(data, markov):
+        transition_probs = torch.tensor([[0.75, 0.25], [0.25, 0.75]])
+        emission_probs = torch.tensor([[0.75, 0.25], [0.25, 0.75]])
+        with ExitStack() as stack:
+            if iarange_size is not None:
+                stack.enter_context(pyro.iarange("sequences", iarange_size, dim=-1))
+            x = 0
+            for i in pyro.markov(range(size)) if markov else range(size):
+                x = pyro.sample("x_{}".format(i), dist.Categorical(transition_probs[x]))
+                pyro.sample("y_{}".format(i), dist.Categorical(emission_probs[x]), obs=data[i])
+
+    def guide(data, markov):
+        pass
+
+    elbo = TraceEnum_ELBO(max_iarange_nesting=0 if iarange_size is None else 1)
+    expected = elbo.compute_marginals(model, guide, data, False)
+    actual = elbo.compute_marginals(model, guide, data, True)
+    assert set(actual) == set(expected)
+    for name in expected:
+        assert_equal(actual[name].probs, expected[name].probs, msg=name)
+
+
 @pytest.mark.parametrize("data", [
     [None, None],
     [torch.tensor(0.), None],
@@ -3213,3 +3280,36 @@ def test_backwardsample_posterior_restrictions(ok, enumerate_guide, num_particle
     else:
         with pytest.raises(NotImplementedError, match="sample_posterior"):
             elbo.sample_posterior(model, guide)
+
+
+def test_elbo_size_buckets():
+    pyro.clear_param_store()
+
+    @config_enumerate(default="parallel")
+    def model(data):
+        probs = pyro.param("probs", torch.tensor([0.3, 0.7]))
+        locs = pyro.param("locs", torch.tensor([-1., 1.]))
+        with pyro.iarange("data", len(data)):
+            z = pyro.sample("z", dist.Categorical(probs))
+            pyro.sample("x", dist.Normal(locs[z], 1.), obs=data)
+
+    def guide(data):
+        pass
+
+    elbo = TraceEnum_ELBO(max_iarange_nesting=1, size_buckets=[4, 8, 16])
+    cache = get_path_cache()
+    cache.clear()
+    try:
+        elbo.loss(model, guide, torch.randn(5))
+        misses = cache.stats()["misses"]
+        assert misses > 0
+        data = [torch.randn(batch_size) for batch_size in [6, 7, 8]]
+        actual = [elbo.loss(model, guide, x) for x in data]
+        # Batch sizes in the same bucket reuse the cached contractions.
+        assert cache.stats()["misses"] == misses
+        assert cache.size_buckets is None
+
+        expected = [TraceEnum_ELBO(max_iarange_nesting=1).loss(model, guide, x) for x in data]
+        assert_equal(actual, expected, prec=1e-5)
+    finally:
+        cache.clear()
@@ -233,3 +233,52 @@ def test_subsample_gradient_sequential(Elbo, reparameterized, subsample):
         logger.info('expected {} = {}'.format(name, expected_grads[name]))
         logger.info('actual   {} = {}'.format(name, actual_grads[name]))
     assert_equal(actual_grads, expected_grads, prec=precision)
+
+
+@pytest.mark.parametrize("Elbo", [Trace_ELBO, TraceGraph_ELBO, TraceEnum_ELBO])
+def test_static_structure(Elbo):
+    def model(data):
+        loc = pyro.sample("loc", fakes.NonreparameterizedNormal(0., 1.))
+        with pyro.iarange("data", len(data)):
+            z = pyro.sample("z", fakes.NonreparameterizedNormal(loc, 1.).expand_by(data.shape))
+            pyro.sample("x", dist.Normal(z, 1.), obs=data)
+
+    def guide(data):
+        q_loc = pyro.param("q_loc", torch.tensor(0.5))
+        pyro.sample("loc", fakes.NonreparameterizedNormal(q_loc, 1.))
+        with pyro.iarange("data", len(data)):
+            z_loc = pyro.param("z_loc", torch.zeros(3))[:len(data)]
+            pyro.sample("z", fakes.NonreparameterizedNormal(z_loc, 1.))
+
+    # the last step changes the site signature
+    datasets = [torch.tensor([0., 1., 2.]), torch.tensor([1., 2., 3.]), torch.tensor([1., 2.])]
+
+    def get_grads(static_structure):
+        pyro.clear_param_store()
+        pyro.set_rng_seed(0)
+        elbo = Elbo(max_iarange_nesting=1, strict_enumeration_warning=False,
+                    static_structure=static_structure)
+        validate = elbo._validate_traces
+        num_validations = [0]
+
+        def counting_validate(model_trace, guide_trace):
+            num_validations[0] += 1
+            validate(model_trace, guide_trace)
+
+        elbo._validate_traces = counting_validate
+        grads = []
+        for data in datasets:
+            loss = elbo.loss_and_grads(model, guide, data)
+            params = dict(pyro.get_param_store().named_parameters())
+            grads.append((loss, {name: param.grad.clone() for name, param in params.items()}))
+            for param in params.values():
+                param.grad.zero_()
+        return grads, num_validations[0]
+
+    expected, expected_num_validations = get_grads(False)
+    actual, actual_num_validations = get_grads(True)
+    assert expected_num_validations == 3
+    assert actual_num_validations == 2
+    for (expected_loss, expected_grads), (actual_loss, actual_grads) in zip(expected, actual):
+        assert_equal(actual_loss, expected_loss)
+        assert_equal(actual_grads, expected_grads)
@@ -393,3 +393,86 @@ class SafetyTests(TestCase):
 
         with pytest.raises(RuntimeError):
             svi.step()
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+@pytest.mark.parametrize("loss_window", [1, 3])
+def test_svi_run_epochs(prefetch, loss_window, tmpdir):
+    data = torch.randn(10, 2)
+
+    def model(batch):
+        loc = pyro.sample("loc", dist.Normal(torch.zeros(2), 1.).independent(1))
+        with pyro.iarange("data", len(data), subsample_size=len(batch)):
+            pyro.sample("obs", dist.Normal(loc, 1.).independent(1), obs=batch)
+
+    def guide(batch):
+        q_loc = pyro.param("q_loc", torch.zeros(2))
+        pyro.sample("loc", dist.Normal(q_loc, 1.).independent(1))
+
+    batches = [data[i:i + 4] for i in range(0, 10, 4)]
+
+    pyro.clear_param_store()
+    pyro.set_rng_seed(0)
+    svi = SVI(model, guide, optim.Adam({"lr": 0.1}), loss=Trace_ELBO())
+    expected_losses = [[svi.step(batch) for batch in batches] for epoch in range(2)]
+    expected_q_loc = pyro.param("q_loc").detach().clone()
+
+    pyro.clear_param_store()
+    pyro.set_rng_seed(0)
+    svi = SVI(model, guide, optim.Adam({"lr": 0.1}), loss=Trace_ELBO())
+    reported = []
+    checkpoints = []
+    filename = str(tmpdir.join("svi.pt"))
+
+    def checkpoint_fn(epoch, step):
+        checkpoints.append((epoch, step))
+        svi.save_checkpoint(filename)
+
+    epoch_losses = svi.run_epochs(batches, num_epochs=2, prefetch=prefetch, loss_window=loss_window,
+                                  callback=lambda epoch, step, loss: reported.append((epoch, step, loss)),
+                                  checkpoint_every=2, checkpoint_fn=checkpoint_fn)
+
+    assert_equal(pyro.param("q_loc"), expected_q_loc)
+    assert_equal(epoch_losses, [sum(losses) / len(losses) for losses in expected_losses], prec=1e-5)
+    if loss_window == 1:
+        assert_equal([loss for _, _, loss in reported], sum(expected_losses, []), prec=1e-5)
+    else:
+        assert [(epoch, step) for epoch, step, _ in reported] == [(0, 2), (1, 2)]
+    assert checkpoints == [(0, 1), (1, 0), (1, 2)]
+
+    # the last checkpoint holds the final state
+    pyro.clear_param_store()
+    svi.load_checkpoint(filename)
+    assert_equal(pyro.param("q_loc"), expected_q_loc)
+
+
+@pytest.mark.parametrize("loss_window,num_windows", [(1, 6), (2, 4), (3, 2)])
+def test_svi_run_epochs_syncs_once_per_window(loss_window, num_windows, monkeypatch):
+    data = torch.randn(10, 2)
+
+    def model(batch):
+        loc = pyro.sample("loc", dist.Normal(torch.zeros(2), 1.).independent(1))
+        with pyro.iarange("data", len(data), subsample_size=len(batch)):
+            pyro.sample("obs", dist.Normal(loc, 1.).independent(1), obs=batch)
+
+    def guide(batch):
+        q_loc = pyro.param("q_loc", torch.zeros(2))
+        pyro.sample("loc", dist.Normal(q_loc, 1.).independent(1))
+
+    batches = [data[i:i + 4] for i in range(0, 10, 4)]
+    pyro.clear_param_store()
+    svi = SVI(model, guide, optim.Adam({"lr": 0.1}), loss=Trace_ELBO().differentiable_loss)
+
+    synced = []
+
+    def torch_item(x):
+        synced.append(x)
+        return x.item() if torch.is_tensor(x) else x
+
+    monkeypatch.setattr(pyro.infer.svi, "torch_item", torch_item)
+    reported = []
+    svi.run_epochs(batches, num_epochs=2, prefetch=0, loss_window=loss_window,
+                   callback=lambda epoch, step, loss: reported.append(loss))
+    assert len(synced) == num_windows
+    assert len(reported) == num_windows
+    assert all(torch.is_tensor(x) for x in synced)
@@ -82,3 +82,40 @@ class ImportanceTest(NormalNormalSamplingTestCase):
         marginal = EmpiricalMarginal(posterior)
         assert_equal(0, torch.norm(marginal.mean - self.loc_mean).item(), prec=0.01)
         assert_equal(0, torch.norm(marginal.variance.sqrt() - self.loc_stddev).item(), prec=0.1)
+
+    @pytest.mark.init(rng_seed=0)
+    def test_importance_vectorized(self):
+        data = self.data.squeeze(-1)
+
+        def model():
+            loc = pyro.sample("loc", Normal(0., 1.))
+            with pyro.iarange("data", len(data)):
+                pyro.sample("xs", Normal(loc, 1.), obs=data)
+            return loc
+
+        posterior = pyro.infer.Importance(model, guide=None, num_samples=10000,
+                                          vectorize_samples=True, max_iarange_nesting=1).run()
+        unvectorized = pyro.infer.Importance(model, guide=None, num_samples=10).run()
+        assert not posterior.exec_traces
+        assert posterior.log_weights.shape == (10000,)
+        for sites in ["_RETURN", "loc"]:
+            marginal = EmpiricalMarginal(posterior, sites=sites)
+            assert marginal.mean.shape == EmpiricalMarginal(unvectorized, sites=sites).mean.shape
+            assert marginal.sample().shape == EmpiricalMarginal(unvectorized, sites=sites).sample().shape
+            assert_equal(0, torch.norm(marginal.mean - self.loc_mean).item(), prec=0.01)
+            assert_equal(0, torch.norm(marginal.variance.sqrt() - self.loc_stddev).item(), prec=0.1)
+
+    def test_importance_vectorized_shapes(self):
+
+        def model():
+            pyro.sample("loc", Normal(0., 1.))
+            with pyro.iarange("data", 3):
+                pyro.sample("z", Normal(torch.zeros(3), 1.))
+            return torch.ones(2)
+
+        posterior = pyro.infer.Importance(model, guide=None, num_samples=5,
+                                          vectorize_samples=True, max_iarange_nesting=1).run()
+        store = posterior.sample_store
+        assert store["loc"].shape == (5,)
+        assert store["z"].shape == (5, 3)
+        assert_equal(store["_RETURN"], torch.ones(5, 2))
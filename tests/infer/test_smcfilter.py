@@ -0,0 +1,183 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+
+import pytest
+import torch
+
+import pyro
+import pyro.distributions as dist
+from pyro.infer import SMCFilter
+from pyro.infer.smcfilter import SMCFailed, _systematic_sample
+from tests.common import assert_equal
+
+
+class SmokeModel(object):
+
+    def __init__(self, state_size, plate_size):
+        self.state_size = state_size
+        self.plate_size = plate_size
+
+    def init(self, state):
+        self.t = 0
+        state["x_mean"] = pyro.sample("x_mean", dist.Normal(0., 1.))
+        state["y_mean"] = pyro.sample("y_mean",
+                                      dist.MultivariateNormal(torch.zeros(self.state_size),
+                                                              torch.eye(self.state_size)))
+
+    def step(self, state, x=None, y=None):
+        v = pyro.sample("v_{}".format(self.t), dist.Normal(0., 1.))
+        with pyro.iarange("plate", self.plate_size):
+            w = pyro.sample("w_{}".format(self.t), dist.Normal(v, 1.))
+            x = pyro.sample("x_{}".format(self.t),
+                            dist.Normal(state["x_mean"] + w, 1), obs=x)
+            y = pyro.sample("y_{}".format(self.t),
+                            dist.MultivariateNormal(state["y_mean"] + w.unsqueeze(-1),
+                                                    torch.eye(self.state_size)),
+                            obs=y)
+        self.t += 1
+        return x, y
+
+
+class SmokeGuide(object):
+
+    def __init__(self, state_size, plate_size):
+        self.state_size = state_size
+        self.plate_size = plate_size
+
+    def init(self, state):
+        self.t = 0
+        pyro.sample("x_mean", dist.Normal(0., 2.))
+        pyro.sample("y_mean",
+                    dist.MultivariateNormal(torch.zeros(self.state_size),
+                                            2. * torch.eye(self.state_size)))
+
+    def step(self, state, x=None, y=None):
+        v = pyro.sample("v_{}".format(self.t), dist.Normal(0., 2.))
+        with pyro.iarange("plate", self.plate_size):
+            pyro.sample("w_{}".format(self.t), dist.Normal(v, 2.))
+        self.t += 1
+
+
+@pytest.mark.parametrize("max_iarange_nesting", [1, 2])
+@pytest.mark.parametrize("state_size", [2, 5])
+@pytest.mark.parametrize("plate_size", [3, 7])
+@pytest.mark.parametrize("num_steps", [1, 2, 10])
+def test_smoke(max_iarange_nesting, state_size, plate_size, num_steps):
+    model = SmokeModel(state_size, plate_size)
+    guide = SmokeGuide(state_size, plate_size)
+
+    smc = SMCFilter(model, guide, num_particles=100, max_iarange_nesting=max_iarange_nesting)
+
+    true_model = SmokeModel(state_size, plate_size)
+
+    state = {}
+    true_model.init(state)
+    truth = [true_model.step(state) for t in range(num_steps)]
+
+    smc.init()
+    for xy in truth:
+        smc.step(*xy)
+    assert set(smc.state) == {"x_mean", "y_mean"}
+    assert smc.state["x_mean"].size(0) == 100
+    assert smc.state["y_mean"].shape[0] == 100
+    assert smc.state["y_mean"].shape[-1] == state_size
+    assert abs(smc.get_log_normalizer()) < float('inf')
+
+    empirical = smc.get_empirical()
+    for key in smc.state:
+        assert isinstance(empirical[key], dist.Empirical)
+        empirical[key].sample()
+
+
+class RandomWalkModel(object):
+
+    def init(self, state):
+        self.t = 0
+        state["z"] = pyro.sample("z_init", dist.Normal(0., 1.))
+
+    def step(self, state, y=None):
+        self.t += 1
+        state["z"] = pyro.sample("z_{}".format(self.t), dist.Normal(state["z"], 1.))
+        y = pyro.sample("y_{}".format(self.t), dist.Normal(state["z"], 1.), obs=y)
+        return state["z"], y
+
+
+class RandomWalkGuide(object):
+
+    def init(self, state):
+        self.t = 0
+        pyro.sample("z_init", dist.Normal(0., 1.))
+
+    def step(self, state, y=None):
+        self.t += 1
+        # Proposal is the prior.
+        pyro.sample("z_{}".format(self.t), dist.Normal(state["z"], 1.))
+
+
+def _kalman_log_normalizer(ys):
+    # Exact log p(y_1, ..., y_T) of the Gaussian random walk.
+    mean, var = 0., 1.
+    log_normalizer = 0.
+    for y in ys:
+        var = var + 1.
+        pred_var = var + 1.
+        log_normalizer += dist.Normal(mean, math.sqrt(pred_var)).log_prob(torch.tensor(y)).item()
+        gain = var / pred_var
+        mean = mean + gain * (y - mean)
+        var = (1 - gain) * var
+    return log_normalizer
+
+
+@pytest.mark.parametrize("ess_threshold", [0.5, 1.0])
+def test_random_walk_log_normalizer(ess_threshold):
+    pyro.set_rng_seed(0)
+    num_steps = 20
+    ys = [float(y) for y in dist.Normal(0., 2.).sample((num_steps,)).cumsum(0)]
+
+    smc = SMCFilter(RandomWalkModel(), RandomWalkGuide(), num_particles=2000,
+                    max_iarange_nesting=0, ess_threshold=ess_threshold)
+    smc.init()
+    for y in ys:
+        smc.step(torch.tensor(y))
+    assert smc.state["z"].shape == (2000,)
+
+    expected = _kalman_log_normalizer(ys)
+    assert_equal(smc.get_log_normalizer(), expected, prec=0.5)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_systematic_sample(seed):
+    pyro.set_rng_seed(seed)
+    num_particles = 1000
+    weights = torch.rand(num_particles) + 0.1
+    index = _systematic_sample(weights.log())
+    counts = torch.zeros(num_particles).index_add_(0, index, torch.ones(num_particles))
+
+    # Each ancestor is drawn either floor(N * w) or ceil(N * w) times.
+    expected = num_particles * weights / weights.sum()
+    assert (counts >= (expected - 1e-3).floor()).all()
+    assert (counts <= (expected + 1e-3).ceil()).all()
+    assert (index[1:] >= index[:-1]).all()
+
+
+def test_infeasible():
+
+    class Model(object):
+        def init(self, state):
+            state["z"] = pyro.sample("z", dist.Normal(0., 1.))
+
+        def step(self, state):
+            pyro.sample("y", dist.Delta(torch.tensor(0.)), obs=torch.tensor(1.))
+
+    class Guide(object):
+        def init(self, state):
+            pyro.sample("z", dist.Normal(0., 1.))
+
+        def step(self, state):
+            pass
+
+    smc = SMCFilter(Model(), Guide(), num_particles=10, max_iarange_nesting=0)
+    smc.init()
+    with pytest.raises(SMCFailed):
+        smc.step()
@@ -700,6 +700,41 @@ def test_enum_discrete_parallel_nested_ok(max_iarange_nesting):
               TraceEnum_ELBO(max_iarange_nesting=max_iarange_nesting))
 
 
+@pytest.mark.parametrize("baseline", ["decaying_avg", "nn_baseline", "baseline_value"])
+def test_tracegraph_vectorized_num_particles_baselines(baseline):
+    data = torch.ones(5)
+    baseline_module = torch.nn.Linear(1, 1)
+
+    @poutine.broadcast
+    def model():
+        with pyro.iarange("data", len(data)):
+            z = pyro.sample("z", dist.Bernoulli(0.5))
+            assert z.shape == (10, 5)
+            pyro.sample("obs", dist.Normal(z, 1.), obs=data)
+
+    @poutine.broadcast
+    def guide():
+        probs = pyro.param("probs", torch.full((5,), 0.5))
+        if baseline == "decaying_avg":
+            infer = {"baseline": {"use_decaying_avg_baseline": True}}
+        elif baseline == "nn_baseline":
+            pyro.module("baseline_module", baseline_module)
+            infer = {"baseline": {"nn_baseline": lambda x: baseline_module(x).squeeze(-1),
+                                  "nn_baseline_input": data.unsqueeze(-1)}}
+        else:
+            baseline_value = pyro.param("baseline_value", torch.zeros(5))
+            infer = {"baseline": {"baseline_value": baseline_value}}
+        with pyro.iarange("data", len(data)):
+            pyro.sample("z", dist.Bernoulli(probs), infer=infer)
+
+    # baselines of shape (5,) are shared by all 10 particles
+    assert_ok(model, guide, TraceGraph_ELBO(num_particles=10,
+                                            vectorize_particles=True,
+                                            max_iarange_nesting=1))
+    if baseline == "decaying_avg":
+        assert pyro.param("__baseline_avg_downstream_cost_z").shape == (1, 5)
+
+
 @pytest.mark.parametrize('enumerate_,expand,num_samples', [
     (None, False, None),
     ("sequential", False, None),
@@ -0,0 +1,74 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import torch
+
+from pyro.ops.einsum import PathCache, contract, contract_expression, get_path_cache, size_buckets
+from tests.common import assert_equal
+
+
+def test_lru_eviction():
+    cache = PathCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # a is now more recently used than b
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.get('b') is None
+    assert cache.stats() == {"hits": 1, "misses": 0, "evictions": 1, "size": 2, "max_size": 2}
+
+
+def test_counters():
+    get_path_cache().clear()
+    shapes = [(2, 3), (3, 4), (4, 5)]
+    contract_expression('ab,bc,cd->ad', *shapes)
+    contract_expression('ab,bc,cd->ad', *shapes)
+    contract_expression('ab,bc,cd->ad', *shapes, cache_path=False)
+    stats = get_path_cache().stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["size"] == 1
+
+
+def test_save_load(tmpdir):
+    operands = [torch.randn(2, 3), torch.randn(3, 4), torch.randn(4, 5)]
+    equation = 'ab,bc,cd->ad'
+    cache = get_path_cache()
+    cache.clear()
+    expected = contract(equation, *operands, backend='torch')
+    filename = os.path.join(str(tmpdir), 'paths.pt')
+    cache.save(filename)
+
+    # Loaded paths avoid path searches.
+    cache.clear()
+    cache.load(filename)
+    actual = contract(equation, *operands, backend='torch')
+    assert_equal(actual, expected)
+    assert cache.stats()["misses"] == 0
+    assert cache.stats()["hits"] == 1
+    cache.clear()
+
+
+def test_size_buckets():
+    cache = get_path_cache()
+    cache.clear()
+    try:
+        equation = 'ab,bc,cd->ad'
+        with size_buckets([2, 4, 8]):
+            for batch_size in [5, 6, 7, 8]:
+                operands = [torch.randn(batch_size, 3), torch.randn(3, 4), torch.randn(4, 1)]
+                actual = contract(equation, *operands, backend='torch')
+                expected = operands[0].mm(operands[1]).mm(operands[2])
+                assert_equal(actual, expected)
+            assert cache.stats()["misses"] == 1
+            assert cache.stats()["hits"] == 3
+            assert cache.stats()["size"] == 1
+
+            # Sizes beyond the largest bucket are not rounded.
+            contract_expression(equation, (9, 3), (3, 4), (4, 1))
+            assert cache.stats()["misses"] == 2
+        assert cache.size_buckets is None
+    finally:
+        cache.clear()
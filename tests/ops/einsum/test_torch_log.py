@@ -1,12 +1,13 @@
 from __future__ import absolute_import, division, print_function
 
 import itertools
+import math
 
 import pytest
 import torch
 
 from pyro.infer.util import torch_exp
-from pyro.ops.einsum import contract
+from pyro.ops.einsum import contract, torch_log
 from pyro.ops.sumproduct import logsumproductexp, sumproduct
 from tests.common import assert_equal
 
@@ -49,6 +50,42 @@ def test_einsum(equation, min_size):
     assert_equal(actual, expected)
 
 
+@pytest.mark.parametrize('block_size', [1, 5, 30])
+@pytest.mark.parametrize('equation', [
+    'ab->',
+    'ab,bc->ac',
+    'ab,bc->',
+    'ab,b,bc->b',
+    'ab,bc,cd->ad',
+    'abc,bcd->ad',
+])
+def test_einsum_blocked(equation, block_size, monkeypatch):
+    monkeypatch.setattr(torch_log, 'BLOCK_SIZE', block_size)
+    inputs, output = equation.split('->')
+    inputs = inputs.split(',')
+    symbols = sorted(set(equation) - set(',->'))
+    sizes = dict(zip(symbols, itertools.count(3)))
+    operands = [torch.randn(tuple(sizes[dim] for dim in dims)) for dims in inputs]
+
+    expected = contract(equation, *(torch_exp(x) for x in operands), backend='torch').log()
+    actual = torch_log.einsum(equation, *operands)
+    assert_equal(actual, expected)
+
+
+def test_einsum_underflow():
+    x = torch.tensor([[0., -1000.], [-1000., 0.]])
+    y = torch.tensor([[-1000., 0.], [0., -1000.]])
+    actual = torch_log.einsum('ab,bc->ac', x, y)
+    expected = torch.tensor([[math.log(2) - 1000., 0.], [0., math.log(2) - 1000.]])
+    assert_equal(actual, expected, prec=1e-3)
+
+    # Entries that are exactly zero stay zero.
+    x = torch.tensor([[0., -float('inf')], [-float('inf'), 0.]])
+    y = torch.tensor([[-float('inf'), 0.], [0., -float('inf')]])
+    actual = torch_log.einsum('ab,bc->ac', x, y)
+    assert_equal(actual, torch.tensor([[-float('inf'), 0.], [0., -float('inf')]]))
+
+
 @pytest.mark.parametrize('shapes', [
     ((), (1,), (1, 2)),
     ((), (2,)),
@@ -10,7 +10,7 @@ import torch
 
 from pyro.distributions.util import logsumexp
 from pyro.ops.contract import (UnpackedLogRing, _partition_terms, contract_tensor_tree, contract_to_tensor,
-                               naive_ubersum, ubersum)
+                               naive_ubersum, sequential_logmatmulexp, ubersum)
 from pyro.poutine.indep_messenger import CondIndepStackFrame
 from pyro.util import optional
 from tests.common import assert_equal, xfail_param
@@ -322,6 +322,34 @@ def test_ubersum(equation, batch_dims):
                          output, expected_part.detach().cpu(), actual_part.detach().cpu()))
 
 
+@pytest.mark.parametrize('batch_shape', [(), (5,), (2, 3)], ids=str)
+@pytest.mark.parametrize('num_steps', [1, 2, 3, 7, 8, 9])
+def test_sequential_logmatmulexp(batch_shape, num_steps):
+    logits = torch.randn(batch_shape + (num_steps, 4, 4))
+    actual = sequential_logmatmulexp(logits)
+    assert actual.shape == batch_shape + (4, 4)
+
+    expected = logits[..., 0, :, :]
+    for t in range(1, num_steps):
+        expected = logsumexp(expected.unsqueeze(-1) + logits[..., t, :, :].unsqueeze(-3), -2)
+    assert_equal(actual, expected)
+
+
+@pytest.mark.parametrize('equation,batch_dims', [
+    ('ab,bc,cd->', ''),
+    ('a,ab,b,bc,c,cd,d,de->', ''),
+    ('ab,bc,cd,de,ef,fg,gh->a', ''),
+    ('xab,xbc,xcd,xde->x', 'x'),
+])
+def test_ubersum_chain(equation, batch_dims):
+    operands = [torch.randn(tuple(3 if dim in 'abcdefgh' else 2 for dim in dims))
+                for dims in equation.split('->')[0].split(',')]
+
+    actual, = ubersum(equation, *operands, batch_dims=batch_dims)
+    expected, = naive_ubersum(equation, *operands, batch_dims=batch_dims)
+    assert_equal(actual, expected)
+
+
 @pytest.mark.parametrize('a', [2, 1])
 @pytest.mark.parametrize('b', [3, 1])
 @pytest.mark.parametrize('c', [3, 1])
@@ -140,3 +140,23 @@ def test_time_reversibility(example):
                                args.step_size,
                                args.num_steps)
     assert_equal(q_f, args.q_i, 1e-5)
+
+
+@pytest.mark.parametrize('example', TEST_EXAMPLES, ids=EXAMPLE_IDS)
+def test_packed_trajectory(example):
+    model, args = example
+    names = sorted(args.q_i)
+
+    def pack(x):
+        return torch.cat([x[name].reshape(-1) for name in names])
+
+    def unpack(x_flat):
+        return {name: x_flat[i:i + 1] for i, name in enumerate(names)}
+
+    q_f, p_f = velocity_verlet(pack(args.q_i),
+                               pack(args.p_i),
+                               lambda q_flat: model.potential_fn(unpack(q_flat)),
+                               args.step_size,
+                               args.num_steps)
+    assert_equal(q_f, pack(args.q_f), args.prec)
+    assert_equal(p_f, pack(args.p_f), args.prec)
@@ -163,3 +163,60 @@ def test_clippedadam_lrd(lrd):
         x1.backward(g)
         opt_ca.step()
         assert opt_ca.param_groups[0]['lr'] == orig_lr * lrd**(step + 1)
+
+
+def _normal_guide():
+    loc = pyro.param('loc', torch.tensor(0.))
+    scale = pyro.param('scale', torch.tensor(0.5), constraint=constraints.positive)
+    pyro.sample('latent', Normal(loc, scale))
+
+
+def _normal_model():
+    sample = pyro.sample('latent', Normal(torch.tensor(0.), torch.tensor(0.3)))
+    return pyro.sample('obs', Normal(sample, torch.tensor(0.2)), obs=torch.tensor(0.1))
+
+
+@pytest.mark.parametrize('factory', [optim.Adam, optim.ClippedAdam, optim.SGD])
+def test_grouped_matches_per_param(factory):
+    results = []
+    for grouped in [False, True]:
+        pyro.clear_param_store()
+        pyro.set_rng_seed(0)
+        pyro_optim = factory({'lr': 0.01}, grouped=grouped)
+        svi = SVI(_normal_model, _normal_guide, pyro_optim, loss=TraceGraph_ELBO())
+        for _ in range(3):
+            svi.step()
+        results.append((pyro.param('loc').detach(), pyro.param('scale').detach(), pyro_optim.get_state()))
+    (loc, scale, state), (grouped_loc, grouped_scale, grouped_state) = results
+    assert_equal(loc, grouped_loc)
+    assert_equal(scale, grouped_scale)
+    assert set(state) == set(grouped_state) == {'loc', 'scale'}
+
+
+def test_grouped_set_state():
+    pyro.clear_param_store()
+    adam = optim.Adam({'lr': 0.01}, grouped=True)
+    svi = SVI(_normal_model, _normal_guide, adam, loss=TraceGraph_ELBO())
+    svi.step()
+    assert len(adam.grouped_optim_obj.param_groups) == 2
+    adam2 = optim.Adam({'lr': 0.01}, grouped=True)
+    adam2.set_state(adam.get_state())
+    svi2 = SVI(_normal_model, _normal_guide, adam2, loss=TraceGraph_ELBO())
+    svi2.step()
+    for state in adam2.get_state().values():
+        assert list(state['state'].values())[0]['step'] == 2
+
+
+def test_grouped_scheduler():
+    pyro.clear_param_store()
+    scheduler = optim.StepLR({'optimizer': torch.optim.SGD, 'optim_args': {'lr': 0.01},
+                              'gamma': 2, 'step_size': 1}, grouped=True)
+    svi = SVI(_normal_model, _normal_guide, scheduler, loss=TraceGraph_ELBO())
+    for epoch in range(2):
+        scheduler.set_epoch(epoch)
+        svi.step()
+    param_groups = scheduler.grouped_optim_obj.optimizer.param_groups
+    assert len(param_groups) == 2
+    for group in param_groups:
+        assert group['lr'] == 0.02
+        assert group['initial_lr'] == 0.01
@@ -10,6 +10,7 @@ from torch import nn as nn
 from torch.distributions import constraints
 
 import pyro
+import pyro.optim
 from tests.common import assert_equal
 
 
@@ -123,3 +124,50 @@ def test_dict_interface():
     assert param_store['y'].shape == (4, 5)
     assert_equal(param_store.setdefault('y', torch.zeros(4, 5)), torch.ones(4, 5))
     assert_equal(param_store['y'].unconstrained(), torch.zeros(4, 5))
+
+
+def test_constrained_value_memoization():
+    pyro.clear_param_store()
+    param_store = pyro.get_param_store()
+    scale = pyro.param('scale', torch.ones(3), constraint=constraints.positive)
+    assert pyro.param('scale') is scale
+
+    # the memo is invalidated by a backward pass through the constrained value
+    scale.sum().backward()
+    new_scale = pyro.param('scale')
+    assert new_scale is not scale
+    assert_equal(new_scale, scale)
+
+    # ... by in-place updates of the unconstrained value
+    with torch.no_grad():
+        new_scale.unconstrained().add_(1.)
+    assert_equal(pyro.param('scale'), torch.ones(3) * np.e)
+
+    # ... and by changes to the grad mode
+    with torch.no_grad():
+        assert not pyro.param('scale').requires_grad
+    assert pyro.param('scale').requires_grad
+
+    with param_store.memoization_disabled():
+        assert pyro.param('scale') is not pyro.param('scale')
+
+
+def test_constrained_value_memoization_data_update():
+    pyro.clear_param_store()
+    param_store = pyro.get_param_store()
+    with torch.no_grad():
+        scale = pyro.param('scale', torch.ones(3), constraint=constraints.positive)
+        assert pyro.param('scale') is scale
+
+        # updates through .data are not detected, until the cache is cleared
+        scale.unconstrained().data.add_(1.)
+        assert pyro.param('scale') is scale
+        param_store.clear_cache('scale')
+        assert_equal(pyro.param('scale'), torch.ones(3) * np.e)
+
+        # optimizers update params through .data, and clear the cache
+        scale = pyro.param('scale')
+        unconstrained = scale.unconstrained()
+        unconstrained.grad = torch.ones(3)
+        pyro.optim.SGD({"lr": 1.})([unconstrained])
+        assert_equal(pyro.param('scale'), torch.ones(3))
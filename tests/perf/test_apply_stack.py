@@ -0,0 +1,48 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+import torch
+
+import pyro
+import pyro.distributions as dist
+import pyro.poutine as poutine
+
+NUM_SITES = 100
+
+# Handlers commonly found wrapping a guide, applied innermost first.
+HANDLERS = [
+    lambda fn: poutine.scale(fn, scale=2.),
+    lambda fn: poutine.mask(fn, mask=torch.tensor(1, dtype=torch.uint8)),
+    poutine.broadcast,
+    lambda fn: poutine.block(fn, hide=["not_a_site"]),
+    lambda fn: poutine.replay(fn, trace=poutine.Trace()),
+    lambda fn: poutine.enum(fn, first_available_dim=1),
+    lambda fn: poutine.infer_config(fn, config_fn=lambda msg: {}),
+    lambda fn: poutine.condition(fn, data={}),
+    lambda fn: poutine.do(fn, data={}),
+    poutine.trace,
+]
+
+
+def model():
+    loc, scale = torch.zeros(()), torch.ones(())
+    for i in range(NUM_SITES):
+        pyro.sample("x_{}".format(i), dist.Normal(loc, scale))
+
+
+def wrap(fn, depth):
+    for handler in HANDLERS[:depth]:
+        fn = handler(fn)
+    return fn
+
+
+@pytest.mark.parametrize("depth", range(1, len(HANDLERS) + 1))
+@pytest.mark.benchmark(
+    min_rounds=5,
+    disable_gc=True,
+)
+@pytest.mark.disable_validation()
+def test_apply_stack_overhead(benchmark, depth):
+    wrapped_model = wrap(model, depth)
+    benchmark.extra_info["num_sites"] = NUM_SITES
+    benchmark(wrapped_model)
@@ -0,0 +1,242 @@
+"""
+Benchmarks of the sampling efficiency of the MCMC kernels.
+
+Wall time alone cannot tell whether a change made inference faster or just
+made each transition cheaper, so every benchmark also reports the effective
+sample size (ESS) per second and per gradient evaluation, the number of
+divergent transitions and, for NUTS, a histogram of tree depths. These
+statistics are stored in the ``extra_info`` of the pytest-benchmark results,
+so that runs of ``scripts/perf_test.sh`` can be compared across commits. The
+module can also be run as a script to print a summary table.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+import numpy as np
+import pytest
+import torch
+
+import pyro
+import pyro.distributions as dist
+import pyro.poutine as poutine
+from pyro.infer.mcmc.hmc import HMC
+from pyro.infer.mcmc.nuts import NUTS
+
+
+Benchmark = namedtuple('Benchmark', ['model', 'model_args', 'kernel_args', 'benchmark_id'])
+
+BENCHMARKS = []
+BENCHMARK_IDS = []
+
+
+def register_benchmark(benchmark_id, model_args=None, **kernel_args):
+    def register_fn(model_fn):
+        BENCHMARKS.append(Benchmark(model_fn, model_args or {}, kernel_args, benchmark_id))
+        BENCHMARK_IDS.append(benchmark_id)
+        return model_fn
+    return register_fn
+
+
+@register_benchmark('LogisticRegression_dim=100::NUTS', kernel=NUTS, model_args={"dim": 100})
+@register_benchmark('LogisticRegression_dim=20::NUTS', kernel=NUTS, model_args={"dim": 20})
+@register_benchmark('LogisticRegression_dim=5::NUTS', kernel=NUTS, model_args={"dim": 5})
+@register_benchmark('LogisticRegression_dim=5::HMC', kernel=HMC, num_steps=10, model_args={"dim": 5})
+def logistic_regression(dim, num_data=1000):
+    pyro.set_rng_seed(0)
+    true_coefs = torch.linspace(-1., 1., dim)
+    data = torch.randn(num_data, dim)
+    labels = dist.Bernoulli(logits=(true_coefs * data).sum(-1)).sample()
+
+    def model(data):
+        coefs = pyro.sample('coefs', dist.Normal(torch.zeros(dim), torch.ones(dim)))
+        with pyro.iarange('data', num_data):
+            pyro.sample('y', dist.Bernoulli(logits=(coefs * data).sum(-1)), obs=labels)
+
+    return model, (data,)
+
+
+@register_benchmark('EightSchools::NUTS', kernel=NUTS)
+def eight_schools():
+    # Non-centered parametrization of examples/eight_schools/mcmc.py.
+    J = 8
+    y = torch.tensor([28., 8., -3., 7., -1., 1., 18., 12.])
+    sigma = torch.tensor([15., 10., 16., 11., 9., 11., 10., 18.])
+
+    def model(sigma):
+        eta = pyro.sample('eta', dist.Normal(torch.zeros(J), torch.ones(J)))
+        mu = pyro.sample('mu', dist.Normal(torch.zeros(1), 10 * torch.ones(1)))
+        tau = pyro.sample('tau', dist.HalfCauchy(scale=25 * torch.ones(1)))
+        theta = mu + tau * eta
+        return pyro.sample('obs', dist.Normal(theta, sigma))
+
+    return poutine.condition(model, data={'obs': y}), (sigma,)
+
+
+@register_benchmark('Funnel_dim=10::NUTS', kernel=NUTS)
+def funnel(dim=10):
+    # Neal's funnel, whose varying curvature causes divergent transitions.
+    def model():
+        y = pyro.sample('y', dist.Normal(0., 3.))
+        pyro.sample('x', dist.Normal(torch.zeros(dim - 1), (0.5 * y).exp()))
+
+    return model, ()
+
+
+@register_benchmark('EnumeratedMixture::NUTS', kernel=NUTS, max_iarange_nesting=1)
+def enumerated_mixture(num_components=3, num_data=200):
+    # The discrete assignments are enumerated out by the kernel.
+    pyro.set_rng_seed(0)
+    true_locs = torch.tensor([-4., 0., 4.])[:num_components]
+    assignment = dist.Categorical(torch.ones(num_components)).sample((num_data,))
+    data = dist.Normal(true_locs[assignment], 1.).sample()
+
+    def model(data):
+        weights = pyro.sample('weights', dist.Dirichlet(torch.ones(num_components)))
+        locs = pyro.sample('locs', dist.Normal(torch.zeros(num_components), 10 * torch.ones(num_components)))
+        scale = pyro.sample('scale', dist.LogNormal(0., 1.))
+        with pyro.iarange('data', num_data):
+            z = pyro.sample('z', dist.Categorical(weights))
+            pyro.sample('x', dist.Normal(locs[z], scale), obs=data)
+
+    return model, (data,)
+
+
+def _autocorrelation(x):
+    """
+    Autocorrelation of each column of the 2-D array ``x``, computed by FFT.
+    """
+    num_samples = x.shape[0]
+    x = x - x.mean(0)
+    fft_size = 2 ** int(np.ceil(np.log2(2 * num_samples)))
+    fx = np.fft.rfft(x, n=fft_size, axis=0)
+    acov = np.fft.irfft(fx * np.conjugate(fx), n=fft_size, axis=0)[:num_samples]
+    return acov / np.maximum(acov[:1], np.finfo(acov.dtype).tiny)
+
+
+def effective_sample_size(x):
+    """
+    Effective sample size of each column of the 2-D array ``x`` of a single
+    chain, using Geyer's initial positive sequence estimator.
+    """
+    num_samples = x.shape[0]
+    rho = _autocorrelation(x)
+    ess = np.empty(x.shape[1])
+    for i in range(x.shape[1]):
+        tau = -1.
+        for t in range(0, num_samples - 1, 2):
+            pair_sum = rho[t, i] + rho[t + 1, i]
+            if pair_sum < 0:
+                break
+            tau += 2 * pair_sum
+        ess[i] = num_samples / max(tau, 1. / np.log10(max(num_samples, 10)))
+    return ess
+
+
+def run_benchmark(benchmark, num_samples=500, warmup_steps=300):
+    """
+    Runs the kernel of ``benchmark`` and returns statistics of the sampling
+    phase. The kernel is driven directly, so that only transitions are timed.
+    """
+    pyro.clear_param_store()
+    model, model_args = benchmark.model(**benchmark.model_args)
+    kernel_args = benchmark.kernel_args.copy()
+    kernel = kernel_args.pop('kernel')(model, adapt_step_size=True, **kernel_args)
+    pyro.set_rng_seed(0)
+    kernel.set_warmup_steps(warmup_steps)
+    kernel.setup(*model_args)
+    trace = kernel.initial_trace()
+    for _ in range(warmup_steps):
+        trace = kernel.sample(trace)
+    kernel.end_warmup()
+
+    names = list(kernel._r_shapes)
+    kernel._num_grad_evals = 0
+    kernel._num_divergences = 0
+    tree_depths = Counter()
+    samples = []
+    start = time.time()
+    for _ in range(num_samples):
+        trace = kernel.sample(trace)
+        samples.append(torch.cat([trace.nodes[name]['value'].detach().reshape(-1) for name in names]))
+        if hasattr(kernel, '_tree_depth'):
+            tree_depths[kernel._tree_depth] += 1
+    sampling_time = time.time() - start
+    num_grad_evals = kernel._num_grad_evals
+    num_divergences = kernel._num_divergences
+    step_size = kernel.step_size
+    kernel.cleanup()
+
+    ess = effective_sample_size(torch.stack(samples).numpy().astype(np.float64))
+    min_ess = float(ess.min())
+    return OrderedDict([
+        ('num_samples', num_samples),
+        ('time', sampling_time),
+        ('min_ess', min_ess),
+        ('mean_ess', float(ess.mean())),
+        ('ess_per_sec', min_ess / sampling_time),
+        ('ess_per_grad', min_ess / max(num_grad_evals, 1)),
+        ('num_grad_evals', num_grad_evals),
+        ('divergences', num_divergences),
+        ('step_size', step_size),
+        ('tree_depths', {str(k): v for k, v in sorted(tree_depths.items())}),
+    ])
+
+
+@pytest.mark.parametrize('benchmark_model', BENCHMARKS, ids=BENCHMARK_IDS)
+@pytest.mark.benchmark(
+    min_rounds=1,
+    disable_gc=True,
+)
+@pytest.mark.disable_validation()
+def test_mcmc_benchmark(benchmark, benchmark_model):
+    print("Running - {}".format(benchmark_model.benchmark_id))
+    stats = benchmark.pedantic(run_benchmark, args=(benchmark_model,), rounds=1, iterations=1)
+    benchmark.extra_info.update(stats)
+    assert stats['min_ess'] > 0
+
+
+if __name__ == "__main__":
+    """
+    This script is invoked to print the sampling efficiency of the benchmarks.
+    """
+    parser = argparse.ArgumentParser(description="Sampling efficiency of the MCMC kernels.")
+    parser.add_argument("-m", "--models", nargs="*",
+                        help="model name to match against benchmark id, partial match (e.g. *NAME*) is acceptable.")
+    parser.add_argument("-n", "--num-samples", default=500, type=int)
+    parser.add_argument("-w", "--warmup-steps", default=300, type=int)
+    parser.add_argument("-o", "--output", default=None,
+                        help="optional json file in which the statistics are saved.")
+    parser.add_argument("-c", "--compare", default=None,
+                        help="optional json file saved by a previous run (e.g. on another commit) to compare against.")
+    args = parser.parse_args()
+    to_run = BENCHMARKS
+    if args.models:
+        search_regexp = [re.compile(".*" + m + ".*") for m in args.models]
+        to_run = [b for b in BENCHMARKS if any(r.match(b.benchmark_id) for r in search_regexp)]
+    results = OrderedDict()
+    for benchmark_model in to_run:
+        results[benchmark_model.benchmark_id] = run_benchmark(benchmark_model, args.num_samples,
+                                                              args.warmup_steps)
+    reference = {}
+    if args.compare:
+        with open(os.path.abspath(args.compare)) as f:
+            reference = json.load(f)
+    columns = ['time', 'min_ess', 'ess_per_sec', 'ess_per_grad', 'divergences', 'step_size']
+    print("{:<36}".format("benchmark") + "".join("{:>14}".format(c) for c in columns))
+    for benchmark_id, stats in results.items():
+        print("{:<36}".format(benchmark_id) + "".join("{:>14.4g}".format(stats[c]) for c in columns))
+        if stats['tree_depths']:
+            print("    tree depths: {}".format(stats['tree_depths']))
+        if benchmark_id in reference:
+            print("{:<36}".format("    reference") +
+                  "".join("{:>14.4g}".format(reference[benchmark_id][c]) for c in columns))
+    if args.output:
+        with open(os.path.abspath(args.output), "w") as f:
+            json.dump(results, f, indent=2)
@@ -117,6 +117,40 @@ def test_custom_subsample(model):
     assert poutine.trace(model)(subsample) == subsample
 
 
+def iarange_epoch_model(subsampler):
+    with pyro.iarange("data", 10, subsample=subsampler) as ind:
+        batch = subsampler.get_batch(ind)
+        pyro.sample("x", dist.Normal(batch, 1.))
+    return ind.tolist(), batch.tolist()
+
+
+def irange_epoch_model(subsampler):
+    result = []
+    for i in pyro.irange("data", 10, subsample=subsampler):
+        result.append(i)
+    batch = subsampler.get_batch()
+    return result, batch.tolist()
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+@pytest.mark.parametrize('model', [iarange_epoch_model, irange_epoch_model], ids=['iarange', 'irange'])
+def test_epoch_subsample(model, prefetch):
+    pyro.set_rng_seed(0)
+    data = torch.arange(10.) * 10
+    subsampler = pyro.EpochSubsample(10, 4, getitem=data.__getitem__, prefetch=prefetch)
+
+    seen = []
+    for step in range(5):
+        tr = poutine.trace(model).get_trace(subsampler)
+        ind, batch = poutine.replay(model, trace=tr)(subsampler)
+        assert len(ind) == 4
+        assert batch == [10. * i for i in ind]
+        seen.extend(ind)
+    # every index is seen exactly once per epoch
+    assert sorted(seen[:10]) == list(range(10))
+    assert sorted(seen[10:]) == list(range(10))
+
+
 def iarange_cuda_model(subsample_size):
     loc = torch.zeros(20).cuda()
     scale = torch.ones(20).cuda()
@@ -5,6 +5,7 @@ import logging
 import warnings
 from unittest import TestCase
 
+import networkx
 import pytest
 import torch
 import torch.nn as nn
@@ -14,7 +15,10 @@ import pyro
 import pyro.distributions as dist
 import pyro.poutine as poutine
 from pyro.distributions import Bernoulli, Categorical, Normal
+from pyro.poutine.messenger import Messenger
 from pyro.poutine.runtime import _DIM_ALLOCATOR, NonlocalExit
+from pyro.poutine.scale_messenger import ScaleMessenger
+from pyro.poutine.trace_messenger import TraceMessenger
 from pyro.poutine.util import all_escape, discrete_escape
 from tests.common import assert_equal
 
@@ -725,7 +729,7 @@ def test_decorator_interface_primitives():
         pyro.sample("b", Bernoulli(torch.tensor([0.5])))
 
     tr = model.get_trace()
-    assert isinstance(tr, poutine.Trace)
+    assert isinstance(tr, poutine.FlatTrace)
     assert tr.graph_type == "flat"
 
     @poutine.trace(graph_type="dense")
@@ -804,6 +808,52 @@ def test_method_decorator_interface_condition():
             pyro.sample("b", Bernoulli(torch.tensor([0.5])))
 
     tr = poutine.trace(cls_model().model).get_trace(0.5)
-    assert isinstance(tr, poutine.Trace)
+    assert isinstance(tr, poutine.FlatTrace)
     assert tr.graph_type == "flat"
     assert tr.nodes["b"]["is_observed"] and tr.nodes["b"]["value"].item() == 1.
+
+
+def test_flat_trace():
+
+    def model():
+        pyro.param("p", torch.zeros(1, requires_grad=True))
+        loc = pyro.sample("loc", Normal(0., 1.))
+        with pyro.iarange("data", 3):
+            pyro.sample("x", Normal(loc, 1.), obs=torch.zeros(3))
+
+    tr = poutine.trace(model).get_trace()
+    dense_tr = tr.to_graph()
+    assert isinstance(tr, poutine.FlatTrace)
+    assert not isinstance(dense_tr, poutine.FlatTrace)
+    assert list(tr.nodes) == list(dense_tr.nodes)
+    assert tr.nodes() == list(dense_tr.nodes())
+    assert tr.stochastic_nodes == dense_tr.stochastic_nodes == ["loc"]
+    assert tr.observation_nodes == dense_tr.observation_nodes == ["x"]
+    assert tr.param_nodes == dense_tr.param_nodes == ["p"]
+    assert_equal(tr.log_prob_sum(), dense_tr.log_prob_sum())
+
+    assert not isinstance(tr, networkx.DiGraph)
+    assert not hasattr(tr, "__dict__")
+    assert list(dense_tr.edges()) == []
+    assert tr.nodes(data="type") == list(dense_tr.nodes(data="type"))
+    assert tr.nodes["x"] is not dense_tr.nodes["x"]
+
+    tr_copy = tr.copy()
+    assert isinstance(tr_copy, poutine.FlatTrace)
+    assert tr_copy.nodes["x"] is not tr.nodes["x"]
+    tr_copy.remove_node("x")
+    assert "x" in tr and "x" not in tr_copy
+    assert len(tr_copy) == len(tr) - 1
+    with pytest.raises(RuntimeError):
+        tr.add_node("loc", name="loc", type="sample")
+
+    # conditioning on a flat trace uses its site values
+    conditioned = poutine.trace(poutine.condition(model, data=tr_copy)).get_trace()
+    assert conditioned.nodes["loc"]["is_observed"]
+    assert_equal(conditioned.nodes["loc"]["value"], tr.nodes["loc"]["value"])
+
+
+def test_dispatch_skips_noop_handlers():
+    assert Messenger._get_dispatch("sample") == (False, False)
+    assert ScaleMessenger._get_dispatch("param") == (True, False)
+    assert TraceMessenger._get_dispatch("sample") == (True, True)